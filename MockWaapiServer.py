@@ -0,0 +1,328 @@
+#! python3
+import asyncio
+import itertools
+import json
+import threading
+import time
+import uuid
+
+from autobahn.asyncio.websocket import WebSocketServerFactory, WebSocketServerProtocol
+from autobahn.websocket.types import ConnectionDeny
+
+
+def make_guid(kind: int, index: int) -> str:
+    return '{' + str(uuid.UUID(int=(kind << 64) + index)).upper() + '}'
+
+
+class SyntheticProject:
+    """Synthetic Wwise project with StateGroups x States.\n
+    Every StateGroup has a 'None' State followed by states_per_group - 1 States.
+    """
+
+    def __init__(self, stategroups=100, states_per_group=10, name="SyntheticProject"):
+        self.name = name
+        self.file_path = "C:\\Synthetic\\" + name + ".wproj"
+        # { 'StateGroup GUID' :
+        #     {'id', 'name', 'path', 'parent', 'state': [State object, ...], 'current': State object} }
+        self.stategroups = {}
+        # { 'State GUID' : State object }
+        self.states = {}
+        workunit = {'id': make_guid(0, 0), 'name': "Default Work Unit"}
+        for i in range(stategroups):
+            stategroup_id = make_guid(1, i)
+            name = "StateGroup_{:05d}".format(i)
+            stategroup = {'id': stategroup_id,
+                          'type': "StateGroup",
+                          'name': name,
+                          'path': "\\States\\Default Work Unit\\" + name,
+                          'parent': workunit,
+                          'state': []}
+            for j in range(states_per_group):
+                state_name = "None" if j == 0 else "State_{:03d}".format(j)
+                state = {'id': make_guid(2, i * states_per_group + j),
+                         'type': "State",
+                         'name': state_name,
+                         'path': stategroup['path'] + "\\" + state_name,
+                         'parent': {'id': stategroup_id, 'name': name}}
+                stategroup['state'].append(state)
+                self.states[state['id']] = state
+            stategroup['current'] = stategroup['state'][0]
+            self.stategroups[stategroup_id] = stategroup
+
+    def find_stategroup(self, key: str) -> dict:
+        stategroup = self.stategroups.get(key)
+        if stategroup is None:
+            for candidate in self.stategroups.values():
+                if key in (candidate['name'], candidate['path']):
+                    return candidate
+        return stategroup
+
+    def find_state(self, stategroup: dict, key: str) -> dict:
+        for state in stategroup['state']:
+            if key in (state['id'], state['name']):
+                return state
+        return None
+
+
+class MockWaapiServer:
+    """Local WAMP server which answers the WAAPI subset used by StateUtility.\n
+    Runs its own asyncio loop on a background thread.
+    Supported calls: ak.wwise.core.getInfo, ak.wwise.core.object.get,
+    ak.soundengine.getState, ak.soundengine.setState.
+    Any topic can be subscribed. setState publishes ak.wwise.core.profiler.stateChanged like Wwise.
+    """
+
+    def __init__(self, project: SyntheticProject = None, host="127.0.0.1", port=0, latency=0.0, version_year=2022):
+        self.project = project if project is not None else SyntheticProject()
+        self.host = host
+        self.port = port
+        # Simulated server processing time of each call (sec).
+        self.latency = latency
+        self.version_year = version_year
+        self.call_count = 0
+        self.publish_count = 0
+        # { 'StateGroup GUID' : perf_counter() of last published stateChanged }
+        self.last_published = {}
+
+        self.__loop = None
+        self.__server = None
+        self.__thread = None
+        self.__sessions = set()
+        self.__subscription_ids = itertools.count(1)
+        self.__publication_ids = itertools.count(1)
+        self.__started = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return "ws://{}:{}/waapi".format(self.host, self.port)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        self.__started.wait()
+        return self
+
+    def stop(self):
+        if self.__loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.__shutdown(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __run(self):
+        self.__loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.__loop)
+        factory = WebSocketServerFactory()
+        factory.protocol = _MockWaapiProtocol
+        factory.server = self
+        self.__server = self.__loop.run_until_complete(
+            self.__loop.create_server(factory, self.host, self.port))
+        self.port = self.__server.sockets[0].getsockname()[1]
+        self.__started.set()
+        self.__loop.run_forever()
+        self.__loop.close()
+
+    async def __shutdown(self):
+        for session in list(self.__sessions):
+            session.sendClose()
+        self.__server.close()
+        await self.__server.wait_closed()
+
+    def _open_session(self, session):
+        self.__sessions.add(session)
+
+    def _close_session(self, session):
+        self.__sessions.discard(session)
+
+    # WAMP message handling. Runs on server loop.
+    async def _on_message(self, session, message: list):
+        message_type = message[0]
+        if message_type == 1:  # HELLO
+            session.send([2, id(session), {'roles': {'broker': {}, 'dealer': {}}}])
+        elif message_type == 6:  # GOODBYE
+            session.send([6, {}, "wamp.close.goodbye_and_out"])
+            session.sendClose()
+        elif message_type == 48:  # CALL
+            # waapi-client sends call options as WAMP CALL options.
+            request, options, procedure = message[1], message[2], message[3]
+            kwargs = dict(message[5]) if len(message) > 5 else {}
+            kwargs.setdefault('options', options)
+            self.call_count += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            try:
+                result = self.handle_call(procedure, kwargs)
+            except KeyError as e:
+                session.send([8, 48, request, {}, "ak.wwise.invalid_arguments", [], {'message': str(e)}])
+                return
+            session.send([50, request, {}, [], result])
+        elif message_type == 32:  # SUBSCRIBE
+            request, topic = message[1], message[3]
+            subscription = next(self.__subscription_ids)
+            session.subscriptions[subscription] = topic
+            session.send([33, request, subscription])
+        elif message_type == 34:  # UNSUBSCRIBE
+            request, subscription = message[1], message[2]
+            session.subscriptions.pop(subscription, None)
+            session.send([35, request])
+
+    def handle_call(self, procedure: str, kwargs: dict) -> dict:
+        """Return result kwargs of WAAPI call. Raise KeyError for invalid arguments."""
+        options = kwargs.get('options', {})
+        if procedure == "ak.wwise.core.getInfo":
+            return {'version': {'year': self.version_year, 'major': 1, 'minor': 0, 'build': 0}}
+        if procedure == "ak.wwise.core.object.get":
+            return {'return': [self.__filter_return(obj, options.get('return', ['id', 'name']))
+                               for obj in self.__query_objects(kwargs)]}
+        if procedure == "ak.soundengine.getState":
+            stategroup = self.project.find_stategroup(kwargs['stateGroup'])
+            if stategroup is None:
+                raise KeyError(kwargs['stateGroup'])
+            return {'return': self.__filter_return(stategroup['current'], options.get('return', ['id', 'name']))}
+        if procedure == "ak.soundengine.setState":
+            stategroup = self.project.find_stategroup(kwargs['stateGroup'])
+            state = self.project.find_state(stategroup, kwargs['state']) if stategroup else None
+            if state is None:
+                raise KeyError(kwargs['state'])
+            self.__set_current_state(stategroup, state)
+            return {}
+        raise KeyError(procedure)
+
+    def __query_objects(self, kwargs: dict) -> list:
+        source = kwargs.get('from', {})
+        if 'ofType' in source:
+            types = source['ofType']
+            if "Project" in types:
+                return [{'id': make_guid(0, 1), 'type': "Project",
+                         'name': self.project.name, 'filePath': self.project.file_path}]
+            objects = []
+            if "StateGroup" in types:
+                objects += self.project.stategroups.values()
+            if "State" in types:
+                objects += self.project.states.values()
+            return objects
+        # Children of StateGroups by id.
+        objects = []
+        for object_id in source.get('id', []):
+            stategroup = self.project.stategroups.get(object_id)
+            if stategroup is not None:
+                objects += stategroup['state']
+        return objects
+
+    @staticmethod
+    def __filter_return(obj: dict, returns: list) -> dict:
+        ret = {}
+        for key in returns:
+            if key == 'parent.id':
+                ret[key] = obj.get('parent', {}).get('id')
+            elif key in obj:
+                ret[key] = obj[key]
+        return ret
+
+    def __set_current_state(self, stategroup: dict, state: dict):
+        stategroup['current'] = state
+        self.last_published[stategroup['id']] = time.perf_counter()
+        self._publish("ak.wwise.core.profiler.stateChanged",
+                      {'stateGroup': {'id': stategroup['id'], 'name': stategroup['name'], 'path': stategroup['path']},
+                       'state': {'id': state['id'], 'name': state['name'], 'path': state['path']}})
+
+    def _publish(self, topic: str, kwargs: dict):
+        for session in list(self.__sessions):
+            for subscription, subscribed_topic in session.subscriptions.items():
+                if subscribed_topic == topic:
+                    self.publish_count += 1
+                    session.send([36, subscription, next(self.__publication_ids), {}, [], kwargs])
+
+    # Event storms. Can be called from any thread, blocks until finished.
+    def storm_state_changes(self, rate: float, duration: float) -> int:
+        """Change current State of StateGroups in round robin at rate(events/sec).\n
+        Returns:
+            int: Number of published events.
+        """
+        stategroups = list(self.project.stategroups.values())
+
+        def event(i):
+            stategroup = stategroups[i % len(stategroups)]
+            state = stategroup['state'][(i // len(stategroups) + 1) % len(stategroup['state'])]
+            self.__set_current_state(stategroup, state)
+        return self.__storm(event, rate, duration)
+
+    def storm_renames(self, rate: float, duration: float, object_type="State") -> int:
+        """Rename States in round robin at rate(events/sec).\n
+        Args:
+            object_type (str): Other than "State" renames objects of that type which are
+                               not in the project, like bulk edits of Sounds.
+        Returns:
+            int: Number of published events.
+        """
+        states = [state for state in self.project.states.values() if state['name'] != "None"]
+
+        def event(i):
+            if object_type != "State":
+                self._publish("ak.wwise.core.object.nameChanged",
+                              {'object': {'type': object_type, 'id': make_guid(9, i), 'name': object_type + str(i),
+                                          'path': "\\Actor-Mixer Hierarchy\\" + object_type + str(i),
+                                          'parent': {'id': make_guid(9, 0), 'name': "Actor-Mixer Hierarchy"}},
+                               'oldName': "", 'newName': object_type + str(i)})
+                return
+            state = states[i % len(states)]
+            old_name = state['name']
+            state['name'] = old_name.split('#')[0] + "#" + str(i)
+            self._publish("ak.wwise.core.object.nameChanged",
+                          {'object': {'type': "State", 'id': state['id'], 'name': state['name'],
+                                      'path': state['path'], 'parent': state['parent']},
+                           'oldName': old_name, 'newName': state['name']})
+        return self.__storm(event, rate, duration)
+
+    def __storm(self, event, rate: float, duration: float) -> int:
+        async def run():
+            total = int(rate * duration)
+            start = time.perf_counter()
+            sent = 0
+            while sent < total:
+                # Send every event which is due, then yield to the loop.
+                due = min(total, int((time.perf_counter() - start) * rate) + 1)
+                while sent < due:
+                    event(sent)
+                    sent += 1
+                await asyncio.sleep(0.001)
+            return sent
+        return asyncio.run_coroutine_threadsafe(run(), self.__loop).result()
+
+
+class _MockWaapiProtocol(WebSocketServerProtocol):
+    def onConnect(self, request):
+        if "wamp.2.json" not in request.protocols:
+            raise ConnectionDeny(ConnectionDeny.NOT_ACCEPTABLE, "Only wamp.2.json is supported.")
+        self.subscriptions = {}
+        return "wamp.2.json"
+
+    def onOpen(self):
+        self.factory.server._open_session(self)
+
+    def onClose(self, wasClean, code, reason):
+        self.factory.server._close_session(self)
+
+    def onMessage(self, payload, isBinary):
+        message = json.loads(payload.decode('utf8'))
+        asyncio.ensure_future(self.factory.server._on_message(self, message))
+
+    def send(self, message: list):
+        self.sendMessage(json.dumps(message).encode('utf8'))
+
+
+if __name__ == "__main__":
+    with MockWaapiServer(SyntheticProject(), port=8080) as server:
+        print("Mock WAAPI server is running on " + server.url + ". Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,86 @@
+#! python3
+import json
+import os
+import time
+
+from StateModel import StateRegistry
+
+
+class StateCache:
+    """On-disk snapshot of StateRegistry for each Wwise project.\n
+    File layout:
+    {'version': CACHE_VERSION,
+     'last': 'Project filePath',
+     'projects': {'Project filePath': {'name': 'Project Name',
+                                       'saved': Unix time,
+                                       'stategroup': [['StateGroup GUID', 'StateGroup Path',
+                                                       [['State GUID', 'State Name'], ...],
+                                                       'Current State Name'], ...]}}}
+    States are null for StateGroups whose States were not loaded.
+    """
+    # Increment when layout changes. Cache with another version is ignored.
+    CACHE_VERSION = 2
+    DEFAULT_FILENAME = 'WwiseStateBrowser.cache'
+    # Number of projects kept in cache file.
+    MAX_PROJECTS = 8
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else os.path.join(
+            os.getcwd(), self.DEFAULT_FILENAME)
+
+    def __read(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != self.CACHE_VERSION:
+            return {}
+        return cache
+
+    def load(self, project_path: str = None) -> tuple:
+        """Return cached project.\n
+        Args:
+            project_path (str): Project filePath. Last saved project if None.
+        Returns:
+            tuple: (wproj_info, StateRegistry) or (None, None) if not cached.
+        """
+        cache = self.__read()
+        try:
+            if project_path is None:
+                project_path = cache.get('last')
+            project = cache.get('projects', {}).get(project_path)
+            if project is None:
+                return None, None
+
+            registry = StateRegistry()
+            registry.project_path = project_path
+            registry.update(project.get('stategroup', []))
+            return {'name': project.get('name', ""), 'filePath': project_path}, registry
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+            # Valid JSON of an unexpected layout, e.g. edited by hand. Same as not cached.
+            return None, None
+
+    def save(self, wproj_info: dict, registry: StateRegistry):
+        cache = self.__read()
+        projects = cache.get('projects')
+        if not isinstance(projects, dict):
+            projects = {}
+        projects[wproj_info['filePath']] = {
+            'name': wproj_info.get('name', ""),
+            'saved': time.time(),
+            'stategroup': [[stategroup.id, stategroup.path,
+                            [[state.id, state.name] for state in stategroup.states] if stategroup.loaded else None,
+                            stategroup.current]
+                           for stategroup in registry]}
+        # Drop least recently saved projects.
+        for project_path in sorted(projects, key=lambda k: projects[k].get('saved', 0))[:-self.MAX_PROJECTS]:
+            del projects[project_path]
+
+        # Write to temporary file and replace, so a crash never leaves a broken cache.
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.CACHE_VERSION,
+                       'last': wproj_info['filePath'],
+                       'projects': projects}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
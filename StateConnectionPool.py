@@ -0,0 +1,199 @@
+#! python3
+import queue
+import threading
+import traceback
+
+import txaio
+from waapi.client.interface import CallbackExecutor
+
+# CALLBACK_EXECUTORS is re-exported for command lines.
+from StateObserver import CALLBACK_EXECUTORS
+from StateSupervisor import ConnectionSupervisor
+from WwiseStateBrowserInterface import StateUtility
+
+
+class _ThreadEventLoopConfig(type(txaio.config)):
+    # txaio falls back to the event loop of the calling thread when loop is None.
+    @property
+    def loop(self):
+        return None
+
+    @loop.setter
+    def loop(self, value):
+        pass
+
+
+def use_thread_event_loops():
+    """Make txaio use the event loop of the calling thread.\n
+    Each WaapiClient runs its own event loop on its own thread, but sets the process-wide
+    txaio.config.loop to it. Then futures and timers of every other client are created
+    on the loop of the last connected one, and their calls never return.
+    """
+    config = txaio.config
+    if not isinstance(config, _ThreadEventLoopConfig):
+        config.__dict__.pop('loop', None)
+        config.__class__ = _ThreadEventLoopConfig
+
+
+class SharedCallbackExecutor(CallbackExecutor):
+    """Run WAAPI callbacks of several clients on one thread, in arrival order.\n
+    WaapiClient starts and stops its executor with the connection, so the thread runs
+    while any client is connected. SequentialThreadExecutor keeps its queue in the class,
+    so every client adds a thread to the same queue and callbacks lose their order.
+    """
+    # Number of callback threads.
+    workers = 1
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__clients = 0
+        self.__queues = None
+
+    def __call__(self):
+        # WaapiClient takes an executor factory. Every client gets this instance.
+        return self
+
+    def start(self):
+        with self.__lock:
+            self.__clients += 1
+            if self.__queues is None:
+                # New queues per start, so a stopping thread never takes callbacks of the next one.
+                self.__queues = [queue.Queue() for i in range(self.workers)]
+                for publish_queue in self.__queues:
+                    threading.Thread(target=self.__run, args=(publish_queue,), daemon=True).start()
+
+    def stop(self):
+        with self.__lock:
+            if self.__clients == 0:
+                return
+            self.__clients -= 1
+            if self.__clients == 0:
+                for publish_queue in self.__queues:
+                    publish_queue.put(None)
+                self.__queues = None
+
+    def execute(self, callback, kwargs):
+        publish_queues = self.__queues
+        if publish_queues is not None:
+            publish_queues[self.worker_index(kwargs, len(publish_queues))].put(lambda: callback(**kwargs))
+
+    def worker_index(self, kwargs: dict, workers: int) -> int:
+        """Return index of the thread which runs callback with kwargs."""
+        return 0
+
+    @staticmethod
+    def __run(publish_queue: queue.Queue):
+        while True:
+            publish = publish_queue.get()
+            if publish is None:
+                return
+            try:
+                publish()
+            except Exception:
+                # Keep callbacks of other clients running.
+                traceback.print_exc()
+
+
+class PooledCallbackExecutor(SharedCallbackExecutor):
+    """Run WAAPI callbacks on several threads.\n
+    Events of one StateGroup always run on the same thread, so they keep their order,
+    while a slow observer of one StateGroup no longer delays events of the others.
+    """
+    DEFAULT_WORKERS = 4
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        super().__init__()
+        self.workers = max(1, workers)
+
+    def worker_index(self, kwargs: dict, workers: int) -> int:
+        return hash(StateUtility.event_stategroup_id(kwargs)) % workers
+
+
+def make_callback_executor(name='sequential', workers=PooledCallbackExecutor.DEFAULT_WORKERS) -> SharedCallbackExecutor:
+    """Return callback executor by name.\n
+    Args:
+        name (str): 'sequential' runs every callback on one thread.
+                    'pooled' runs them on workers threads, keeping order per StateGroup.
+    """
+    if name == 'sequential':
+        return SharedCallbackExecutor()
+    if name == 'pooled':
+        return PooledCallbackExecutor(workers)
+    raise ValueError("Unknown callback executor: " + str(name))
+
+
+class ConnectionPool:
+    """ConnectionSupervisors of several Wwise instances in one process.\n
+    All clients share the callback threads of one executor. Each connection keeps its
+    own I/O thread, because WaapiClient owns its event loop.
+    """
+
+    def __init__(self, callback_executor: SharedCallbackExecutor = None):
+        """
+        Args:
+            callback_executor (SharedCallbackExecutor): Runs WAAPI callbacks of every client.
+                                                        One thread if None.
+        """
+        use_thread_event_loops()
+        self.callback_executor = callback_executor if callback_executor is not None else SharedCallbackExecutor()
+        # [ConnectionSupervisor, ...] in column order.
+        self.__supervisors = []
+
+    def __len__(self):
+        return len(self.__supervisors)
+
+    def __iter__(self):
+        return iter(list(self.__supervisors))
+
+    def add(self, url=None, position: int = None, **kwargs) -> ConnectionSupervisor:
+        """Start supervising connection to url.\n
+        Args:
+            url (str): WAAPI URL. Default is ws://127.0.0.1:8080/waapi.
+            position (int): Index among instances. Last if None.
+            kwargs: Arguments of ConnectionSupervisor.
+        Returns:
+            ConnectionSupervisor: Started supervisor.
+        """
+        supervisor = ConnectionSupervisor(url, callback_executor=self.callback_executor, **kwargs)
+        if position is None:
+            self.__supervisors.append(supervisor)
+        else:
+            self.__supervisors.insert(position, supervisor)
+        supervisor.start()
+        return supervisor
+
+    def remove(self, supervisor: ConnectionSupervisor):
+        """Stop supervisor and forget it."""
+        supervisor.stop()
+        self.__supervisors.remove(supervisor)
+
+    def stop(self, wait=False):
+        for supervisor in self.__supervisors:
+            supervisor.stop()
+        if wait:
+            for supervisor in self.__supervisors:
+                supervisor.stop(wait=True)
+        self.__supervisors.clear()
+
+    def compare(self, only_differences=False) -> dict:
+        """Return current States of every instance by StateGroup path.\n
+        Paths line up instances of different branches whose GUIDs may differ.
+        Disconnected instances report their last known States.
+        Args:
+            only_differences (bool): Omit StateGroups whose current State is the same everywhere.
+        Returns:
+            dict: { 'StateGroup Path' : ('State Name' or None if unknown to the instance, ...) }
+                  Values are in instance order.
+        """
+        currents = []
+        for supervisor in self.__supervisors:
+            registry = supervisor.registry
+            currents.append({stategroup.path: stategroup.current for stategroup in list(registry)}
+                            if registry is not None else {})
+        ret = {}
+        for path in set().union(*currents):
+            values = tuple(current.get(path) for current in currents)
+            if only_differences and values.count(values[0]) == len(values):
+                continue
+            ret[path] = values
+        return ret
@@ -0,0 +1,139 @@
+#! python3
+import array
+import csv
+import json
+import threading
+import time
+
+
+class StateHistory:
+    """Fixed-size ring buffer of State transitions.\n
+    Each transition takes 20 bytes in typed arrays: timestamp(ns), StateGroup GUID,
+    State GUID and State name. Strings are interned into a table and stored as indexes.
+    When full, the oldest transitions are overwritten.
+    record() can be called from WAAPI callback thread while others read.
+    """
+    DEFAULT_CAPACITY = 1000000
+    CSV_HEADER = ['timestamp', 'stateGroupId', 'stateGroup', 'stateId', 'state']
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = max(1, capacity)
+        self.__lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.__lock:
+            # Arrays grow up to capacity, then act as ring buffer.
+            self.__timestamps = array.array('q')
+            self.__stategroups = array.array('I')
+            self.__state_ids = array.array('I')
+            self.__state_names = array.array('I')
+            # Interned strings & their indexes.
+            self.__strings = []
+            self.__string_index = {}
+            # { 'StateGroup GUID' : 'StateGroup Path' } last seen.
+            self.__stategroup_paths = {}
+            # Number of transitions ever recorded.
+            self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def dropped(self) -> int:
+        return max(0, self.total - self.capacity)
+
+    def __intern(self, value: str) -> int:
+        index = self.__string_index.get(value)
+        if index is None:
+            index = self.__string_index[value] = len(self.__strings)
+            self.__strings.append(value)
+        return index
+
+    def record(self, stategroup: dict, state: dict, timestamp_ns: int = None):
+        """Record a transition.\n
+        Args:
+            stategroup (dict): stateGroup of ak.wwise.core.profiler.stateChanged. {'id', 'path'}
+            state (dict): state of ak.wwise.core.profiler.stateChanged. {'id', 'name'}
+            timestamp_ns (int): Unix time in nanoseconds. Now if None.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        with self.__lock:
+            stategroup_id = stategroup.get('id', "")
+            if 'path' in stategroup:
+                self.__stategroup_paths[stategroup_id] = stategroup['path']
+            stategroup_index = self.__intern(stategroup_id)
+            state_id_index = self.__intern(state.get('id', ""))
+            state_name_index = self.__intern(state.get('name', ""))
+            if self.total < self.capacity:
+                self.__timestamps.append(timestamp_ns)
+                self.__stategroups.append(stategroup_index)
+                self.__state_ids.append(state_id_index)
+                self.__state_names.append(state_name_index)
+            else:
+                position = self.total % self.capacity
+                self.__timestamps[position] = timestamp_ns
+                self.__stategroups[position] = stategroup_index
+                self.__state_ids[position] = state_id_index
+                self.__state_names[position] = state_name_index
+            self.total += 1
+
+    def __columns(self) -> tuple:
+        return (self.__timestamps, self.__stategroups, self.__state_ids, self.__state_names)
+
+    def __snapshot(self) -> tuple:
+        # Copy columns in chronological order, so export runs without the lock.
+        with self.__lock:
+            start = self.total % self.capacity if self.total > self.capacity else 0
+            columns = tuple(column[start:] + column[:start] for column in self.__columns())
+            return columns, list(self.__strings), dict(self.__stategroup_paths)
+
+    def events(self):
+        """Return transitions in chronological order.\n
+        Returns:
+            list: [(Unix time ns, 'StateGroup GUID', 'State GUID', 'State Name'), ...]
+        """
+        (timestamps, stategroups, state_ids, state_names), strings, paths = self.__snapshot()
+        return [(timestamp, strings[stategroup], strings[state_id], strings[state_name])
+                for timestamp, stategroup, state_id, state_name
+                in zip(timestamps, stategroups, state_ids, state_names)]
+
+    def export_csv(self, path: str):
+        (timestamps, stategroups, state_ids, state_names), strings, paths = self.__snapshot()
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.CSV_HEADER)
+            for timestamp, stategroup, state_id, state_name in zip(timestamps, stategroups, state_ids, state_names):
+                writer.writerow(['{}.{:09d}'.format(*divmod(timestamp, 1000000000)),
+                                 strings[stategroup], paths.get(strings[stategroup], ""),
+                                 strings[state_id], strings[state_name]])
+
+    def export_columnar(self, path: str):
+        """Write dictionary encoded columns as JSON.\n
+        Layout:
+        {'count': int, 'dropped': int, 'strings': ['...', ...],
+         'stateGroupPath': {'StateGroup GUID': 'StateGroup Path'},
+         'columns': {'timestamp_ns': [int, ...],
+                     'stateGroupId': [Index in strings, ...],
+                     'stateId': [Index in strings, ...],
+                     'state': [Index in strings, ...]}}
+        """
+        (timestamps, stategroups, state_ids, state_names), strings, paths = self.__snapshot()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'count': len(timestamps),
+                       'dropped': self.dropped,
+                       'strings': strings,
+                       'stateGroupPath': paths,
+                       'columns': {'timestamp_ns': timestamps.tolist(),
+                                   'stateGroupId': stategroups.tolist(),
+                                   'stateId': state_ids.tolist(),
+                                   'state': state_names.tolist()}},
+                      f, separators=(',', ':'))
+
+    def export(self, path: str):
+        """Export as CSV if path ends with .csv, columnar JSON otherwise."""
+        if path.lower().endswith('.csv'):
+            self.export_csv(path)
+        else:
+            self.export_columnar(path)
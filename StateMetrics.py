@@ -0,0 +1,163 @@
+#! python3
+import collections
+import contextlib
+import json
+import threading
+import time
+
+
+class LatencyHistogram:
+    # Upper bounds of buckets in milliseconds. Last bucket is unbounded.
+    BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def add(self, seconds: float):
+        millisec = seconds * 1000
+        self.count += 1
+        self.total += millisec
+        if millisec > self.max:
+            self.max = millisec
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if millisec <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, p: float) -> float:
+        """Return upper bound(ms) of bucket which holds p(0-1) percentile, capped by max."""
+        if self.count == 0:
+            return 0.0
+        threshold = p * self.count
+        cumulative = 0
+        for i, n in enumerate(self.buckets):
+            cumulative += n
+            if cumulative >= threshold:
+                return min(self.BUCKETS_MS[i], self.max) if i < len(self.BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {'count': self.count,
+                'total_ms': self.total,
+                'mean_ms': self.total / self.count if self.count else 0.0,
+                'p50_ms': self.percentile(0.5),
+                'p95_ms': self.percentile(0.95),
+                'max_ms': self.max,
+                'buckets_ms': list(self.BUCKETS_MS) + ['inf'],
+                'buckets': list(self.buckets)}
+
+
+class RateWindow:
+    """Events per second over the last WINDOW_S seconds, counted in one-second buckets."""
+    WINDOW_S = 5
+
+    def __init__(self):
+        # [[Second of perf_counter, Count], ...] in time order.
+        self.buckets = collections.deque()
+
+    def add(self, n: int, now: float):
+        second = int(now)
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += n
+        else:
+            self.buckets.append([second, n])
+            self.__expire(second)
+
+    def rate(self, now: float, started: float) -> float:
+        """Return events per second. started limits the window after reset."""
+        first = int(now) - (self.WINDOW_S - 1)
+        self.__expire(int(now))
+        span = now - max(first, started)
+        return sum(n for second, n in self.buckets) / span if span > 0 else 0.0
+
+    def __expire(self, second: int):
+        while self.buckets and self.buckets[0][0] <= second - self.WINDOW_S:
+            self.buckets.popleft()
+
+
+class Metrics:
+    """Thread-safe counters, gauges and latency histograms.\n
+    Names are free-form, e.g. 'call:ak.soundengine.getState' or 'notify:on_currentstate_changed'.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.__lock:
+            self.__started = time.perf_counter()
+            # { 'Name' : LatencyHistogram }
+            self.__timers = {}
+            # { 'Name' : int }
+            self.__counters = {}
+            # { 'Name' : RateWindow }
+            self.__rates = {}
+            # { 'Name' : number }
+            self.__gauges = {}
+
+    def record(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.__lock:
+            histogram = self.__timers.get(name)
+            if histogram is None:
+                histogram = self.__timers[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def count(self, name: str, n=1):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + n
+            rate = self.__rates.get(name)
+            if rate is None:
+                rate = self.__rates[name] = RateWindow()
+            rate.add(n, now)
+
+    def gauge(self, name: str, value):
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__gauges[name] = value
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """Return current values.\n
+        Counters have 'rate_per_s' over the last RateWindow.WINDOW_S seconds and
+        'mean_rate_per_s' since reset.
+        """
+        with self.__lock:
+            now = time.perf_counter()
+            elapsed = now - self.__started
+            return {'elapsed_s': elapsed,
+                    'timers': {name: histogram.to_dict() for name, histogram in self.__timers.items()},
+                    'counters': {name: {'count': n,
+                                        'rate_per_s': self.__rates[name].rate(now, self.__started),
+                                        'mean_rate_per_s': n / elapsed if elapsed > 0 else 0.0}
+                                 for name, n in self.__counters.items()},
+                    'gauges': dict(self.__gauges)}
+
+    def export_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+# Shared instance used by StateUtility, Subject and MainWindow.
+metrics = Metrics()
@@ -0,0 +1,476 @@
+#! python3
+import bisect
+import sys
+
+
+class State:
+    __slots__ = ('id', 'name', 'stategroup')
+
+    def __init__(self, state_id: str, name: str, stategroup: 'StateGroup'):
+        self.id = sys.intern(state_id)
+        self.name = sys.intern(name)
+        self.stategroup = stategroup
+
+
+class StateGroup:
+    __slots__ = ('id', 'path', 'states', 'current', 'loaded')
+
+    def __init__(self, stategroup_id: str, path: str, current='None'):
+        self.id = sys.intern(stategroup_id)
+        self.path = path
+        # [State, ...] in Wwise order.
+        self.states = []
+        # Name of current State.
+        self.current = sys.intern(current)
+        # False while States are not fetched yet. Then states is empty.
+        self.loaded = True
+
+    @property
+    def name(self) -> str:
+        return self.path.split('\\')[-1]
+
+    def state_names(self) -> list:
+        return [state.name for state in self.states]
+
+
+class StateNameChange:
+    __slots__ = ('id', 'old_name', 'new_name')
+
+    def __init__(self, state_id: str, old_name, new_name):
+        self.id = state_id
+        # None for added State.
+        self.old_name = old_name
+        # None for deleted State.
+        self.new_name = new_name
+
+
+class StateGroupChange:
+    __slots__ = ('old_path', 'new_path', 'states')
+
+    def __init__(self):
+        # Set when StateGroup was renamed.
+        self.old_path = None
+        self.new_path = None
+        # { 'State GUID' : StateNameChange }
+        self.states = {}
+
+
+class RegistryDelta:
+    __slots__ = ('stategroups', 'states', 'currents')
+
+    def __init__(self):
+        # { 'StateGroup GUID' : 'added' or 'removed' or 'moved' }
+        self.stategroups = {}
+        # {'StateGroup GUID', ...} whose States were added, removed or renamed.
+        self.states = set()
+        # {'StateGroup GUID', ...} whose current State changed.
+        self.currents = set()
+
+    def __bool__(self):
+        return bool(self.stategroups or self.states or self.currents)
+
+
+class StateRegistry:
+    """StateGroups and States of a project.\n
+    StateGroups are kept sorted by path. Each change moves only the affected
+    StateGroup, so the order never has to be rebuilt.
+    Not thread-safe. Owner must serialize changes.
+    """
+
+    def __init__(self):
+        # { 'StateGroup GUID' : StateGroup }
+        self.__stategroups = {}
+        # { 'State GUID' : State }
+        self.__states = {}
+        # StateGroups sorted by path & their sort keys (path, GUID) for bisect.
+        self.__order = []
+        self.__keys = []
+        # filePath of the project. Set by owner.
+        self.project_path = None
+
+    def __len__(self):
+        return len(self.__stategroups)
+
+    def __contains__(self, stategroup_id):
+        return stategroup_id in self.__stategroups
+
+    def __iter__(self):
+        return iter(self.__order)
+
+    def get(self, stategroup_id: str, default=None) -> StateGroup:
+        return self.__stategroups.get(stategroup_id, default)
+
+    def ids(self) -> list:
+        """Return StateGroup GUIDs in path order."""
+        return [stategroup.id for stategroup in self.__order]
+
+    def find_state(self, state_id: str) -> State:
+        """Return State by GUID. None if unknown."""
+        return self.__states.get(state_id)
+
+    def find_stategroup(self, path: str) -> StateGroup:
+        """Return StateGroup by path. None if unknown."""
+        position = bisect.bisect_left(self.__keys, (path,))
+        if position < len(self.__order) and self.__order[position].path == path:
+            return self.__order[position]
+        return None
+
+    def clear(self):
+        self.__stategroups.clear()
+        self.__states.clear()
+        self.__order.clear()
+        self.__keys.clear()
+
+    def add_stategroup(self, stategroup_id: str, path: str, current='None') -> StateGroup:
+        stategroup = StateGroup(stategroup_id, path, current)
+        self.__stategroups[stategroup.id] = stategroup
+        self.__insert_order(stategroup)
+        return stategroup
+
+    def remove_stategroup(self, stategroup_id: str) -> StateGroup:
+        """Remove StateGroup and its States. Return removed StateGroup or None if unknown."""
+        stategroup = self.__stategroups.pop(stategroup_id, None)
+        if stategroup is None:
+            return None
+        self.__remove_order(stategroup)
+        for state in stategroup.states:
+            self.__states.pop(state.id, None)
+        return stategroup
+
+    def move_stategroup(self, stategroup: StateGroup, path: str):
+        """Change path of StateGroup and keep path order."""
+        self.__remove_order(stategroup)
+        stategroup.path = path
+        self.__insert_order(stategroup)
+
+    def add_state(self, stategroup: StateGroup, state_id: str, name: str) -> State:
+        state = State(state_id, name, stategroup)
+        stategroup.states.append(state)
+        self.__states[state.id] = state
+        return state
+
+    def remove_state(self, state_id: str) -> State:
+        """Remove State. Return removed State or None if unknown."""
+        state = self.__states.pop(state_id, None)
+        if state is not None:
+            state.stategroup.states.remove(state)
+        return state
+
+    def rename_state(self, state: State, name: str):
+        state.name = sys.intern(name)
+
+    def load_states(self, stategroup: StateGroup, states: list, delta: RegistryDelta = None) -> bool:
+        """Set fetched States of StateGroup. Return True if they differ from before.\n
+        Args:
+            states (list): [('State GUID', 'State Name'), ...]
+            delta (RegistryDelta): Optional. StateGroups which States moved from are added to its states.
+        """
+        changed = self.__update_states(stategroup, states, delta) or not stategroup.loaded
+        stategroup.loaded = True
+        return changed
+
+    def unload_states(self, stategroup: StateGroup) -> bool:
+        """Forget States of StateGroup until loaded again. Return True if they were loaded."""
+        if not stategroup.loaded:
+            return False
+        for state in stategroup.states:
+            self.__states.pop(state.id, None)
+        stategroup.states = []
+        stategroup.loaded = False
+        return True
+
+    def update(self, records) -> RegistryDelta:
+        """Reconcile with fetched project. Unchanged records keep their objects.\n
+        Args:
+            records: Iterable of ('StateGroup GUID', 'StateGroup Path',
+                                  [('State GUID', 'State Name'), ...], 'Current State Name')
+                     States are None when not fetched. Then the StateGroup is unloaded.
+        Returns:
+            RegistryDelta: StateGroups which differ from before.
+        """
+        delta = RegistryDelta()
+        # Sort once when loading into empty registry, insert one by one otherwise.
+        initial = not self.__stategroups
+        fetched = set()
+        for stategroup_id, path, states, current in records:
+            fetched.add(stategroup_id)
+            stategroup = self.__stategroups.get(stategroup_id)
+            if stategroup is None:
+                stategroup = StateGroup(stategroup_id, path, current)
+                self.__stategroups[stategroup.id] = stategroup
+                delta.stategroups[stategroup.id] = 'added'
+                if initial:
+                    self.__order.append(stategroup)
+                else:
+                    self.__insert_order(stategroup)
+            else:
+                if stategroup.path != path:
+                    self.move_stategroup(stategroup, path)
+                    delta.stategroups[stategroup.id] = 'moved'
+                if stategroup.current != current:
+                    stategroup.current = sys.intern(current)
+                    delta.currents.add(stategroup.id)
+            if states is None:
+                if self.unload_states(stategroup):
+                    delta.states.add(stategroup.id)
+            elif self.load_states(stategroup, states, delta):
+                delta.states.add(stategroup.id)
+
+        for stategroup_id in [k for k in self.__stategroups if k not in fetched]:
+            self.remove_stategroup(stategroup_id)
+            delta.stategroups[stategroup_id] = 'removed'
+            # States may have moved from it before.
+            delta.states.discard(stategroup_id)
+
+        if initial:
+            self.__order.sort(key=self.__sort_key)
+            self.__keys = [self.__sort_key(stategroup) for stategroup in self.__order]
+        return delta
+
+    def __update_states(self, stategroup: StateGroup, states: list, delta: RegistryDelta = None) -> bool:
+        # Return True if States differ from before.
+        changed = len(states) != len(stategroup.states)
+        previous = {state.id: state for state in stategroup.states}
+        updated = []
+        for state_id, name in states:
+            state = previous.pop(state_id, None)
+            if state is None:
+                changed = True
+                state = self.__states.get(state_id)
+                if state is not None:
+                    # Moved from another StateGroup. It may be reconciled already or never
+                    # again, so it is reported here.
+                    state.stategroup.states.remove(state)
+                    if delta is not None:
+                        delta.states.add(state.stategroup.id)
+                    state.stategroup = stategroup
+                else:
+                    state = State(state_id, name, stategroup)
+                    self.__states[state.id] = state
+            if state.name != name:
+                state.name = sys.intern(name)
+                changed = True
+            updated.append(state)
+        for state in previous.values():
+            # Skip State which already moved to StateGroup reconciled before.
+            if state.stategroup is stategroup and self.__states.get(state.id) is state:
+                del self.__states[state.id]
+        if not changed and any(old is not new for old, new in zip(stategroup.states, updated)):
+            # Same States in another order.
+            changed = True
+        stategroup.states = updated
+        return changed
+
+    @staticmethod
+    def __sort_key(stategroup: StateGroup) -> tuple:
+        return (stategroup.path, stategroup.id)
+
+    def __insert_order(self, stategroup: StateGroup):
+        key = self.__sort_key(stategroup)
+        position = bisect.bisect(self.__keys, key)
+        self.__keys.insert(position, key)
+        self.__order.insert(position, stategroup)
+
+    def __remove_order(self, stategroup: StateGroup):
+        position = bisect.bisect_left(self.__keys, self.__sort_key(stategroup))
+        del self.__keys[position]
+        del self.__order[position]
+
+
+class StateSearchIndex:
+    """Case-insensitive substring search over StateGroup paths and State names.\n
+    Candidates of a query are the StateGroups holding its rarest trigram, or the
+    result of the last query while typing narrows it. Candidates are confirmed by
+    substring match. Queries shorter than a trigram scan all texts.
+    """
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        # { 'StateGroup GUID' : 'lowercase path and State names' }
+        self.__texts = {}
+        # { 'trigram' : {'StateGroup GUID', ...} }
+        self.__trigrams = {}
+        # ('query', {'StateGroup GUID', ...}) of last search. Reset on any change.
+        self.__last_search = (None, set())
+
+    def __len__(self):
+        return len(self.__texts)
+
+    @classmethod
+    def __grams(cls, text: str) -> set:
+        return {text[i:i + cls.GRAM_SIZE] for i in range(len(text) - cls.GRAM_SIZE + 1)}
+
+    @staticmethod
+    def __text(stategroup: StateGroup) -> str:
+        # Separator keeps a query from matching across path and names.
+        return '\n'.join([stategroup.path] + stategroup.state_names()).lower()
+
+    def rebuild(self, registry: StateRegistry):
+        self.__last_search = (None, set())
+        self.__texts.clear()
+        self.__trigrams.clear()
+        for stategroup in registry:
+            self.update_stategroup(stategroup)
+
+    def update_stategroup(self, stategroup: StateGroup):
+        """Add StateGroup or re-index it after rename. Only changed trigrams are touched."""
+        text = self.__text(stategroup)
+        old_text = self.__texts.get(stategroup.id)
+        if old_text == text:
+            return
+        self.__last_search = (None, set())
+        old_grams = self.__grams(old_text) if old_text is not None else set()
+        new_grams = self.__grams(text)
+        for gram in old_grams - new_grams:
+            self.__discard(gram, stategroup.id)
+        for gram in new_grams - old_grams:
+            self.__trigrams.setdefault(gram, set()).add(stategroup.id)
+        self.__texts[stategroup.id] = text
+
+    def remove_stategroup(self, stategroup_id: str):
+        old_text = self.__texts.pop(stategroup_id, None)
+        if old_text is None:
+            return
+        self.__last_search = (None, set())
+        for gram in self.__grams(old_text):
+            self.__discard(gram, stategroup_id)
+
+    def __discard(self, gram: str, stategroup_id: str):
+        ids = self.__trigrams.get(gram)
+        if ids is None:
+            return
+        ids.discard(stategroup_id)
+        if not ids:
+            del self.__trigrams[gram]
+
+    def search(self, query: str) -> set:
+        """Return GUIDs of StateGroups whose path or State name contains query."""
+        query = query.lower()
+        if len(query) < self.GRAM_SIZE:
+            candidates = self.__texts.keys()
+        else:
+            candidates = None
+            for gram in self.__grams(query):
+                ids = self.__trigrams.get(gram)
+                if ids is None:
+                    self.__last_search = (query, set())
+                    return set()
+                if candidates is None or len(ids) < len(candidates):
+                    candidates = ids
+        # While typing, the new query contains the last one, so its result is a narrower candidate set.
+        last_query, last_matches = self.__last_search
+        if last_query is not None and last_query in query and len(last_matches) < len(candidates):
+            candidates = last_matches
+        # Trigrams can match out of order, so confirm with the text.
+        texts = self.__texts
+        matches = {stategroup_id for stategroup_id in candidates if query in texts[stategroup_id]}
+        self.__last_search = (query, matches)
+        return matches
+
+
+class PendingChanges:
+    """State changes picked by user until Wwise confirms them.\n
+    A StateGroup is PENDING while picked but not sent, and SENT until its stateChanged
+    reports the sent State. Every StateGroup whose status changed is collected, so the
+    owner redraws only those.
+    Not thread-safe. Owner must serialize changes.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+
+    def __init__(self):
+        # { 'StateGroup GUID' : 'State Name' }
+        self.pending = {}
+        self.sent = {}
+        # {'StateGroup GUID', ...} whose status changed since take_changed().
+        self.__changed = set()
+
+    def __contains__(self, stategroup_id):
+        return stategroup_id in self.pending or stategroup_id in self.sent
+
+    def status(self, stategroup_id: str) -> str:
+        """Return PENDING, SENT or None."""
+        if stategroup_id in self.pending:
+            return self.PENDING
+        if stategroup_id in self.sent:
+            return self.SENT
+        return None
+
+    def state(self, stategroup_id: str, default=None) -> str:
+        """Return State Name picked for StateGroup, or default if none."""
+        return self.pending.get(stategroup_id, self.sent.get(stategroup_id, default))
+
+    def pick(self, stategroup: StateGroup, state_name: str):
+        """Record user's pick. Picking the current State again cancels the change."""
+        if state_name == stategroup.current and stategroup.id not in self.sent:
+            self.discard(stategroup.id)
+            return
+        if self.pending.get(stategroup.id) != state_name:
+            self.pending[stategroup.id] = state_name
+            self.__changed.add(stategroup.id)
+
+    def update(self, states: dict):
+        """Pick { 'StateGroup GUID' : 'State Name' } at once, e.g. of a preset."""
+        for stategroup_id, state_name in states.items():
+            if self.pending.get(stategroup_id) != state_name:
+                self.pending[stategroup_id] = state_name
+                self.__changed.add(stategroup_id)
+
+    def discard(self, stategroup_id: str):
+        if self.pending.pop(stategroup_id, None) is not None or self.sent.pop(stategroup_id, None) is not None:
+            self.__changed.add(stategroup_id)
+
+    def clear(self):
+        self.__changed.update(self.pending, self.sent)
+        self.pending.clear()
+        self.sent.clear()
+
+    def prune(self, registry: StateRegistry):
+        """Discard changes of StateGroups which are no longer in registry."""
+        for stategroup_id in [k for k in list(self.pending) + list(self.sent) if k not in registry]:
+            self.discard(stategroup_id)
+
+    def take_pending(self) -> dict:
+        """Return pending changes to send and mark them SENT."""
+        pending, self.pending = self.pending, {}
+        self.sent.update(pending)
+        # Status changes from PENDING to SENT.
+        self.__changed.update(pending)
+        return pending
+
+    def confirm(self, stategroup_id: str, current: str):
+        """Apply current State reported by stateChanged."""
+        if self.sent.get(stategroup_id) == current:
+            del self.sent[stategroup_id]
+            self.__changed.add(stategroup_id)
+        if self.pending.get(stategroup_id) == current and stategroup_id not in self.sent:
+            # Picked State was set by someone else.
+            del self.pending[stategroup_id]
+            self.__changed.add(stategroup_id)
+
+    def apply_results(self, results: dict, registry: StateRegistry, confirmed_by_event=True):
+        """Apply results of StateUtility.set_states.\n
+        Failed changes become PENDING again unless user picked another State meanwhile.
+        Args:
+            confirmed_by_event (bool): False if stateChanged is not subscribed, e.g. before
+                                       Wwise 2022. Then success confirms the change.
+        """
+        for stategroup_id, result in results.items():
+            if stategroup_id not in self.sent:
+                # Already confirmed by stateChanged.
+                continue
+            if not result['success']:
+                del self.sent[stategroup_id]
+                self.pending.setdefault(stategroup_id, result['state'])
+                self.__changed.add(stategroup_id)
+                continue
+            stategroup = registry.get(stategroup_id)
+            if not confirmed_by_event or (stategroup is not None and stategroup.current == self.sent[stategroup_id]):
+                # stateChanged may have been taken before the result arrived.
+                del self.sent[stategroup_id]
+                self.__changed.add(stategroup_id)
+
+    def take_changed(self) -> set:
+        """Return StateGroup GUIDs whose status changed since last call."""
+        changed, self.__changed = self.__changed, set()
+        return changed
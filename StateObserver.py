@@ -1,4 +1,15 @@
 #! python3
+import collections
+import threading
+import time
+import traceback
+
+from StateMetrics import metrics
+
+# Values of 'callback_executor' setting. Defined here, so settings are validated
+# without importing the WAAPI client stack of StateConnectionPool.
+CALLBACK_EXECUTORS = ('sequential', 'pooled')
+
 
 class Subject:
     def __init__(self):
@@ -14,20 +25,27 @@ class Subject:
         self.__observers.remove(observer)
 
     def notify_observer_of_waapi_connected(self):
-        for observer in self.__observers:
-            observer.on_waapi_connected(self)
+        self.__notify('on_waapi_connected')
 
     def notify_observer_of_waapi_disconnected(self):
-        for observer in self.__observers:
-            observer.on_waapi_disconnected(self)
+        self.__notify('on_waapi_disconnected')
 
     def notify_observer_of_statename_changed(self):
-        for observer in self.__observers:
-            observer.on_statename_changed(self)
+        self.__notify('on_statename_changed')
 
     def notify_observer_of_currentstate_changed(self):
-        for observer in self.__observers:
-            observer.on_currentstate_changed(self)
+        self.__notify('on_currentstate_changed')
+
+    def notify_observer_of_stategroup_changed(self):
+        self.__notify('on_stategroup_changed')
+
+    def notify_observer_of_load_progress(self):
+        self.__notify('on_load_progress')
+
+    def __notify(self, event: str):
+        with metrics.timer('notify:' + event):
+            for observer in self.__observers:
+                getattr(observer, event)(self)
 
     __iadd__ = add_observer
     __isub__ = remove_observer
@@ -37,14 +55,231 @@ class Observer:
     def __init__(self):
         pass
 
-    def on_waapi_connected():
+    def on_waapi_connected(self, subject):
+        pass
+
+    def on_waapi_disconnected(self, subject):
+        pass
+
+    def on_statename_changed(self, subject):
         pass
 
-    def on_waapi_disconnected():
+    def on_currentstate_changed(self, subject):
         pass
 
-    def on_statename_changed():
+    def on_stategroup_changed(self, subject):
         pass
 
-    def on_currentstate_changed():
+    def on_load_progress(self, subject):
         pass
+
+
+class EventQueue:
+    """Bounded queue of observer notifications.\n
+    post() may be called from any thread, drain() from the consumer thread.
+    When full, policy decides which notification is lost:
+        'drop_oldest': The oldest notification in queue (default).
+        'drop_newest': The posted notification.
+        'block': Poster waits for the consumer up to block_timeout(sec), then the oldest.
+                 The consumer thread itself never waits, so it cannot deadlock on its own queue.
+    """
+    DEFAULT_MAXLEN = 10000
+    DEFAULT_BLOCK_TIMEOUT = 1.0
+    POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+    def __init__(self, maxlen=DEFAULT_MAXLEN, policy='drop_oldest', block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown queue policy: " + str(policy))
+        self.maxlen = maxlen
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.__queue = collections.deque()
+        # Wakes the consumer on post and blocked posters on drain.
+        self.__condition = threading.Condition()
+        # Thread ident of the last drain() caller.
+        self.__consumer = None
+        self.__started = time.perf_counter()
+        self.posted = 0
+        self.drained = 0
+        self.dropped = 0
+        # Number of posts which waited for the consumer.
+        self.blocked = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.__queue)
+
+    def post(self, event: str, subject) -> tuple:
+        """Queue notification.\n
+        Returns:
+            tuple: (event, subject) dropped to make room, or None.
+        """
+        with self.__condition:
+            self.posted += 1
+            if len(self.__queue) >= self.maxlen and self.policy == 'block' \
+                    and threading.get_ident() != self.__consumer:
+                self.blocked += 1
+                self.__condition.wait_for(lambda: len(self.__queue) < self.maxlen, self.block_timeout)
+            dropped = None
+            if len(self.__queue) >= self.maxlen:
+                self.dropped += 1
+                if self.policy == 'drop_newest':
+                    return event, subject
+                dropped = self.__queue.popleft()
+            self.__queue.append((event, subject))
+            self.max_depth = max(self.max_depth, len(self.__queue))
+            self.__condition.notify_all()
+        return dropped
+
+    def drain(self, max_events: int) -> list:
+        with self.__condition:
+            self.__consumer = threading.get_ident()
+            events = []
+            while len(events) < max_events and self.__queue:
+                events.append(self.__queue.popleft())
+            self.drained += len(events)
+            if events:
+                self.__condition.notify_all()
+        return events
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until a notification is posted or wake() is called.\n
+        Returns:
+            bool: True if queue is not empty.
+        """
+        with self.__condition:
+            if not self.__queue:
+                self.__condition.wait(timeout)
+            return len(self.__queue) > 0
+
+    def wake(self):
+        """Release threads waiting in wait()."""
+        with self.__condition:
+            self.__condition.notify_all()
+
+    @property
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.__started
+        return {'posted': self.posted,
+                'drained': self.drained,
+                'dropped': self.dropped,
+                'blocked': self.blocked,
+                'depth': len(self.__queue),
+                'max_depth': self.max_depth,
+                'policy': self.policy,
+                'throughput': self.drained / elapsed if elapsed > 0 else 0.0}
+
+
+class QueuedObserver(Observer):
+    """Observer proxy which posts notifications to EventQueue.\n
+    Notifications are delivered to target on the thread which calls dispatch().
+    With coalesce, a change notification already waiting in the queue is not
+    posted again. Subject accumulates the changes, so the target handles all
+    of them at once.
+    """
+    # Notifications which can be coalesced. Connection notifications keep their order.
+    COALESCED_EVENTS = ('on_statename_changed', 'on_currentstate_changed',
+                        'on_stategroup_changed', 'on_load_progress')
+
+    def __init__(self, target: Observer, queue: EventQueue = None, coalesce=True, name='queue'):
+        """
+        Args:
+            name (str): Prefix of metrics gauges, e.g. 'queue' reports 'queue.depth'.
+        """
+        self.target = target
+        self.queue = queue if queue is not None else EventQueue()
+        self.coalesce = coalesce
+        self.name = name
+        self.coalesced = 0
+        # {(event, id(subject))} waiting in queue.
+        self.__pending = set()
+
+    def __post(self, event: str, subject):
+        if self.coalesce and event in self.COALESCED_EVENTS:
+            key = (event, id(subject))
+            if key in self.__pending:
+                self.coalesced += 1
+                return
+            self.__pending.add(key)
+        dropped = self.queue.post(event, subject)
+        if dropped is not None:
+            # Dropped notification is no longer waiting, so the next one must be posted.
+            self.__pending.discard((dropped[0], id(dropped[1])))
+
+    def on_waapi_connected(self, subject):
+        self.__post('on_waapi_connected', subject)
+
+    def on_waapi_disconnected(self, subject):
+        self.__post('on_waapi_disconnected', subject)
+
+    def on_statename_changed(self, subject):
+        self.__post('on_statename_changed', subject)
+
+    def on_currentstate_changed(self, subject):
+        self.__post('on_currentstate_changed', subject)
+
+    def on_stategroup_changed(self, subject):
+        self.__post('on_stategroup_changed', subject)
+
+    def on_load_progress(self, subject):
+        self.__post('on_load_progress', subject)
+
+    def dispatch(self, max_events: int) -> int:
+        """Deliver up to max_events queued notifications to target.\n
+        Returns:
+            int: Number of delivered notifications.
+        """
+        events = self.queue.drain(max_events)
+        for event, subject in events:
+            # Release before delivery, so changes made while target runs are posted again.
+            self.__pending.discard((event, id(subject)))
+            try:
+                with metrics.timer('handler:' + event):
+                    getattr(self.target, event)(subject)
+            except Exception:
+                # Keep delivering the rest of the batch.
+                traceback.print_exc()
+        metrics.gauge(self.name + '.depth', len(self.queue))
+        metrics.gauge(self.name + '.max_depth', self.queue.max_depth)
+        metrics.gauge(self.name + '.dropped', self.queue.dropped)
+        metrics.gauge(self.name + '.coalesced', self.coalesced)
+        return len(events)
+
+
+class ThreadedObserver(QueuedObserver):
+    """QueuedObserver which delivers notifications to target on its own thread.\n
+    Subject only posts to the queue, so a slow target, e.g. a logger, never delays
+    WAAPI callbacks or other observers. When target falls behind, the policy of
+    queue decides between dropping notifications and slowing the poster down.
+    """
+    # Max notifications delivered between checks for stop().
+    DISPATCH_BATCH = 100
+    # Bounds the wait when stop() wakes the thread just before it starts waiting.
+    IDLE_TIMEOUT = 0.5
+
+    def __init__(self, target: Observer, queue: EventQueue = None, coalesce=True, name='observer'):
+        super().__init__(target, queue, coalesce, name)
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """Start delivery thread. Return self, so it can be passed to add_observer()."""
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run, name=self.name, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """Deliver queued notifications, then stop delivery thread."""
+        self.__stop_event.set()
+        self.queue.wake()
+        if wait and self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def __run(self):
+        while True:
+            stopping = self.__stop_event.is_set()
+            if self.dispatch(self.DISPATCH_BATCH) == 0:
+                if stopping:
+                    return
+                self.queue.wait(self.IDLE_TIMEOUT)
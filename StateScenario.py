@@ -0,0 +1,292 @@
+#! python3
+import json
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+
+from StateMetrics import metrics
+from StateModel import StateRegistry
+
+
+class StatePresetStore:
+    """Named sets of States saved on disk.\n
+    StateGroups are stored by path, so presets survive reloads and work with other
+    branches of the project whose GUIDs differ.
+    File layout:
+    {'version': PRESET_VERSION,
+     'presets': {'Preset Name': {'StateGroup Path': 'State Name', ...}}}
+    """
+    # Increment when layout changes. File with another version is ignored.
+    PRESET_VERSION = 1
+    DEFAULT_FILENAME = 'WwiseStateBrowser.presets'
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else os.path.join(
+            os.getcwd(), self.DEFAULT_FILENAME)
+        self.presets = self.__read()
+
+    def __read(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                store = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(store, dict) or store.get('version') != self.PRESET_VERSION:
+            return {}
+        return store.get('presets', {})
+
+    def names(self) -> list:
+        return sorted(self.presets)
+
+    def get(self, name: str) -> dict:
+        """Return { 'StateGroup Path' : 'State Name' } of preset. None if unknown."""
+        return self.presets.get(name)
+
+    def save(self, name: str, states: dict):
+        """Add or replace preset and write the file.\n
+        Args:
+            states (dict): { 'StateGroup Path' : 'State Name' }
+        """
+        self.presets[name] = dict(states)
+        self.__write()
+
+    def delete(self, name: str):
+        if self.presets.pop(name, None) is not None:
+            self.__write()
+
+    def __write(self):
+        # Write to temporary file and replace, so a crash never leaves a broken file.
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.PRESET_VERSION, 'presets': self.presets}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+
+def paths_from_ids(registry: StateRegistry, states: dict) -> dict:
+    """Return { 'StateGroup Path' : 'State Name' } of { 'StateGroup GUID' : 'State Name' }.\n
+    Unknown StateGroups are skipped.
+    """
+    ret = {}
+    for stategroup_id, state_name in states.items():
+        stategroup = registry.get(stategroup_id)
+        if stategroup is not None:
+            ret[stategroup.path] = state_name
+    return ret
+
+
+def ids_from_paths(registry: StateRegistry, states: dict) -> dict:
+    """Return { 'StateGroup GUID' : 'State Name' } for setState.\n
+    Keys which are not a known path are kept as is, because ak.soundengine.setState
+    also accepts GUID, name or Short ID.
+    Raises:
+        ValueError: A path of StateGroup which is not in registry.
+    """
+    ret = {}
+    for key, state_name in states.items():
+        stategroup = registry.find_stategroup(key)
+        if stategroup is not None:
+            key = stategroup.id
+        elif key.startswith('\\'):
+            raise ValueError("Unknown StateGroup: " + key)
+        ret[key] = state_name
+    return ret
+
+
+class Scenario:
+    """Timed sequence of State sets.\n
+    File layout:
+    {'repeat': 1,
+     'steps': [{'delay': sec after previous step, 'preset': 'Preset Name'},
+               {'delay': sec after previous step, 'set': {'StateGroup Path, GUID or name': 'State Name', ...}},
+               ...]}
+    Delay of the first step is counted from start. Each repeat starts one step
+    delay after the last step of the previous one.
+    """
+
+    def __init__(self, steps: list, repeat=1, name=""):
+        self.steps = steps
+        self.repeat = max(1, repeat)
+        self.name = name
+
+    @classmethod
+    def load(cls, path: str) -> 'Scenario':
+        """Return Scenario of JSON file.\n
+        Raises:
+            OSError, ValueError: File cannot be read or has no steps.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+        if not isinstance(script, dict) or not isinstance(script.get('steps'), list):
+            raise ValueError("Scenario must be a JSON object with 'steps'.")
+        return cls(script['steps'], script.get('repeat', 1),
+                   script.get('name', os.path.splitext(os.path.basename(path))[0]))
+
+    def compile(self, registry: StateRegistry, presets: StatePresetStore = None) -> list:
+        """Return [(Offset from start(sec), { 'StateGroup GUID' : 'State Name' }), ...].\n
+        Raises:
+            ValueError: Unknown preset or StateGroup path, or malformed step.
+        """
+        steps = []
+        for index, step in enumerate(self.steps):
+            if not isinstance(step, dict):
+                raise ValueError("Step {} must be a JSON object.".format(index))
+            if 'preset' in step:
+                states = presets.get(step['preset']) if presets is not None else None
+                if states is None:
+                    raise ValueError("Unknown preset in step {}: {}".format(index, step['preset']))
+            elif isinstance(step.get('set'), dict):
+                states = step['set']
+            else:
+                raise ValueError("Step {} needs 'preset' or 'set'.".format(index))
+            steps.append((float(step.get('delay', 0.0)), ids_from_paths(registry, states)))
+
+        ret = []
+        offset = 0.0
+        for i in range(self.repeat):
+            for delay, states in steps:
+                offset += delay
+                ret.append((offset, states))
+        return ret
+
+
+def summarize_ms(values: list) -> dict:
+    """Return summary of values(sec) in milliseconds."""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    return {'count': len(values),
+            'mean_ms': statistics.mean(values) * 1000,
+            'median_ms': statistics.median(values) * 1000,
+            'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+            'max_ms': values[-1] * 1000}
+
+
+class ScenarioPlayer:
+    """Play compiled Scenario against StateUtility and report timing.\n
+    Each step fires at start + its offset, not at previous step + delay, so a late
+    step never delays the following ones and drift does not accumulate. The scheduler
+    sleeps until SPIN before the deadline, then spins for the rest, because sleep
+    overshoots by up to a timer tick.
+    The scheduler only queues setState calls to lanes, so a step is not held up by
+    the round trips of the previous one. Calls of a StateGroup always take the same
+    lane, so its States are applied in script order.
+    """
+    # Timer tick is ~15.6ms on Windows, <0.1ms elsewhere.
+    SPIN = 0.016 if sys.platform == 'win32' else 0.002
+    # WaapiClient handles one request at a time and concurrent callers race on it,
+    # so one lane sends every call in order.
+    DEFAULT_LANES = 1
+
+    def __init__(self, client, steps: list, listener=None, lanes=DEFAULT_LANES):
+        """
+        Args:
+            client (StateUtility): Connected client.
+            steps (list): Result of Scenario.compile().
+            listener: Optional. on_scenario_step(index, total) and on_scenario_finished(report)
+                      are called on scheduler thread.
+            lanes (int): Threads which send setState calls. Only a client which takes
+                         concurrent calls gains from more than one.
+        """
+        self.client = client
+        self.steps = steps
+        self.listener = listener
+        self.lanes = max(1, lanes)
+        self.report = None
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.play, daemon=True)
+        self.__thread.start()
+
+    def stop(self, wait=False):
+        """Skip remaining steps and queued calls. report covers the calls sent."""
+        self.__stop_event.set()
+        if wait and self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def is_running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def play(self) -> dict:
+        """Play steps on calling thread and return report when every call returned.\n
+        Returns:
+            dict: {'steps': Fired steps, 'planned_steps': int, 'sets': setState calls sent, 'failed': int,
+                   'stopped': bool, 'intended_s': Offset of last fired step, 'elapsed_s': float,
+                   'drift_ms': Lateness of last fired step,
+                   'intended_rate': Steps/sec planned, 'achieved_rate': Steps/sec fired,
+                   'step_lateness': Summary of fire time - intended time,
+                   'set_lateness': Summary of send time - intended time of each setState,
+                   'set_latency': Summary of setState round trip,
+                   'timeline': [[Step index, Intended offset(sec), Send offset(sec), Latency(sec), Success], ...]}
+        """
+        lanes = [queue.SimpleQueue() for i in range(self.lanes)]
+        # Each lane appends to its own list, merged after join.
+        timelines = [[] for i in range(self.lanes)]
+        fired = []
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self.__run_lane, args=(lane, timeline, start), daemon=True)
+                   for lane, timeline in zip(lanes, timelines)]
+        for thread in threads:
+            thread.start()
+        try:
+            for index, (offset, states) in enumerate(self.steps):
+                if not self.__wait_until(start + offset):
+                    break
+                fired.append(time.perf_counter() - start)
+                for stategroup, state in states.items():
+                    lanes[hash(stategroup) % self.lanes].put((index, offset, stategroup, state))
+                metrics.record('scenario:lateness', fired[-1] - offset)
+                if self.listener is not None:
+                    self.listener.on_scenario_step(index, len(self.steps))
+        finally:
+            for lane in lanes:
+                lane.put(None)
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+
+        timeline = sorted(entry for lane_timeline in timelines for entry in lane_timeline)
+        intended = self.steps[len(fired) - 1][0] if fired else 0.0
+        self.report = {'steps': len(fired),
+                       'planned_steps': len(self.steps),
+                       'sets': len(timeline),
+                       'failed': sum(1 for entry in timeline if not entry[4]),
+                       'stopped': self.__stop_event.is_set(),
+                       'intended_s': intended,
+                       'elapsed_s': elapsed,
+                       'drift_ms': (fired[-1] - intended) * 1000 if fired else 0.0,
+                       'intended_rate': (len(fired) - 1) / intended if intended > 0 else None,
+                       'achieved_rate': (len(fired) - 1) / fired[-1] if fired and fired[-1] > 0 else None,
+                       'step_lateness': summarize_ms([fire - self.steps[index][0] for index, fire in enumerate(fired)]),
+                       'set_lateness': summarize_ms([entry[2] - entry[1] for entry in timeline]),
+                       'set_latency': summarize_ms([entry[3] for entry in timeline]),
+                       'timeline': timeline}
+        if self.listener is not None:
+            self.listener.on_scenario_finished(self.report)
+        return self.report
+
+    def __run_lane(self, lane: queue.SimpleQueue, timeline: list, start: float):
+        while True:
+            call = lane.get()
+            if call is None:
+                return
+            if self.__stop_event.is_set():
+                continue
+            index, offset, stategroup, state = call
+            sent = time.perf_counter()
+            result = self.client.set_states({stategroup: state})[stategroup]
+            timeline.append([index, offset, sent - start, result['latency'], result['success']])
+
+    def __wait_until(self, deadline: float) -> bool:
+        # Return False if stopped.
+        remaining = deadline - time.perf_counter()
+        if remaining > self.SPIN and self.__stop_event.wait(remaining - self.SPIN):
+            return False
+        while time.perf_counter() < deadline:
+            # Yield GIL to WAAPI threads while spinning.
+            time.sleep(0)
+        return not self.__stop_event.is_set()
@@ -0,0 +1,190 @@
+#! python3
+import random
+import threading
+import time
+
+from waapi import CannotConnectToWaapiException
+from waapi.client.executor import SequentialThreadExecutor
+
+from StateHistory import StateHistory
+from StateMetrics import metrics
+from StateModel import StateRegistry
+from StateObserver import Observer
+from WwiseStateBrowserInterface import StateUtility, LoadCancelledException
+
+
+class ConnectionSupervisor:
+    """Keep a StateUtility connected to WAAPI.\n
+    Runs on its own thread. While connected, ak.wwise.core.getInfo is called every
+    heartbeat_interval. When it fails or gets no reply within heartbeat_timeout, the socket
+    drops or the project closes, the client is disconnected and a new one connects with
+    exponential backoff. Loading a new client is given up and retried the same way when a
+    call gets no reply within heartbeat_timeout, since a drop during load blocks it forever.
+    The new client reuses the last StateRegistry, so only differences are reported to observers.
+    WaapiClient cannot reconnect, so each connection is a new StateUtility.
+
+    Listener callbacks are called on supervisor thread with the supervisor first, so a
+    listener can tell a stopped supervisor's late callbacks from the current one's:
+        on_connected(supervisor, client), on_disconnected(supervisor, reason),
+        on_retry(supervisor, attempt, delay, error), on_stopped(supervisor)
+    """
+    DEFAULT_HEARTBEAT_INTERVAL = 1.0
+    # A hung Wwise keeps the socket open but never replies.
+    DEFAULT_HEARTBEAT_TIMEOUT = 2.0
+    DEFAULT_BACKOFF_INITIAL = 0.25
+    DEFAULT_BACKOFF_MAX = 8.0
+
+    def __init__(self, url=None, observer: Observer = None, history: StateHistory = None,
+                 registry: StateRegistry = None, listener=None, callback_executor=SequentialThreadExecutor, lazy=False,
+                 watch=None, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT,
+                 backoff_initial=DEFAULT_BACKOFF_INITIAL, backoff_max=DEFAULT_BACKOFF_MAX):
+        self.url = url
+        self.observer = observer
+        self.history = history
+        self.listener = listener
+        self.callback_executor = callback_executor
+        # Passed to StateUtility.
+        self.lazy = lazy
+        # StateGroups watched by client. Kept across reconnection, see StateUtility.watch().
+        self.watched = watch
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+        self.client: StateUtility = None
+        # Last known project & State information. Survive disconnection.
+        self.wproj_info = None
+        self.registry = registry
+        self.reconnect_count = 0
+
+        # Subscriptions applied to every client. [(topic, callback, options)]
+        self.__subscriptions = [("ak.wwise.core.project.preClosed",
+                                 lambda *args, **kwargs: self.__on_connection_lost("Project closed."), None)]
+        # Observers added to every client in addition to observer.
+        self.__observers = []
+        self.__observer_lock = threading.Lock()
+        self.__stop_event = threading.Event()
+        # Set to wake up supervisor thread when connection is lost or on stop.
+        self.__wakeup_event = threading.Event()
+        self.__lost_reason = None
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self, wait=False):
+        """Stop supervising and disconnect. Can be called from any thread."""
+        self.__stop_event.set()
+        self.__wakeup_event.set()
+        if wait and self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def is_running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def subscribe(self, topic: str, callback, options: dict = None):
+        """Subscribe topic on current and every future client."""
+        self.__subscriptions.append((topic, callback, options))
+        client = self.client
+        if client is not None:
+            client.subscribe(topic, callback, options)
+
+    def add_observer(self, observer: Observer):
+        """Observe current and every future client. Notified of connection when added."""
+        with self.__observer_lock:
+            self.__observers.append(observer)
+            client = self.client
+            if client is not None:
+                client.add_observer(observer)
+                observer.on_waapi_connected(client)
+
+    def __notify(self, event: str, *args):
+        callback = getattr(self.listener, event, None)
+        if callback is not None:
+            callback(self, *args)
+
+    def __on_connection_lost(self, reason: str):
+        # Called on WAAPI callback thread.
+        self.__lost_reason = reason
+        self.__wakeup_event.set()
+
+    def __run(self):
+        attempt = 0
+        while not self.__stop_event.is_set():
+            error = self.__connect()
+            if self.client is not None:
+                attempt = 0
+                self.__supervise()
+                continue
+            if self.__stop_event.is_set():
+                break
+            delay = min(self.backoff_max, self.backoff_initial * (2 ** attempt))
+            # Jitter keeps several browsers from retrying in lockstep.
+            delay *= random.uniform(0.9, 1.1)
+            attempt += 1
+            self.__notify('on_retry', attempt, delay, error)
+            self.__stop_event.wait(delay)
+        self.__notify('on_stopped')
+
+    def __connect(self) -> Exception:
+        """Connect new client. Return error if failed."""
+        self.__wakeup_event.clear()
+        self.__lost_reason = None
+        start = time.perf_counter()
+        try:
+            client = StateUtility(self.url, callback_executor=self.callback_executor, observer=self.observer,
+                                  cancel_event=self.__stop_event, history=self.history, registry=self.registry,
+                                  lazy=self.lazy, watch=self.watched, call_timeout=self.heartbeat_timeout)
+        except LoadCancelledException:
+            return None
+        except CannotConnectToWaapiException as e:
+            return e
+        except Exception as e:
+            # E.g. Wwise is running without a project. Retry like connection failure.
+            return e
+        if self.__stop_event.is_set():
+            client.disconnect()
+            return None
+
+        for topic, callback, options in self.__subscriptions:
+            client.subscribe(topic, callback, options)
+        if self.wproj_info is not None:
+            self.reconnect_count += 1
+            metrics.record('reconnect', time.perf_counter() - start)
+        self.wproj_info = client.wproj_info
+        self.registry = client.state_in_wwise
+        with self.__observer_lock:
+            for observer in self.__observers:
+                client.add_observer(observer)
+                observer.on_waapi_connected(client)
+            self.client = client
+        self.__notify('on_connected', client)
+        return None
+
+    def __supervise(self):
+        client = self.client
+        reason = None
+        while reason is None:
+            if self.__wakeup_event.wait(self.heartbeat_interval):
+                reason = "Stopped." if self.__stop_event.is_set() else self.__lost_reason
+            elif not self.__heartbeat(client):
+                reason = "Heartbeat failed."
+        self.client = None
+        # Watched StateGroups may have been changed on the client.
+        self.watched = client.watched
+        # Subscriptions are dropped with the connection.
+        client.disconnect(self.heartbeat_timeout)
+        self.__notify('on_disconnected', reason)
+
+    def __heartbeat(self, client: StateUtility) -> bool:
+        if not client.is_connected():
+            return False
+        # WaapiClient.call has no timeout, so call on another thread and stop waiting at timeout.
+        result = []
+        thread = threading.Thread(target=lambda: result.append(client.call("ak.wwise.core.getInfo")), daemon=True)
+        with metrics.timer('heartbeat'):
+            thread.start()
+            thread.join(self.heartbeat_timeout)
+        return bool(result) and result[0] is not None
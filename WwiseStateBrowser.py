@@ -1,95 +1,365 @@
 #! python3
-import os
+# Annotations only name WAAPI classes, so the WAAPI stack is imported when first used.
+from __future__ import annotations
+
+import argparse
 import configparser
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import typing
 
-import WwiseStateBrowserInterface
 import WwiseStateBrowserGUI
+from StateCache import StateCache
+from StateMetrics import metrics
+from StateObserver import CALLBACK_EXECUTORS, EventQueue
+
+if typing.TYPE_CHECKING:
+    from StateConnectionPool import ConnectionPool
+    from StateSupervisor import ConnectionSupervisor
+    from WwiseStateBrowserInterface import StateUtility
+
+INI_FILENAME = 'WwiseStateBrowser.ini'
+
+
+class StartupTimer:
+    """Milliseconds from start to each startup step.\n
+    Starts when this module is imported, so imports of this module are not counted.
+    Run with python -X importtime to see them.
+    Steps are also reported as 'startup.<step>_ms' gauges of metrics.
+    """
+
+    def __init__(self, launched: float):
+        self.launched = launched
+        # { 'Step' : Milliseconds since launch } in order of steps.
+        self.steps = {}
+
+    def mark(self, step: str):
+        elapsed = (time.perf_counter() - self.launched) * 1000
+        self.steps.setdefault(step, elapsed)
+        metrics.gauge('startup.' + step + '_ms', round(elapsed, 1))
+
+    def report(self) -> dict:
+        return dict(self.steps)
+
+
+class MainWindowConnectionListener:
+    """Forward ConnectionSupervisor events to Tk main loop."""
 
+    def __init__(self, rootwd: WwiseStateBrowserGUI.MainWindow):
+        self.rootwd = rootwd
 
-# def main():
-#     # Load config file.
-#     config = configparser.ConfigParser()
-#     if not os.path.exists(os.getcwd()+"\\WwiseStateBrowser.ini"):
-#         with open('WwiseStateBrowser.ini', 'w') as ini:
-#             config['DEFAULT'] = {'enable_autosync': True,
-#                                  'visible_stategroup_path': False}
-#             config['SETTINGS'] = {'enableautosync': True,
-#                                   'visible_stategroup_path': False}
-#             config.write(ini)
-#     config.read('WwiseStateBrowser.ini')
+    def on_connected(self, sender: ConnectionSupervisor, client: StateUtility):
+        self.rootwd.run_in_mainloop(on_connect_completed, self.rootwd, sender, client)
+
+    def on_disconnected(self, sender: ConnectionSupervisor, reason: str):
+        self.rootwd.run_in_mainloop(on_connection_lost, self.rootwd, sender, reason)
+
+    def on_retry(self, sender: ConnectionSupervisor, attempt: int, delay: float, error: Exception):
+        self.rootwd.run_in_mainloop(on_connect_retry, self.rootwd, sender, attempt, delay, error)
+
+    def on_stopped(self, sender: ConnectionSupervisor):
+        self.rootwd.run_in_mainloop(on_supervisor_stopped, self.rootwd, sender)
+
+
+def optional_settings(**kwargs) -> dict:
+    """Return kwargs which are set, so the callee keeps its default for the others."""
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+def choice_setting(settings: configparser.SectionProxy, key: str, choices: tuple, default: str,
+                   warnings: list) -> str:
+    """Return setting if it is one of choices. Otherwise add a warning and return default."""
+    value = settings.get(key, default)
+    if value in choices:
+        return value
+    warnings.append("Unknown {} '{}' in {}, using '{}'.".format(key, value, INI_FILENAME, default))
+    return default
+
+
+def get_pool() -> ConnectionPool:
+    """Return ConnectionPool. The WAAPI client stack is imported on first call."""
+    global pool
+    with pool_lock:
+        if pool is None:
+            from StateConnectionPool import ConnectionPool, make_callback_executor
+            pool = ConnectionPool(make_callback_executor(
+                callback_executor_name, **optional_settings(workers=callback_workers)))
+            startup.mark('waapi_loaded')
+    return pool
+
+
+def load_in_background(rootwd: WwiseStateBrowserGUI.MainWindow):
+    # Runs after the window is shown. Results go to Tk main loop in this order.
+    try:
+        cached_wproj_info, cached_state_in_wwise = state_cache.load()
+        if cached_state_in_wwise is not None:
+            rootwd.run_in_mainloop(show_cached_state, rootwd, cached_wproj_info, cached_state_in_wwise)
+    except Exception:
+        # Cache is only a head start. Connecting must go ahead without it.
+        traceback.print_exc()
+    get_pool()
+    rootwd.run_in_mainloop(start_connections, rootwd)
 
-#     rootwd = WwiseStateBrowserGUI.MainWindow(
-#         config['SETTINGS']['enable_autosync'], config['SETTINGS']['visible_stategroup_path'])
-#     rootwd.protocol("WM_DELETE_WINDOW",
-#                     lambda: close_main_window(rootwd))
 
-#     rootwd.btn_connectwaapi['command'] = lambda: connect_to_wwise(rootwd)
+def show_cached_state(rootwd: WwiseStateBrowserGUI.MainWindow, wproj_info: dict, state_registry):
+    # Too late if connecting already started with the registry of the window.
+    if supervisor is None:
+        rootwd.show_cached_state(wproj_info, state_registry)
+        startup.mark('cache_shown')
 
-#     client = connect_to_wwise(rootwd)
 
-#     rootwd.mainloop()
+def start_connections(rootwd: WwiseStateBrowserGUI.MainWindow):
+    global compare_window
+    if instance_urls and compare_window is None:
+        compare_window = WwiseStateBrowserGUI.InstanceCompareWindow(rootwd, pool, rootwd.event_drain_interval,
+                                                                    event_queue_size, event_queue_policy)
+        rootwd.show_compare_button(compare_window.show)
+        for url in instance_urls:
+            # Comparison needs current States only.
+            pool.add(url, observer=compare_window.queued_observer, lazy=True,
+                     **optional_settings(heartbeat_interval=heartbeat_interval))
+    # Connect button may have been pressed while loading.
+    if supervisor is None:
+        connect_to_wwise(rootwd)
 
 
 def connect_to_wwise(rootwd: WwiseStateBrowserGUI.MainWindow):
+    global supervisor
     rootwd.show_status_message('Connecting to Wwise...')
-    try:
-        client = WwiseStateBrowserInterface.StateUtility(observer=rootwd)
+    # Connect, load & reconnect on supervisor thread, so the window keeps responding.
+    # Cached or last State information is reused to resync only differences.
+    # First column of compare window.
+    supervisor = get_pool().add(position=0,
+                                observer=rootwd.queued_observer,
+                                history=rootwd.state_history,
+                                registry=rootwd.state_registry,
+                                listener=MainWindowConnectionListener(rootwd),
+                                lazy=lazy_load_states,
+                                watch=watched_stategroups,
+                                **optional_settings(heartbeat_interval=heartbeat_interval))
+    if compare_window is not None:
+        supervisor.add_observer(compare_window.queued_observer)
+    rootwd.btn_connectwaapi['command'] = lambda: disconnect_from_wwise(rootwd)
+    rootwd.btn_connectwaapi.config(text="Cancel")
+    startup.mark('connecting')
+
+
+def on_connect_completed(rootwd: WwiseStateBrowserGUI.MainWindow, sender: ConnectionSupervisor,
+                         client: StateUtility):
+    if sender is not supervisor or supervisor.client is not client:
+        # Stopped while the result was on its way.
+        return
+    rootwd.btn_connectwaapi['command'] = lambda: disconnect_from_wwise(rootwd)
+    rootwd.btn_connectwaapi.config(text="Disconnect")
+    startup.mark('connected')
+
+
+def on_connection_lost(rootwd: WwiseStateBrowserGUI.MainWindow, sender: ConnectionSupervisor, reason: str):
+    # Late callbacks of a supervisor stopped by Disconnect or Cancel must not touch the current one.
+    if sender is not supervisor:
+        return
+    save_state_cache()
+    if supervisor.is_running():
+        rootwd.show_status_message("Connection lost: " + reason + " Reconnecting...")
+        rootwd.btn_connectwaapi.config(text="Cancel")
+
+
+def on_connect_retry(rootwd: WwiseStateBrowserGUI.MainWindow, sender: ConnectionSupervisor,
+                     attempt: int, delay: float, error: Exception):
+    if sender is not supervisor:
+        return
+    rootwd.show_status_message(
+        "{} Retry {} in {:.1f}s.".format(error if error is not None else "Not connected.", attempt, delay))
+
 
-        global handler
-        handler = client.subscribe(
-            "ak.wwise.core.project.preClosed", lambda: disconnect_from_wwise(rootwd, client))
-        rootwd.protocol("WM_DELETE_WINDOW",
-                        lambda: close_main_window(rootwd, client))
-        rootwd.btn_connectwaapi['command'] = lambda: disconnect_from_wwise(
-            rootwd, client)
-        rootwd.btn_connectwaapi.config(text="Disconnect")
+def on_supervisor_stopped(rootwd: WwiseStateBrowserGUI.MainWindow, sender: ConnectionSupervisor):
+    if sender is not supervisor:
+        return
+    rootwd.btn_connectwaapi['command'] = lambda: connect_to_wwise(rootwd)
+    rootwd.btn_connectwaapi.config(text="Connect")
 
-        return client
 
-    except WwiseStateBrowserInterface.CannotConnectToWaapiException as e:
-        rootwd.show_status_message(e)
+def save_state_cache():
+    if supervisor is None or supervisor.wproj_info is None:
         return
+    try:
+        state_cache.save(supervisor.wproj_info, supervisor.registry)
+    except OSError:
+        pass
 
 
-def disconnect_from_wwise(rootwd: WwiseStateBrowserGUI.MainWindow, client: WwiseStateBrowserInterface.StateUtility):
-    client.disconnect()
+def watched_stategroup_paths() -> list:
+    """Return paths of StateGroups watched by this window's connection. None if all."""
+    if supervisor is None:
+        return watched_stategroups
+    client = supervisor.client
+    watched = client.watched if client is not None else supervisor.watched
+    if watched is None:
+        return None
+    # Paths which were never resolved are kept as is.
+    registry = supervisor.registry
+    return sorted(registry.get(key).path if registry is not None and registry.get(key) is not None else key
+                  for key in watched)
+
+
+def disconnect_from_wwise(rootwd: WwiseStateBrowserGUI.MainWindow):
+    global supervisor, watched_stategroups
+    if supervisor is not None:
+        # Next connection watches the same StateGroups.
+        watched_stategroups = watched_stategroup_paths()
+        pool.remove(supervisor)
+        save_state_cache()
+        supervisor = None
     rootwd.btn_connectwaapi['command'] = lambda: connect_to_wwise(rootwd)
     rootwd.btn_connectwaapi.config(text="Connect")
 
 
-def close_main_window(rootwd: WwiseStateBrowserGUI.MainWindow, client: WwiseStateBrowserInterface.StateUtility = None):
-    if isinstance(client, WwiseStateBrowserInterface.StateUtility):
-        del client
+def close_main_window(rootwd: WwiseStateBrowserGUI.MainWindow):
+    disconnect_from_wwise(rootwd)
+    if pool is not None:
+        pool.stop()
 
-    with open('WwiseStateBrowser.ini', 'w') as ini:
-        config['SETTINGS'] = {'enable_autosync': rootwd.enable_autosync.get(),
-                              'visible_stategroup_path': rootwd.visible_stategroup_path.get()}
+    with open(INI_FILENAME, 'w') as ini:
+        config['SETTINGS'] = optional_settings(
+            enable_autosync=rootwd.enable_autosync.get(),
+            visible_stategroup_path=rootwd.visible_stategroup_path.get(),
+            event_drain_interval=rootwd.event_drain_interval,
+            event_drain_batch=rootwd.event_drain_batch,
+            visible_metrics=rootwd.visible_metrics.get(),
+            heartbeat_interval=heartbeat_interval,
+            lazy_load_states=lazy_load_states,
+            callback_executor=callback_executor_name,
+            callback_workers=callback_workers,
+            event_queue_size=rootwd.event_queue.maxlen,
+            event_queue_policy=rootwd.event_queue.policy,
+            instances=' '.join(instance_urls),
+            watched_stategroups='\n'.join(watched_stategroups) if watched_stategroups is not None else '')
         config.write(ini)
     rootwd.quit()
 
 
-# Config File.
-config = configparser.ConfigParser()
-if not os.path.exists(os.getcwd()+"\\WwiseStateBrowser.ini"):
-    with open('WwiseStateBrowser.ini', 'w') as ini:
+def write_default_config(config: configparser.ConfigParser):
+    # First run only, so importing the WAAPI stack for its defaults costs nothing later.
+    from StateConnectionPool import PooledCallbackExecutor
+    from StateSupervisor import ConnectionSupervisor
+    with open(INI_FILENAME, 'w') as ini:
         config['DEFAULT'] = {'enable_autosync': True,
-                             'visible_stategroup_path': False}
+                             'visible_stategroup_path': False,
+                             'event_drain_interval': WwiseStateBrowserGUI.MainWindow.DEFAULT_EVENT_DRAIN_INTERVAL,
+                             'event_drain_batch': WwiseStateBrowserGUI.MainWindow.DEFAULT_EVENT_DRAIN_BATCH,
+                             'visible_metrics': False,
+                             'heartbeat_interval': ConnectionSupervisor.DEFAULT_HEARTBEAT_INTERVAL,
+                             'lazy_load_states': False,
+                             'callback_executor': 'sequential',
+                             'callback_workers': PooledCallbackExecutor.DEFAULT_WORKERS,
+                             'event_queue_size': EventQueue.DEFAULT_MAXLEN,
+                             'event_queue_policy': 'drop_oldest',
+                             'instances': '',
+                             'watched_stategroups': ''}
         config['SETTINGS'] = {'enableautosync': True,
                               'visible_stategroup_path': False}
         config.write(ini)
-config.read('WwiseStateBrowser.ini')
 
 
-rootwd = WwiseStateBrowserGUI.MainWindow(
-    config['SETTINGS']['enable_autosync'], config['SETTINGS']['visible_stategroup_path'])
-rootwd.protocol("WM_DELETE_WINDOW",
-                lambda: close_main_window(rootwd))
+# Set by main().
+config: configparser.ConfigParser = None
+# None keeps the default of ConnectionSupervisor or callback executor.
+heartbeat_interval: float = None
+callback_workers: int = None
+# Fetch States of each StateGroup when its row is shown instead of all at connect.
+lazy_load_states = False
+# WAAPI URLs of other Wwise instances to compare with, separated by spaces.
+instance_urls = []
+# Paths of StateGroups whose stateChanged is handled, one per line. None watches all.
+watched_stategroups: list = None
+# 'sequential' or 'pooled'. Connections of this window & other instances share its threads.
+callback_executor_name = 'sequential'
+# Size & back-pressure policy of WAAPI event queues drained by windows.
+event_queue_size = EventQueue.DEFAULT_MAXLEN
+event_queue_policy = 'drop_oldest'
+# Created by get_pool() on first use.
+pool: ConnectionPool = None
+pool_lock = threading.Lock()
+supervisor: ConnectionSupervisor = None
+compare_window: WwiseStateBrowserGUI.InstanceCompareWindow = None
+state_cache: StateCache = None
+startup = StartupTimer(time.perf_counter())
+
+
+def main(argv=None) -> int:
+    global config, heartbeat_interval, callback_workers, lazy_load_states, instance_urls, \
+        callback_executor_name, event_queue_size, event_queue_policy, state_cache, watched_stategroups
+
+    parser = argparse.ArgumentParser(description="Watch and set Wwise States.")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Print milliseconds from start to each startup step as JSON at exit.")
+    parser.add_argument('--startup-only', action='store_true',
+                        help="Quit once the window is shown. Measures cold start with --startup-report.")
+    args = parser.parse_args(argv)
+
+    # Config File.
+    config = configparser.ConfigParser()
+    if not os.path.exists(os.path.join(os.getcwd(), INI_FILENAME)):
+        write_default_config(config)
+    config.read(INI_FILENAME)
+    settings = config['SETTINGS']
+    heartbeat_interval = settings.getfloat('heartbeat_interval', None)
+    lazy_load_states = settings.getboolean('lazy_load_states', False)
+    instance_urls = settings.get('instances', '').split()
+    watched_stategroups = [path.strip() for path in settings.get('watched_stategroups', '').splitlines()
+                           if path.strip()] or None
+    # A bad value would stop connecting on background thread or crash the window, so fall back.
+    config_warnings = []
+    callback_executor_name = choice_setting(settings, 'callback_executor', CALLBACK_EXECUTORS, 'sequential',
+                                            config_warnings)
+    callback_workers = settings.getint('callback_workers', None)
+    event_queue_size = settings.getint('event_queue_size', EventQueue.DEFAULT_MAXLEN)
+    event_queue_policy = choice_setting(settings, 'event_queue_policy', EventQueue.POLICIES, 'drop_oldest',
+                                        config_warnings)
+    state_cache = StateCache()
+    startup.mark('config')
+
+    rootwd = WwiseStateBrowserGUI.MainWindow(
+        settings['enable_autosync'], settings['visible_stategroup_path'],
+        settings.getint('event_drain_interval',
+                        WwiseStateBrowserGUI.MainWindow.DEFAULT_EVENT_DRAIN_INTERVAL),
+        settings.getint('event_drain_batch',
+                        WwiseStateBrowserGUI.MainWindow.DEFAULT_EVENT_DRAIN_BATCH),
+        settings.getboolean('visible_metrics', False),
+        event_queue_size=event_queue_size, event_queue_policy=event_queue_policy)
+    rootwd.protocol("WM_DELETE_WINDOW",
+                    lambda: close_main_window(rootwd))
+    rootwd.btn_connectwaapi['command'] = lambda: connect_to_wwise(rootwd)
+    if config_warnings:
+        # Status line is overwritten by connection progress, so result line keeps it.
+        rootwd.lbl_setstate_result.config(text=" ".join(config_warnings))
+        print("\n".join(config_warnings), file=sys.stderr)
+    startup.mark('window_built')
+
+    def on_window_mapped(event):
+        # Children are mapped too. The window is shown when its toplevel is.
+        if event.widget is not rootwd:
+            return
+        startup.mark('window_shown')
+        if args.startup_only:
+            rootwd.quit()
+    rootwd.bind('<Map>', on_window_mapped, add='+')
 
-rootwd.btn_connectwaapi['command'] = lambda: connect_to_wwise(rootwd)
+    # Paint before loading cache & WAAPI stack, then connect when they are ready.
+    rootwd.update_idletasks()
+    if not args.startup_only:
+        threading.Thread(target=load_in_background, args=(rootwd,), daemon=True).start()
 
-client = connect_to_wwise(rootwd)
+    rootwd.mainloop()
+    if args.startup_report:
+        json.dump(startup.report(), sys.stdout, indent=1)
+        print()
+    return 0
 
-rootwd.mainloop()
 
-# if __name__ == "__main__":
-#     main()
+if __name__ == "__main__":
+    sys.exit(main())
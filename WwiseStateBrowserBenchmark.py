@@ -0,0 +1,259 @@
+#! python3
+import argparse
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from MockWaapiServer import MockWaapiServer, SyntheticProject
+from StateMetrics import metrics
+from StateConnectionPool import (CALLBACK_EXECUTORS, PooledCallbackExecutor, make_callback_executor,
+                                 use_thread_event_loops)
+from StateObserver import Observer, QueuedObserver, ThreadedObserver
+from WwiseStateBrowserInterface import StateUtility
+
+
+class LatencyObserver(Observer):
+    """Observer which measures time from server publish to handling on consumer thread."""
+
+    def __init__(self, server: MockWaapiServer):
+        self.server = server
+        self.latencies = []
+        self.handled = 0
+
+    def on_currentstate_changed(self, client: StateUtility):
+        now = time.perf_counter()
+        for stategroup_id in client.take_changed_currentstate().keys():
+            published = self.server.last_published.get(stategroup_id)
+            if published is not None:
+                self.latencies.append(now - published)
+            self.handled += 1
+
+    def on_statename_changed(self, client: StateUtility):
+        self.handled += len(client.take_changed_statename())
+
+
+class SlowObserver(Observer):
+    """Observer which spends delay seconds per notification, like a logger on slow storage."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.handled = 0
+
+    def on_currentstate_changed(self, client: StateUtility):
+        # Changes are left to LatencyObserver, which takes them.
+        time.sleep(self.delay)
+        self.handled += 1
+
+
+def summarize(values: list) -> dict:
+    """Return summary of values in milliseconds."""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    return {'count': len(values),
+            'min_ms': values[0] * 1000,
+            'median_ms': statistics.median(values) * 1000,
+            'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+            'max_ms': values[-1] * 1000}
+
+
+def bench_update_state_info(client: StateUtility, repeat: int) -> dict:
+    ret = {}
+    # Lazy first, so States are loaded again for later benchmarks.
+    for mode, bulk, lazy in (('lazy', True, True), ('bulk', True, False), ('pergroup', False, False)):
+        elapsed = []
+        for i in range(repeat):
+            client.update_state_info(bulk=bulk, lazy=lazy)
+            elapsed.append(client.update_stats['elapsed'])
+        ret[mode] = {'round_trips': client.update_stats['round_trips'],
+                     'latency': summarize(elapsed)}
+    return ret
+
+
+def bench_event_storm(server: MockWaapiServer, client: StateUtility,
+                      storm, rate: float, duration: float, drain_interval: float, drain_batch: int) -> dict:
+    """Run storm while draining observer like Tk main loop does."""
+    target = LatencyObserver(server)
+    observer = QueuedObserver(target)
+    client.add_observer(observer)
+    finished = threading.Event()
+    published = []
+
+    def run_storm():
+        published.append(storm(rate, duration))
+        finished.set()
+    threading.Thread(target=run_storm, daemon=True).start()
+
+    start = time.perf_counter()
+    while not finished.is_set() or len(observer.queue):
+        observer.dispatch(drain_batch)
+        time.sleep(drain_interval)
+        # Wait a little for in-flight events after storm finished.
+        if finished.is_set() and time.perf_counter() - start > duration + 5:
+            break
+    # Give the executor thread a chance to deliver the remaining events.
+    time.sleep(drain_interval * 5)
+    observer.dispatch(sys.maxsize)
+    elapsed = time.perf_counter() - start
+    client.remove_observer(observer)
+
+    return {'rate': rate,
+            'published': published[0] if published else 0,
+            'elapsed_s': elapsed,
+            'handled_updates': target.handled,
+            'coalesced': observer.coalesced,
+            'queue': observer.queue.stats,
+            'event_to_handler_latency': summarize(target.latencies)}
+
+
+def bench_slow_observer(server: MockWaapiServer, client: StateUtility, delay: float,
+                        rate: float, duration: float, drain_interval: float, drain_batch: int) -> dict:
+    """Run stateChanged storm with a slow observer notified inline or through ThreadedObserver."""
+    ret = {}
+    for mode in ('inline', 'threaded'):
+        slow = SlowObserver(delay)
+        observer = slow if mode == 'inline' else ThreadedObserver(slow, name='slow_observer').start()
+        client.add_observer(observer)
+        try:
+            storm = bench_event_storm(server, client, server.storm_state_changes,
+                                      rate, duration, drain_interval, drain_batch)
+        finally:
+            client.remove_observer(observer)
+            if mode == 'threaded':
+                observer.stop()
+        ret[mode] = {'slow_observer_calls': slow.handled,
+                     'handled_updates': storm['handled_updates'],
+                     'event_to_handler_latency': storm['event_to_handler_latency']}
+    return ret
+
+
+def bench_statebrowser(client: StateUtility) -> dict:
+    """Measure MainWindow.update_statebrowser. Needs a display."""
+    try:
+        import tkinter
+        import WwiseStateBrowserGUI
+        rootwd = WwiseStateBrowserGUI.MainWindow()
+    except (ImportError, tkinter.TclError) as e:
+        return {'skipped': str(e)}
+
+    try:
+        rootwd.client = client
+        rootwd.state_registry = client.state_in_wwise
+        start = time.perf_counter()
+        rootwd.update_statebrowser()
+        rootwd.update_idletasks()
+        build = time.perf_counter() - start
+
+        # Change 1% of current States, then reconcile again.
+        for stategroup in list(client.state_in_wwise)[::100]:
+            stategroup.current = "Changed"
+        start = time.perf_counter()
+        rootwd.update_statebrowser()
+        rootwd.update_idletasks()
+        incremental = time.perf_counter() - start
+        return {'build_ms': build * 1000,
+                'incremental_ms': incremental * 1000,
+                'row_widgets': len(rootwd.list_statebrowser_row)}
+    finally:
+        rootwd.client = None
+        rootwd.destroy()
+
+
+def bench_memory(client: StateUtility) -> dict:
+    """Measure Python heap held by State information and peak during update_state_info."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    client.update_state_info()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'update_peak_kb': (peak - before) / 1024,
+            'retained_kb': (current - before) / 1024}
+
+
+def run(args) -> dict:
+    project = SyntheticProject(args.stategroups, args.states)
+    results = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'config': vars(args).copy()}
+    results['config'].pop('output', None)
+
+    metrics.reset()
+    # Mock server and client run event loops in one process.
+    use_thread_event_loops()
+    with MockWaapiServer(project, latency=args.latency_ms / 1000) as server:
+        start = time.perf_counter()
+        client = StateUtility(url=server.url,
+                              callback_executor=make_callback_executor(args.executor, args.workers))
+        try:
+            results['connect_ms'] = (time.perf_counter() - start) * 1000
+            results['initial_update'] = client.update_stats
+            results['update_state_info'] = bench_update_state_info(client, args.repeat)
+
+            drain_interval = args.drain_interval_ms / 1000
+            results['state_changed_storm'] = bench_event_storm(
+                server, client, server.storm_state_changes,
+                args.event_rate, args.event_duration, drain_interval, args.drain_batch)
+            results['rename_storm'] = bench_event_storm(
+                server, client, server.storm_renames,
+                args.event_rate, args.event_duration, drain_interval, args.drain_batch)
+            # Renames of other objects, like bulk edits of Sounds. Dropped before callback thread.
+            filtered = metrics.snapshot()['counters'].get('event:filtered', {}).get('count', 0)
+            results['other_object_rename_storm'] = bench_event_storm(
+                server, client, lambda rate, duration: server.storm_renames(rate, duration, "Sound"),
+                args.event_rate, args.event_duration, drain_interval, args.drain_batch)
+            results['other_object_rename_storm']['filtered'] = \
+                metrics.snapshot()['counters'].get('event:filtered', {}).get('count', 0) - filtered
+
+            if args.slow_observer_ms > 0:
+                results['slow_observer'] = bench_slow_observer(
+                    server, client, args.slow_observer_ms / 1000,
+                    args.event_rate, args.event_duration, drain_interval, args.drain_batch)
+
+            if not args.no_gui:
+                results['update_statebrowser'] = bench_statebrowser(client)
+
+            # Taken before memory pass, because tracing slows down everything else.
+            results['metrics'] = metrics.snapshot()
+            results['memory'] = bench_memory(client)
+        finally:
+            client.disconnect()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark StateUtility and MainWindow against a local mock WAAPI server.")
+    parser.add_argument('--stategroups', type=int, default=500)
+    parser.add_argument('--states', type=int, default=10, help="States per StateGroup.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeat count of update_state_info.")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Simulated server time per call.")
+    parser.add_argument('--event-rate', type=float, default=500.0, help="Events per second of storms.")
+    parser.add_argument('--event-duration', type=float, default=2.0, help="Seconds of each storm.")
+    parser.add_argument('--drain-interval-ms', type=float, default=20.0)
+    parser.add_argument('--drain-batch', type=int, default=100)
+    parser.add_argument('--executor', choices=CALLBACK_EXECUTORS, default='sequential',
+                        help="Callback executor of StateUtility.")
+    parser.add_argument('--workers', type=int, default=PooledCallbackExecutor.DEFAULT_WORKERS,
+                        help="Threads of --executor pooled.")
+    parser.add_argument('--slow-observer-ms', type=float, default=1.0,
+                        help="Time per notification of the slow observer benchmark. 0 skips it.")
+    parser.add_argument('--no-gui', action='store_true', help="Skip MainWindow benchmark.")
+    parser.add_argument('--output', help="Write JSON result to file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
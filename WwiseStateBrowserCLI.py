@@ -0,0 +1,331 @@
+#! python3
+import argparse
+import json
+import socketserver
+import sys
+import threading
+import time
+
+from waapi import CannotConnectToWaapiException
+
+from StateConnectionPool import CALLBACK_EXECUTORS, PooledCallbackExecutor, make_callback_executor
+from StateHistory import StateHistory
+from StateObserver import Observer, EventQueue
+from StateScenario import Scenario, ScenarioPlayer, StatePresetStore, ids_from_paths
+from WwiseStateBrowserInterface import StateUtility
+
+
+class TransitionStream(Observer):
+    """Observer which writes State transitions and other records as NDJSON lines.\n
+    Callers only post records. A writer thread formats and writes them, so slow
+    output never blocks WAAPI callbacks. When output falls behind by more than
+    maxlen records, policy of EventQueue decides which records are dropped, or
+    'block' slows WAAPI callbacks down instead. Drops are counted in the 'stats' record.
+    """
+    DEFAULT_FLUSH_INTERVAL = 0.05
+    # Max records written per flush.
+    WRITE_BATCH = 1000
+
+    def __init__(self, output, maxlen=EventQueue.DEFAULT_MAXLEN, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 policy='drop_oldest'):
+        self.output = output
+        self.queue = EventQueue(maxlen, policy)
+        self.flush_interval = flush_interval
+        self.transitions = 0
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Write remaining records and a final 'stats' record, then stop writer thread."""
+        self.write({'event': 'stats', 'transitions': self.transitions, 'queue': self.queue.stats})
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def write(self, record: dict):
+        """Post record. Can be called from any thread."""
+        record.setdefault('ts', time.time())
+        self.queue.post('record', record)
+
+    def __run(self):
+        while True:
+            stopping = self.__stop_event.is_set()
+            records = self.queue.drain(self.WRITE_BATCH)
+            if records:
+                self.output.write(''.join(json.dumps(record, separators=(',', ':')) + '\n'
+                                          for event, record in records))
+                self.output.flush()
+            elif stopping:
+                return
+            else:
+                self.__stop_event.wait(self.flush_interval)
+
+    def on_waapi_connected(self, client: StateUtility):
+        self.write({'event': 'connected',
+                    'project': client.wproj_info,
+                    'stategroups': len(client.state_in_wwise)})
+
+    def on_waapi_disconnected(self, client: StateUtility):
+        self.write({'event': 'disconnected'})
+
+    def on_load_progress(self, client: StateUtility):
+        pass
+
+    def on_currentstate_changed(self, client: StateUtility):
+        # Called on WAAPI callback thread for each event, so nothing is coalesced here.
+        now = time.time()
+        for stategroup_id, state_name in client.take_changed_currentstate().items():
+            stategroup = client.state_in_wwise.get(stategroup_id)
+            self.transitions += 1
+            self.write({'ts': now,
+                        'event': 'state',
+                        'stateGroupId': stategroup_id,
+                        'stateGroup': stategroup.path if stategroup is not None else None,
+                        'state': state_name})
+
+    def on_statename_changed(self, client: StateUtility):
+        # Take changes even if unused, otherwise they pile up for hours.
+        for stategroup_id, change in client.take_changed_statename().items():
+            record = {'event': 'renamed', 'stateGroupId': stategroup_id}
+            if change.new_path is not None:
+                record['stateGroup'] = {'oldName': change.old_path, 'newName': change.new_path}
+            if change.states:
+                record['states'] = [{'id': state.id, 'oldName': state.old_name, 'newName': state.new_name}
+                                    for state in change.states.values()]
+            self.write(record)
+
+    def on_stategroup_changed(self, client: StateUtility):
+        for stategroup_id, kind in client.take_changed_stategroup().items():
+            stategroup = client.state_in_wwise.get(stategroup_id)
+            self.write({'event': 'stategroup',
+                        'stateGroupId': stategroup_id,
+                        'stateGroup': stategroup.path if stategroup is not None else None,
+                        'change': kind})
+
+    def write_snapshot(self, client: StateUtility):
+        for stategroup in list(client.state_in_wwise):
+            self.write({'event': 'current',
+                        'stateGroupId': stategroup.id,
+                        'stateGroup': stategroup.path,
+                        'state': stategroup.current})
+
+
+class CommandProcessor:
+    """Execute NDJSON commands.\n
+    Commands:
+        {"set": {"StateGroup": "State", ...}}: Set States with one batch of setState calls.
+            StateGroup & State accept GUID, name or Short ID like ak.soundengine.setState.
+        {"get": ["StateGroup GUID or path", ...]}: Return current States. All if list is empty.
+        {"preset": "Preset Name"}: Set States of preset saved from GUI.
+        {"watch": ["StateGroup GUID or path", ...]}: Handle stateChanged of these StateGroups only.
+            null watches all. Current States of others are last known ones.
+        {"id": any}: Optional. Copied to reply.
+    """
+
+    def __init__(self, client: StateUtility, presets: StatePresetStore = None):
+        self.client = client
+        self.presets = presets
+
+    def execute(self, line: str) -> dict:
+        """Return reply record of command line. None for blank line."""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            command = json.loads(line)
+            if not isinstance(command, dict):
+                raise ValueError("Command must be a JSON object.")
+            if 'set' in command:
+                reply = {'event': 'set', 'results': self.client.set_states(command['set'])}
+            elif 'get' in command:
+                reply = {'event': 'get', 'states': self.__get_states(command['get'])}
+            elif 'preset' in command:
+                reply = {'event': 'set', 'preset': command['preset'],
+                         'results': self.client.set_states(self.__preset_states(command['preset']))}
+            elif 'watch' in command:
+                watched = self.client.watch(command['watch'])
+                reply = {'event': 'watch', 'watched': len(watched) if watched is not None else None}
+            else:
+                raise ValueError("Unknown command. Use 'set', 'get', 'preset' or 'watch'.")
+        except (ValueError, TypeError, AttributeError) as e:
+            return {'event': 'error', 'message': str(e), 'command': line[:200]}
+        if 'id' in command:
+            reply['id'] = command['id']
+        return reply
+
+    def __preset_states(self, name: str) -> dict:
+        states = self.presets.get(name) if self.presets is not None else None
+        if states is None:
+            raise ValueError("Unknown preset: " + str(name))
+        return ids_from_paths(self.client.state_in_wwise, states)
+
+    def __get_states(self, keys: list) -> dict:
+        registry = self.client.state_in_wwise
+        if not keys:
+            return {stategroup.path: stategroup.current for stategroup in list(registry)}
+        ret = {}
+        for key in keys:
+            stategroup = registry.get(key)
+            if stategroup is None:
+                stategroup = registry.find_stategroup(key)
+            ret[key] = stategroup.current if stategroup is not None else None
+        return ret
+
+
+class ScenarioReporter:
+    """ScenarioPlayer listener which writes the timing report when playback ends."""
+
+    def __init__(self, stream: TransitionStream, report_path=None, finished_event: threading.Event = None):
+        self.stream = stream
+        self.report_path = report_path
+        self.finished_event = finished_event
+
+    def on_scenario_step(self, index: int, total: int):
+        pass
+
+    def on_scenario_finished(self, report: dict):
+        record = {key: value for key, value in report.items() if key != 'timeline'}
+        record['event'] = 'scenario'
+        if self.report_path is not None:
+            try:
+                with open(self.report_path, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=1)
+                record['report'] = self.report_path
+            except OSError as e:
+                record['error'] = "Report not saved: " + str(e)
+        self.stream.write(record)
+        if self.finished_event is not None:
+            self.finished_event.set()
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            reply = self.server.processor.execute(line.decode('utf-8', 'replace'))
+            if reply is not None:
+                self.wfile.write((json.dumps(reply, separators=(',', ':')) + '\n').encode('utf-8'))
+
+
+class CommandServer(socketserver.ThreadingTCPServer):
+    """Line-based command socket on localhost. Replies go back to the sender."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int, processor: CommandProcessor):
+        self.processor = processor
+        super().__init__(("127.0.0.1", port), _CommandHandler)
+
+
+def read_commands(lines, processor: CommandProcessor, stream: TransitionStream):
+    """Execute commands from lines and write replies to stream."""
+    for line in lines:
+        reply = processor.execute(line)
+        if reply is not None:
+            stream.write(reply)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Stream Wwise State transitions as NDJSON and accept set/get commands without GUI.")
+    parser.add_argument('--url', help="WAAPI URL. Default is ws://127.0.0.1:8080/waapi.")
+    parser.add_argument('--output', help="Append NDJSON to file instead of stdout.")
+    parser.add_argument('--listen', type=int, metavar='PORT',
+                        help="Accept commands on 127.0.0.1:PORT. 0 picks a free port.")
+    parser.add_argument('--no-stdin', action='store_true',
+                        help="Do not read commands from stdin. Otherwise end of stdin ends the session "
+                             "unless --listen or --duration is given.")
+    parser.add_argument('--snapshot', action='store_true', help="Write current State of every StateGroup at start.")
+    parser.add_argument('--duration', type=float, help="Stop after seconds. Default runs until stopped.")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Do not load States of StateGroups. Faster start on large projects.")
+    parser.add_argument('--watch', action='append', metavar='PATH',
+                        help="Handle stateChanged of this StateGroup only. Can be repeated. Default watches all.")
+    parser.add_argument('--queue-size', type=int, default=EventQueue.DEFAULT_MAXLEN,
+                        help="Max records waiting for output.")
+    parser.add_argument('--queue-policy', choices=EventQueue.POLICIES, default='drop_oldest',
+                        help="Records dropped when output falls behind. 'block' delays WAAPI callbacks instead.")
+    parser.add_argument('--executor', choices=CALLBACK_EXECUTORS, default='sequential',
+                        help="'pooled' runs WAAPI callbacks of different StateGroups on several threads.")
+    parser.add_argument('--workers', type=int, default=PooledCallbackExecutor.DEFAULT_WORKERS,
+                        help="Threads of --executor pooled.")
+    parser.add_argument('--presets', metavar='FILE',
+                        help="Preset file for 'preset' commands and scenarios. Default is the one of GUI.")
+    parser.add_argument('--play', metavar='FILE',
+                        help="Play scenario JSON. Without --listen or --duration, the session ends when it finishes.")
+    parser.add_argument('--report', metavar='FILE', help="Write timing report of --play to FILE.")
+    parser.add_argument('--history', metavar='FILE',
+                        help="Export every transition to FILE at exit. "
+                             "CSV if it ends with .csv, columnar JSON otherwise.")
+    parser.add_argument('--history-capacity', type=int, default=StateHistory.DEFAULT_CAPACITY,
+                        help="Max transitions kept for --history. Oldest are overwritten.")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    stream = TransitionStream(output, args.queue_size, policy=args.queue_policy)
+    stream.start()
+    stop_event = threading.Event()
+    history = StateHistory(args.history_capacity) if args.history else None
+    try:
+        try:
+            client = StateUtility(url=args.url, observer=stream, history=history, lazy=args.lazy, watch=args.watch,
+                                  callback_executor=make_callback_executor(args.executor, args.workers))
+        except CannotConnectToWaapiException as e:
+            stream.write({'event': 'error', 'message': "Could not connect to Waapi: " + str(e)})
+            return 1
+        client.subscribe("ak.wwise.core.project.preClosed", lambda *args, **kwargs: stop_event.set())
+        if args.snapshot:
+            stream.write_snapshot(client)
+
+        presets = StatePresetStore(args.presets)
+        processor = CommandProcessor(client, presets)
+        server = None
+        if args.listen is not None:
+            server = CommandServer(args.listen, processor)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            stream.write({'event': 'listening', 'port': server.server_address[1]})
+        player = None
+        if args.play:
+            try:
+                steps = Scenario.load(args.play).compile(client.state_in_wwise, presets)
+            except (OSError, ValueError) as e:
+                stream.write({'event': 'error', 'message': "Scenario not played: " + str(e)})
+                client.disconnect()
+                return 1
+            player = ScenarioPlayer(client, steps, ScenarioReporter(
+                stream, args.report, stop_event if server is None and args.duration is None else None))
+            player.start()
+        if not args.no_stdin:
+            def read_stdin():
+                read_commands(sys.stdin, processor, stream)
+                # Without socket, end of commands ends the session.
+                if server is None and args.duration is None and player is None:
+                    stop_event.set()
+            threading.Thread(target=read_stdin, daemon=True).start()
+
+        try:
+            stop_event.wait(args.duration)
+        except KeyboardInterrupt:
+            pass
+        if player is not None:
+            player.stop(wait=True)
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        client.disconnect()
+        if history is not None:
+            history.export(args.history)
+            stream.write({'event': 'history', 'path': args.history,
+                          'transitions': len(history), 'dropped': history.dropped})
+        return 0
+    finally:
+        stream.stop()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
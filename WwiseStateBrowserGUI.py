@@ -1,33 +1,131 @@
 #! python3
+# Annotations only name StateUtility & ConnectionPool, so the WAAPI stack is not imported with the window.
+from __future__ import annotations
+
+import bisect
+import collections
+import json
+import os
+import threading
+import time
 import tkinter
+import tkinter.filedialog
+import tkinter.simpledialog
 import tkinter.ttk as ttk
+import traceback
+import typing
+
+from StateHistory import StateHistory
+from StateMetrics import RateWindow, metrics
+from StateModel import PendingChanges, StateGroup, StateRegistry, StateSearchIndex
+from StateObserver import Observer, EventQueue, QueuedObserver
+from StateScenario import Scenario, ScenarioPlayer, StatePresetStore, ids_from_paths, paths_from_ids
+
+if typing.TYPE_CHECKING:
+    from StateConnectionPool import ConnectionPool
+    from WwiseStateBrowserInterface import StateUtility
+
+
+def make_statebrowser_snapshot(stategroup: StateGroup) -> tuple:
+    """Return comparable snapshot of what a StateBrowser row displays.\n
+    Returns:
+        tuple: ('StateGroup Path', ('State Name', ...), 'Current State Name')
+    """
+    return (stategroup.path,
+            tuple(state.name for state in stategroup.states),
+            stategroup.current)
+
 
-from StateObserver import Observer
-from WwiseStateBrowserInterface import StateUtility
+def window_statebrowser(order: list, top: int, capacity: int) -> tuple:
+    """Return visible slice of StateBrowser rows.\n
+    Args:
+        order (list): StateGroup GUIDs in display order.
+        top (int): Index of first visible row.
+        capacity (int): Number of row widgets in pool.
+    Returns:
+        tuple: (clamped top, [StateGroup GUID or None for each row widget])
+    """
+    top = max(0, min(top, len(order) - capacity))
+    visible = order[top:top + capacity]
+    return top, visible + [None] * (capacity - len(visible))
 
 
 class MainWindow(tkinter.Tk, Observer):
-    def __init__(self, enableautosync=True, visible_stategroup_path=False):
+    # Number of row widgets created before the window is laid out.
+    DEFAULT_STATEBROWSER_ROWS = 15
+    # Interval(ms) & max notifications per drain of WAAPI event queue.
+    # Change notifications are coalesced while waiting, so the interval is
+    # also the window in which rapid State changes make one UI update.
+    DEFAULT_EVENT_DRAIN_INTERVAL = 20
+    DEFAULT_EVENT_DRAIN_BATCH = 100
+    # Number of timers listed in metrics panel, ordered by total time.
+    METRICS_PANEL_ROWS = 12
+    # DirtyMark of row by PendingChanges status: picked, sent & waiting for stateChanged.
+    DIRTYMARK_TEXT = {None: "", PendingChanges.PENDING: "*", PendingChanges.SENT: "..."}
+    # Shown in State list while its States are fetched.
+    LOADING_STATES_TEXT = "Loading..."
+
+    def __init__(self, enableautosync=True, visible_stategroup_path=False,
+                 event_drain_interval=DEFAULT_EVENT_DRAIN_INTERVAL, event_drain_batch=DEFAULT_EVENT_DRAIN_BATCH,
+                 visible_metrics=False, history_capacity=StateHistory.DEFAULT_CAPACITY,
+                 event_queue_size=EventQueue.DEFAULT_MAXLEN, event_queue_policy='drop_oldest'):
         super().__init__()
 
         self.title("Wwise State Browser")
         self.columnconfigure(0, weight=2)
         self.columnconfigure(1, weight=3)
+        self.rowconfigure(1, weight=1)
         self.minsize(750, 220)
 
         # Variables.
         self.client: StateUtility = None
 
+        # WAAPI callbacks run on another thread, so StateUtility notifies
+        # queued_observer and Tk main loop drains it in batches.
+        self.event_drain_interval = event_drain_interval
+        self.event_drain_batch = event_drain_batch
+        self.event_queue = EventQueue(event_queue_size, event_queue_policy)
+        self.queued_observer = QueuedObserver(self, self.event_queue)
+        # Passed to StateUtility to record every State transition.
+        self.state_history = StateHistory(history_capacity)
+        # Callables posted from worker threads by run_in_mainloop().
+        self.__mainloop_tasks = collections.deque()
+
         self.enable_autosync = tkinter.BooleanVar(value=enableautosync)
         self.visible_stategroup_path = tkinter.BooleanVar(
             value=visible_stategroup_path)
+        self.visible_metrics = tkinter.BooleanVar(value=visible_metrics)
 
-        self.dict_state_in_wwise = {}
-        # { 'StateGroup' : {'Label' : LabelObject<StateGroupName>,
-        #                   'ComboBox' : ComboBoxObject<StateName> }
+        # Shared with client while connected, loaded from cache otherwise.
+        self.state_registry = StateRegistry()
+        # Trigram index of state_registry for filter box.
+        self.search_index = StateSearchIndex()
+        self.filter_text = tkinter.StringVar()
+        # Pool of row widgets. Only visible rows are materialized.
+        # [ {'Label' : LabelObject<StateGroupName>,
+        #    'DirtyMark' : LabelObject<DirtyMark>,
+        #    'ComboBox' : ComboBoxObject<StateName>,
+        #    'StateGroup' : Bound StateGroup GUID or None,
+        #    'Snapshot' : (Path, (State Name, ...), Current),
+        #    'Dirty' : Status shown by DirtyMark }, ... ]
+        self.list_statebrowser_row = []
+        # { 'StateGroup GUID' : Bound row object in list_statebrowser_row }
         self.dict_statebrowser_object = {}
-        # { 'StateGroup GUID' : 'State Name' }
-        self.dict_changedstate = {}
+        # StateGroup GUIDs in display order & index of first visible one.
+        self.list_statebrowser_order = []
+        self.statebrowser_top = 0
+        # States picked by user until Wwise confirms them.
+        self.pending_changes = PendingChanges()
+        self.__dirtymark_redraw_scheduled = False
+        # Named sets of States, read on first use & running scenario.
+        self.__preset_store = None
+        self.scenario_player: ScenarioPlayer = None
+        self.__scenario_progress_time = 0.0
+        self.__scenario_report_path = None
+        # StateGroup GUIDs whose States are fetched for an opened list.
+        self.__loading_stategroups = set()
+        # Set to cancel running Force Update. None while not running.
+        self.__force_update_cancel: threading.Event = None
 
         # Create Settings Section.
         self.frame_settings = ttk.Labelframe(self,
@@ -40,7 +138,7 @@ class MainWindow(tkinter.Tk, Observer):
         self.btn_forceupdate = ttk.Button(self.frame_settings,
                                           name="btn_forceupdate",
                                           text="Force Update",
-                                          command=self.update_statebrowser,
+                                          command=self.force_update,
                                           state='disabled',
                                           padding=3,)
         self.btn_forceupdate.grid(column=0, row=0, padx=3, pady=0)
@@ -68,6 +166,90 @@ class MainWindow(tkinter.Tk, Observer):
                                                     command=self.__on_toggle_stategrouplabel_text)
         self.chk_visiblegrouppath.grid(column=3, row=0, padx=3, pady=0)
 
+        self.lbl_setstate_result = ttk.Label(self.frame_settings,
+                                             name="lbl_setstate_result",
+                                             text="",
+                                             padding=3)
+        self.lbl_setstate_result.grid(column=4, row=0, padx=3, pady=0)
+
+        self.lbl_filter = ttk.Label(self.frame_settings,
+                                    name="lbl_filter",
+                                    text="Filter:",
+                                    padding=3)
+        self.lbl_filter.grid(column=5, row=0, padx=3, pady=0)
+
+        self.ent_filter = ttk.Entry(self.frame_settings,
+                                    name="ent_filter",
+                                    textvariable=self.filter_text,
+                                    width=25)
+        self.ent_filter.grid(column=6, row=0, padx=3, pady=0)
+        self.ent_filter.bind('<Escape>', lambda event: self.filter_text.set(""))
+        self.filter_text.trace_add('write', lambda *args: self.__on_filter_changed())
+
+        self.btn_watchfiltered = ttk.Button(self.frame_settings,
+                                            name="btn_watchfiltered",
+                                            text="Watch Filtered",
+                                            padding=3,
+                                            command=self.watch_filtered,
+                                            state='disabled')
+        self.btn_watchfiltered.grid(column=7, row=0, padx=3, pady=0)
+
+        self.btn_watchall = ttk.Button(self.frame_settings,
+                                       name="btn_watchall",
+                                       text="Watch All",
+                                       padding=3,
+                                       command=self.watch_all,
+                                       state='disabled')
+        self.btn_watchall.grid(column=8, row=0, padx=3, pady=0)
+
+        # Presets & scenario playback on second row of Settings.
+        self.frame_preset = ttk.Frame(self.frame_settings, name="frame_preset")
+        self.frame_preset.grid(column=0, row=1, columnspan=9, sticky="w")
+
+        self.lbl_preset = ttk.Label(self.frame_preset,
+                                    name="lbl_preset",
+                                    text="Preset:",
+                                    padding=3)
+        self.lbl_preset.pack(side="left")
+
+        self.cmb_preset = ttk.Combobox(self.frame_preset,
+                                       name="cmb_preset",
+                                       state='readonly',
+                                       width=20,
+                                       postcommand=lambda: self.cmb_preset.config(
+                                           values=self.preset_store.names()))
+        self.cmb_preset.pack(side="left", padx=3)
+
+        self.btn_applypreset = ttk.Button(self.frame_preset,
+                                          name="btn_applypreset",
+                                          text="Apply",
+                                          padding=3,
+                                          command=self.apply_preset,
+                                          state='disabled')
+        self.btn_applypreset.pack(side="left", padx=3)
+
+        self.btn_savepreset = ttk.Button(self.frame_preset,
+                                         name="btn_savepreset",
+                                         text="Save Preset",
+                                         padding=3,
+                                         command=self.save_preset)
+        self.btn_savepreset.pack(side="left", padx=3)
+
+        self.btn_deletepreset = ttk.Button(self.frame_preset,
+                                           name="btn_deletepreset",
+                                           text="Delete",
+                                           padding=3,
+                                           command=self.delete_preset)
+        self.btn_deletepreset.pack(side="left", padx=3)
+
+        self.btn_playscenario = ttk.Button(self.frame_preset,
+                                           name="btn_playscenario",
+                                           text="Play Scenario...",
+                                           padding=3,
+                                           command=self.toggle_scenario,
+                                           state='disabled')
+        self.btn_playscenario.pack(side="left", padx=3)
+
         # Create Status Section.
         self.frame_status = ttk.Labelframe(self,
                                            name="frame_status",
@@ -89,18 +271,61 @@ class MainWindow(tkinter.Tk, Observer):
                                         padding=3)
         self.lbl_wproj_info.pack(side="left")
 
+        self.lbl_event_stats = ttk.Label(self.frame_status,
+                                         name="lbl_event_stats",
+                                         text="",
+                                         padding=3)
+        self.lbl_event_stats.pack(side="right")
+
         # Create Log Section.
-        # self.frame_log = ttk.Labelframe(self,
-        #                                 name="frame_log",
-        #                                 text="Log",
-        #                                 padding=3, border=1, relief="solid")
-        # self.frame_log.grid(column=0, row=3, sticky="sw",
-        #                     padx=5, pady=3, ipadx=2, ipady=0,)
-        # self.lbl_log = ttk.Label(self.frame_log,
-        #                          name="lbl_log",
-        #                          text="Welcome to WaapiStateBrowser!",
-        #                          padding=3)
-        # self.lbl_log.pack(side="left")
+        self.frame_log = ttk.Labelframe(self,
+                                        name="frame_log",
+                                        text="Log",
+                                        padding=3, border=1, relief="solid")
+        self.frame_log.grid(column=0, row=3, sticky="sew",
+                            padx=5, pady=3, ipadx=2, ipady=0,)
+        self.frame_log.columnconfigure(4, weight=1)
+
+        self.chk_visiblemetrics = ttk.Checkbutton(self.frame_log,
+                                                  name="chk_visiblemetrics",
+                                                  text="Show Metrics",
+                                                  padding=3,
+                                                  variable=self.visible_metrics,
+                                                  command=self.__on_toggle_metrics)
+        self.chk_visiblemetrics.grid(column=0, row=0, sticky="w")
+
+        self.btn_exportmetrics = ttk.Button(self.frame_log,
+                                            name="btn_exportmetrics",
+                                            text="Export Metrics",
+                                            padding=3,
+                                            command=self.export_metrics)
+        self.btn_exportmetrics.grid(column=1, row=0, padx=3, sticky="w")
+
+        self.btn_exporthistory = ttk.Button(self.frame_log,
+                                            name="btn_exporthistory",
+                                            text="Export History",
+                                            padding=3,
+                                            command=self.export_history)
+        self.btn_exporthistory.grid(column=2, row=0, padx=3, sticky="w")
+
+        # Shown by show_compare_button() when other instances are monitored.
+        self.btn_compareinstances = ttk.Button(self.frame_log,
+                                               name="btn_compareinstances",
+                                               text="Compare Instances",
+                                               padding=3)
+
+        self.lbl_log = ttk.Label(self.frame_log,
+                                 name="lbl_log",
+                                 text="Welcome to WaapiStateBrowser!",
+                                 padding=3)
+        self.lbl_log.grid(column=4, row=0, sticky="w")
+
+        self.lbl_metrics = ttk.Label(self.frame_log,
+                                     name="lbl_metrics",
+                                     text="",
+                                     font="TkFixedFont",
+                                     justify="left",
+                                     padding=3)
 
         # Create StateBrowser Section.
         self.frame_statebrowser = ttk.Labelframe(self, name="frame_statebrowser",
@@ -116,130 +341,841 @@ class MainWindow(tkinter.Tk, Observer):
                                              text="State", width=25, anchor="center")
         self.lbl_title_statename.grid(column=1, row=0, sticky="EW")
 
+        self.scr_statebrowser = ttk.Scrollbar(self.frame_statebrowser, name="scr_statebrowser",
+                                              orient="vertical",
+                                              command=self.__on_statebrowser_scrollbar)
+        self.frame_statebrowser.bind('<Configure>', self.__on_statebrowser_resized)
+        self.__bind_statebrowser_wheel(self.frame_statebrowser)
+        self.__resize_statebrowser_pool(self.DEFAULT_STATEBROWSER_ROWS)
+
+        self.after(self.event_drain_interval, self.__drain_event_queue)
+        self.after(1000, self.__show_event_stats)
+        self.__on_toggle_metrics()
+
+    def run_in_mainloop(self, func, *args):
+        """Call func(*args) on Tk main loop. Can be called from any thread."""
+        self.__mainloop_tasks.append((func, args))
+
+    def run_in_worker(self, func, completed, failed):
+        """Call func() on a worker thread, then completed(result) or failed(exception) on Tk main loop."""
+        def run():
+            try:
+                result = func()
+            except Exception as e:
+                traceback.print_exc()
+                self.run_in_mainloop(failed, e)
+                return
+            self.run_in_mainloop(completed, result)
+        threading.Thread(target=run, daemon=True).start()
+
+    def __drain_event_queue(self):
+        try:
+            # Notifications first, so tasks posted after them see their result.
+            self.queued_observer.dispatch(self.event_drain_batch)
+            while self.__mainloop_tasks:
+                func, args = self.__mainloop_tasks.popleft()
+                try:
+                    func(*args)
+                except Exception:
+                    # Keep the other tasks running.
+                    traceback.print_exc()
+        finally:
+            # One failure must never stop the UI from updating.
+            self.after(self.event_drain_interval, self.__drain_event_queue)
+
+    def __show_event_stats(self, last_drained=0):
+        stats = self.event_queue.stats
+        coalesced = self.queued_observer.coalesced
+        if self.client is not None:
+            coalesced += self.client.coalesced_currentstate_count
+        self.lbl_event_stats.config(
+            text="Events: {}/s, depth {}, coalesced {}".format(
+                stats['drained'] - last_drained, stats['depth'], coalesced))
+        self.after(1000, self.__show_event_stats, stats['drained'])
+
+    def __on_toggle_metrics(self):
+        if self.visible_metrics.get():
+            self.lbl_metrics.grid(column=0, row=1, columnspan=5, sticky="w")
+            self.__show_metrics()
+        else:
+            self.lbl_metrics.grid_remove()
+
+    def __show_metrics(self):
+        if not self.visible_metrics.get():
+            return
+        self.lbl_metrics.config(text=self.format_metrics(metrics.snapshot()))
+        self.after(1000, self.__show_metrics)
+
+    def format_metrics(self, snapshot: dict) -> str:
+        """Return text of metrics panel from Metrics.snapshot()."""
+        lines = ["{:<44} {:>8} {:>9} {:>9} {:>9}".format("Timer", "Count", "Mean ms", "P95 ms", "Max ms")]
+        timers = sorted(snapshot['timers'].items(), key=lambda x: x[1]['total_ms'], reverse=True)
+        for name, timer in timers[:self.METRICS_PANEL_ROWS]:
+            lines.append("{:<44} {:>8} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                name[:44], timer['count'], timer['mean_ms'], timer['p95_ms'], timer['max_ms']))
+        if snapshot['counters']:
+            lines.append("Events/s (last {}s): ".format(RateWindow.WINDOW_S) + ", ".join(
+                "{} {:.1f}".format(name.split(':', 1)[-1], counter['rate_per_s'])
+                for name, counter in sorted(snapshot['counters'].items())))
+        if snapshot['gauges']:
+            lines.append("Queue: " + ", ".join(
+                "{} {}".format(name.split('.', 1)[-1], value)
+                for name, value in sorted(snapshot['gauges'].items())))
+        return "\n".join(lines)
+
+    def export_metrics(self):
+        path = tkinter.filedialog.asksaveasfilename(parent=self,
+                                                    title="Export Metrics",
+                                                    defaultextension=".json",
+                                                    initialfile="WwiseStateBrowserMetrics.json",
+                                                    filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            metrics.export_json(path)
+        except OSError as e:
+            self.lbl_log.config(text="Export failed: " + str(e))
+            return
+        self.lbl_log.config(text="Metrics exported: " + path)
+
+    def export_history(self):
+        path = tkinter.filedialog.asksaveasfilename(parent=self,
+                                                    title="Export History",
+                                                    defaultextension=".csv",
+                                                    initialfile="WwiseStateBrowserHistory.csv",
+                                                    filetypes=[("CSV", "*.csv"), ("Columnar JSON", "*.json")])
+        if not path:
+            return
+        try:
+            self.state_history.export(path)
+        except OSError as e:
+            self.lbl_log.config(text="Export failed: " + str(e))
+            return
+        self.lbl_log.config(text="{} transitions exported: {}".format(len(self.state_history), path))
+
+    def show_compare_button(self, command):
+        self.btn_compareinstances.config(command=command)
+        self.btn_compareinstances.grid(column=3, row=0, padx=3, sticky="w")
+
     def show_status_message(self, message=''):
+        # Repainted when the calling event returns to mainloop. update() would run a nested event loop.
         self.lbl_wproj_info.config(text=message)
-        self.lbl_wproj_info.update()
 
-    def clear_statebrowser(self):
-        for stategroup in self.dict_statebrowser_object.keys():
-            self.dict_statebrowser_object[stategroup]['Label'].destroy()
-            self.dict_statebrowser_object[stategroup]['ComboBox'].destroy()
-        self.dict_statebrowser_object.clear()
-        self.dict_changedstate.clear()
+    def show_connected_message(self):
+        if self.client is None:
+            return
+        stats = self.client.update_stats
+        text = "Connected: " + self.client.wproj_info.get('name', "") \
+            + "<" + self.client.wproj_info.get('filePath', "") + ">"
+        text += " ({} StateGroups, {} calls, {:.2f}s)".format(stats.get('stategroups', 0),
+                                                              stats.get('round_trips', 0),
+                                                              stats.get('elapsed', 0.0))
+        if stats.get('changed') is not None:
+            text += " resynced, {} changed".format(stats['changed'])
+        self.lbl_wproj_info.config(text=text)
+
+    def show_cached_state(self, wproj_info: dict, state_registry: StateRegistry):
+        """Render State information from cache until connected to Wwise."""
+        if self.client is not None:
+            return
+        self.lbl_wproj_info.config(
+            text="Cached: " + wproj_info.get('name', "") + "<"+wproj_info.get('filePath', "") + ">")
+        self.state_registry = state_registry
+        self.search_index.rebuild(state_registry)
+        self.update_statebrowser()
+
+    @property
+    def preset_store(self) -> StatePresetStore:
+        if self.__preset_store is None:
+            self.__preset_store = StatePresetStore()
+        return self.__preset_store
+
+    def save_preset(self):
+        """Save pending State changes as a named preset."""
+        states = paths_from_ids(self.state_registry, self.pending_changes.pending)
+        if not states:
+            self.lbl_setstate_result.config(text="Pick States to save as preset first.")
+            return
+        name = tkinter.simpledialog.askstring("Save Preset", "Preset name:", parent=self,
+                                              initialvalue=self.cmb_preset.get())
+        if not name:
+            return
+        try:
+            self.preset_store.save(name, states)
+        except OSError as e:
+            self.lbl_setstate_result.config(text="Save failed: " + str(e))
+            return
+        self.cmb_preset.config(values=self.preset_store.names())
+        self.cmb_preset.set(name)
+        self.lbl_setstate_result.config(text="Preset saved: {} ({} States)".format(name, len(states)))
+
+    def delete_preset(self):
+        name = self.cmb_preset.get()
+        if not name:
+            return
+        try:
+            self.preset_store.delete(name)
+        except OSError as e:
+            self.lbl_setstate_result.config(text="Delete failed: " + str(e))
+            return
+        self.cmb_preset.config(values=self.preset_store.names())
+        self.cmb_preset.set("")
+
+    def apply_preset(self):
+        """Set States of selected preset with one batch, like Set State."""
+        states = self.preset_store.get(self.cmb_preset.get())
+        if self.client is None or states is None:
+            return
+        try:
+            self.pending_changes.update(ids_from_paths(self.state_registry, states))
+        except ValueError as e:
+            self.lbl_setstate_result.config(text="Preset not applied: " + str(e))
+            return
+        self.set_changed_state()
+
+    def toggle_scenario(self):
+        if self.scenario_player is not None and self.scenario_player.is_running():
+            self.scenario_player.stop()
+            return
+        if self.client is None:
+            return
+        path = tkinter.filedialog.askopenfilename(parent=self,
+                                                  title="Play Scenario",
+                                                  filetypes=[("Scenario", "*.json")])
+        if not path:
+            return
+        try:
+            scenario = Scenario.load(path)
+            steps = scenario.compile(self.state_registry, self.preset_store)
+        except (OSError, ValueError) as e:
+            self.lbl_setstate_result.config(text="Scenario not played: " + str(e))
+            return
+        self.__scenario_report_path = os.path.splitext(path)[0] + ".report.json"
+        self.scenario_player = ScenarioPlayer(self.client, steps, listener=self)
+        self.btn_playscenario.config(text="Stop Scenario")
+        self.lbl_setstate_result.config(text="Playing {} ({} steps)...".format(scenario.name, len(steps)))
+        self.scenario_player.start()
+
+    def on_scenario_step(self, index: int, total: int):
+        # Called on scheduler thread for each step. Report progress at most 10 times a second.
+        now = time.perf_counter()
+        if now - self.__scenario_progress_time < 0.1:
+            return
+        self.__scenario_progress_time = now
+        self.run_in_mainloop(self.lbl_setstate_result.config,
+                             {'text': "Playing: step {}/{}".format(index + 1, total)})
+
+    def on_scenario_finished(self, report: dict):
+        try:
+            with open(self.__scenario_report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1)
+            saved = " Report: " + self.__scenario_report_path
+        except OSError as e:
+            saved = " Report not saved: " + str(e)
+        message = "{}: {}/{} steps, {} failed, drift {:.1f} ms, lateness p95 {:.1f} ms.".format(
+            "Stopped" if report['stopped'] else "Played",
+            report['steps'], report['planned_steps'], report['failed'], report['drift_ms'],
+            report['set_lateness'].get('p95_ms', 0.0))
+        self.run_in_mainloop(self.__on_scenario_finished, message + saved)
+
+    def __on_scenario_finished(self, message: str):
+        self.btn_playscenario.config(text="Play Scenario...")
+        self.lbl_setstate_result.config(text=message)
+
+    def force_update(self):
+        """Reload State information on worker thread. Cancel if running."""
+        if self.__force_update_cancel is not None:
+            self.__cancel_force_update()
+            self.lbl_setstate_result.config(text="Force Update cancelled.")
+            return
+        if self.client is None:
+            self.search_index.rebuild(self.state_registry)
+            self.update_statebrowser()
+            return
+        # WaapiClient.call has no timeout, so a hung Wwise must never block the main loop.
+        cancel_event = threading.Event()
+        self.__force_update_cancel = cancel_event
+        self.btn_forceupdate.config(text="Cancel")
+        client = self.client
+        self.run_in_worker(lambda: client.update_state_info(cancel_event=cancel_event),
+                           lambda result: self.__on_force_update_completed(client, cancel_event, None),
+                           lambda e: self.__on_force_update_completed(
+                               client, cancel_event, "Force Update failed: " + str(e)))
+
+    def __cancel_force_update(self):
+        # A call stuck in hung Wwise returns late or never, so the button is reset now.
+        self.__force_update_cancel.set()
+        self.__force_update_cancel = None
+        self.btn_forceupdate.config(text="Force Update")
+
+    def __on_force_update_completed(self, client: StateUtility, cancel_event: threading.Event, error: str):
+        if cancel_event is not self.__force_update_cancel:
+            # Cancelled.
+            return
+        self.__force_update_cancel = None
+        self.btn_forceupdate.config(text="Force Update")
+        if client is not self.client:
+            return
+        self.show_connected_message()
+        if error is not None:
+            self.lbl_setstate_result.config(text=error)
+            return
+        self.search_index.rebuild(self.state_registry)
+        self.update_statebrowser()
 
     def update_statebrowser(self):
-        self.clear_statebrowser()
-        # Create StateGroupName Label & DirtyFlag Label.
-        for stategroup_id, stategroup_info in self.dict_state_in_wwise.items():
-            self.dict_statebrowser_object.setdefault(
-                stategroup_id, {}).setdefault(
-                    'Label', ttk.Label(self.frame_statebrowser,
-                                       name="lbl_"+stategroup_id,
-                                       #    text=stategroup_info.get('path', ""),
-                                       width=50, border=1, relief="solid"))
-            self.dict_statebrowser_object[stategroup_id].setdefault(
-                'DirtyMark', ttk.Label(self.frame_statebrowser,
-                                       name="dirty_"+stategroup_id,
-                                       foreground="red",
-                                       width=5, border=1, relief="flat"))
+        """Reconcile StateBrowser rows with state_registry.\n
+        Only row widgets whose bound StateGroup or its content changed are touched.
+        """
+        if self.client is not None:
+            # Rows reconcile with the registry below, but the search index is updated by changes only.
+            # Taken first, so changes arriving meanwhile are notified again.
+            self.__update_search_index(set(self.client.take_changed_stategroup())
+                                       | set(self.client.take_changed_statename()))
+            self.__confirm_pending_changes(self.client.take_changed_currentstate())
+
+        self.list_statebrowser_order = self.__filter_stategroup_ids()
+        # Drop pending changes of removed StateGroup.
+        self.pending_changes.prune(self.state_registry)
+        self.__refresh_statebrowser_rows()
+        self.__schedule_dirtymark_redraw()
+
+    def __filter_stategroup_ids(self) -> list:
+        """Return StateGroup GUIDs in path order which match filter box."""
+        if self.client is not None:
+            # StateGroups can be added or removed by WAAPI thread meanwhile.
+            stategroup_ids = self.client.get_stategroup_ids()
+        else:
+            stategroup_ids = self.state_registry.ids()
+        watched = self.client.watched if self.client is not None else None
+        if watched is not None:
+            # Other StateGroups get no stateChanged, so their rows would be stale.
+            stategroup_ids = [k for k in stategroup_ids if k in watched]
+        query = self.filter_text.get().strip()
+        if query:
+            matches = self.search_index.search(query)
+            if len(matches) < len(stategroup_ids):
+                stategroup_ids = [k for k in stategroup_ids if k in matches]
+        self.frame_statebrowser.config(
+            text="State List ({}/{})".format(len(stategroup_ids), len(self.state_registry))
+            if query or watched is not None else "State List")
+        return stategroup_ids
+
+    def watch_filtered(self):
+        """Watch only StateGroups matching filter box. Watch all if it is empty."""
+        query = self.filter_text.get().strip()
+        self.__watch(self.search_index.search(query) if query else None)
+
+    def watch_all(self):
+        self.__watch(None)
+
+    def __watch(self, stategroup_ids):
+        if self.client is None:
+            return
+        self.lbl_setstate_result.config(text="Updating watched StateGroups...")
+        # Newly watched StateGroups fetch their current States.
+        client = self.client
+        self.run_in_worker(lambda: client.watch(stategroup_ids), self.__on_watch_completed,
+                           lambda e: self.lbl_setstate_result.config(text="Watch failed: " + str(e)))
+
+    def __on_watch_completed(self, watched):
+        self.lbl_setstate_result.config(
+            text="Watching all StateGroups" if watched is None else "Watching {} StateGroups".format(len(watched)))
+        self.statebrowser_top = 0
+        self.__apply_filter()
+
+    def __on_filter_changed(self):
+        self.statebrowser_top = 0
+        self.__apply_filter()
+
+    def __apply_filter(self):
+        with metrics.timer('filter'):
+            self.list_statebrowser_order = self.__filter_stategroup_ids()
+            # Rows keeping the same StateGroup are skipped by snapshot.
+            self.__refresh_statebrowser_rows()
+
+    def __refresh_statebrowser_rows(self):
+        self.statebrowser_top, visible = window_statebrowser(
+            self.list_statebrowser_order, self.statebrowser_top, len(self.list_statebrowser_row))
+
+        self.dict_statebrowser_object = {}
+        for rowobject, stategroup_id in zip(self.list_statebrowser_row, visible):
+            self.__bind_statebrowser_row(rowobject, stategroup_id)
+            if stategroup_id is not None:
+                self.dict_statebrowser_object[stategroup_id] = rowobject
+
+        total = len(self.list_statebrowser_order)
+        if total > len(self.list_statebrowser_row):
+            self.scr_statebrowser.set(self.statebrowser_top / total,
+                                      (self.statebrowser_top + len(self.list_statebrowser_row)) / total)
+        else:
+            self.scr_statebrowser.set(0.0, 1.0)
+
+        if self.client is not None and self.client.lazy:
+            # Load States of visible rows before their ComboBox is opened.
+            self.client.prefetch_states([stategroup_id for stategroup_id in visible
+                                         if stategroup_id is not None and not self.__is_states_loaded(stategroup_id)])
+
+    def __is_states_loaded(self, stategroup_id) -> bool:
+        stategroup = self.state_registry.get(stategroup_id)
+        return stategroup is None or stategroup.loaded
+
+    def __on_state_combobox_opening(self, rowobject):
+        stategroup_id = rowobject['StateGroup']
+        if self.client is None or stategroup_id is None or self.__is_states_loaded(stategroup_id):
+            return
+        # Not prefetched yet. Fetch on worker thread, because a WAAPI round trip
+        # on Tk thread freezes the window.
+        rowobject['ComboBox'].config(values=[self.LOADING_STATES_TEXT])
+        if stategroup_id in self.__loading_stategroups:
+            return
+        self.__loading_stategroups.add(stategroup_id)
+        client = self.client
+        self.run_in_worker(lambda: client.load_states(stategroup_id),
+                           lambda stategroup: self.__on_states_loaded(stategroup_id),
+                           lambda e: self.__on_states_loaded(stategroup_id))
+
+    def __on_states_loaded(self, stategroup_id):
+        self.__loading_stategroups.discard(stategroup_id)
+        rowobject = self.dict_statebrowser_object.get(stategroup_id)
+        if rowobject is None:
+            return
+        # Placeholder is replaced by States, or by the last known ones if fetch failed.
+        rowobject['Snapshot'] = None
+        self.__bind_statebrowser_row(rowobject, stategroup_id)
+
+    def __bind_statebrowser_row(self, rowobject, stategroup_id):
+        stategroup = self.state_registry.get(stategroup_id)
+        if stategroup is None:
+            # Not bound or StateGroup was removed before update_statebrowser.
+            if rowobject['StateGroup'] is not None:
+                rowobject['Label'].config(text="")
+                rowobject['ComboBox'].config(values=[], state='disabled')
+                rowobject['ComboBox'].set("")
+                rowobject['StateGroup'] = None
+                rowobject['Snapshot'] = None
+                self.__draw_dirtymark(rowobject, None)
+            return
 
+        snapshot = make_statebrowser_snapshot(stategroup)
+        if rowobject['StateGroup'] == stategroup_id and rowobject['Snapshot'] == snapshot:
+            return
+        if rowobject['StateGroup'] != stategroup_id:
+            # Row shows another StateGroup after scroll or filter.
+            self.__draw_dirtymark(rowobject, self.pending_changes.status(stategroup_id))
+        old_snapshot = rowobject['Snapshot'] if rowobject['StateGroup'] == stategroup_id else None
+        new_path, new_state, new_current = snapshot
+
+        if old_snapshot is None or old_snapshot[0] != new_path:
+            rowobject['Label'].config(text=self.__stategroup_label_text(stategroup_id))
+        if old_snapshot is None or old_snapshot[1] != new_state:
+            rowobject['ComboBox'].config(values=list(new_state), state='readonly')
+            # Drop pending change to State which no longer exists.
+            if stategroup.loaded and self.pending_changes.state(stategroup_id) not in (None,) + new_state:
+                self.pending_changes.discard(stategroup_id)
+                self.__schedule_dirtymark_redraw()
+        # Show user's pending selection if exists.
+        if old_snapshot is None or old_snapshot[2] != new_current:
+            rowobject['ComboBox'].set(
+                self.pending_changes.state(stategroup_id, new_current))
+        rowobject['StateGroup'] = stategroup_id
+        rowobject['Snapshot'] = snapshot
+
+    def __update_statebrowser_row(self, stategroup_id):
+        rowobject = self.dict_statebrowser_object.get(stategroup_id)
+        if rowobject is not None:
+            self.__bind_statebrowser_row(rowobject, stategroup_id)
+
+    def __resize_statebrowser_pool(self, capacity):
+        capacity = max(1, capacity)
+        while len(self.list_statebrowser_row) < capacity:
+            row = len(self.list_statebrowser_row)
+            rowobject = {'StateGroup': None, 'Snapshot': None, 'Dirty': None}
+            # Create StateGroupName Label & DirtyFlag Label.
+            rowobject['Label'] = ttk.Label(self.frame_statebrowser,
+                                           name="lbl_row"+str(row),
+                                           width=50, border=1, relief="solid")
+            rowobject['DirtyMark'] = ttk.Label(self.frame_statebrowser,
+                                               name="dirty_row"+str(row),
+                                               foreground="red",
+                                               width=5, border=1, relief="flat")
             # Create State ComboBox.
-            combobox_values = []
-            for i in stategroup_info.get('state', []):
-                combobox_values.append(i)
-
-            self.dict_statebrowser_object[stategroup_id].setdefault(
-                'ComboBox', ttk.Combobox(self.frame_statebrowser,
-                                         name='cmb_'+stategroup_id,
-                                         state='readonly',
-                                         width=25,
-                                         values=combobox_values))
-            self.dict_statebrowser_object[stategroup_id]['ComboBox'].current(0)
-            self.dict_statebrowser_object[stategroup_id]['ComboBox'].bind(
-                '<<ComboboxSelected>>', self.__on_state_combobox_changed)
-
-            for i in range(len(self.dict_statebrowser_object)):
-                # Browser column title is placed row=0, so start row=1.
-                self.dict_statebrowser_object[stategroup_id]['Label'].grid(
-                    column=0, row=i+1, sticky="EW")
-                self.dict_statebrowser_object[stategroup_id]['ComboBox'].grid(
-                    column=1, row=i+1, sticky="EW")
-                self.dict_statebrowser_object[stategroup_id]['DirtyMark'].grid(
-                    column=2, row=i+1)
-
-            # Set ComboBox value to current State.
-            self.dict_statebrowser_object[stategroup_id]['ComboBox'].set(
-                stategroup_info.get('current'))
-
-        # Set Label text.
-        self.__on_toggle_stategrouplabel_text()
-
-        self.client.on_statename_sync_completed()
-        self.client.on_currentstate_sync_completed()
+            rowobject['ComboBox'] = ttk.Combobox(self.frame_statebrowser,
+                                                 name="cmb_row"+str(row),
+                                                 state='disabled',
+                                                 width=25,
+                                                 postcommand=lambda rowobject=rowobject:
+                                                 self.__on_state_combobox_opening(rowobject))
+            rowobject['ComboBox'].bind('<<ComboboxSelected>>',
+                                       lambda event, rowobject=rowobject:
+                                       self.__on_state_combobox_changed(rowobject['StateGroup'], event.widget.get()))
+            # Browser column title is placed row=0, so start row=1.
+            rowobject['Label'].grid(column=0, row=row+1, sticky="EW")
+            rowobject['ComboBox'].grid(column=1, row=row+1, sticky="EW")
+            rowobject['DirtyMark'].grid(column=2, row=row+1)
+            for widgetkey in ('Label', 'DirtyMark', 'ComboBox'):
+                self.__bind_statebrowser_wheel(rowobject[widgetkey])
+            self.list_statebrowser_row.append(rowobject)
+
+        while len(self.list_statebrowser_row) > capacity:
+            rowobject = self.list_statebrowser_row.pop()
+            for widgetkey in ('Label', 'DirtyMark', 'ComboBox'):
+                rowobject[widgetkey].destroy()
+
+        self.scr_statebrowser.grid(column=3, row=1, rowspan=capacity, sticky="NS")
+        self.__refresh_statebrowser_rows()
+
+    def __bind_statebrowser_wheel(self, widget):
+        # Bind to each widget and break, so readonly ComboBox doesn't cycle its values.
+        widget.bind('<MouseWheel>', lambda event: self.__scroll_statebrowser(
+            -1 if event.delta > 0 else 1))
+        widget.bind('<Button-4>', lambda event: self.__scroll_statebrowser(-1))
+        widget.bind('<Button-5>', lambda event: self.__scroll_statebrowser(1))
+
+    def __scroll_statebrowser(self, rows):
+        self.statebrowser_top += rows
+        self.__refresh_statebrowser_rows()
+        return "break"
+
+    def __on_statebrowser_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.statebrowser_top = int(float(args[0]) * len(self.list_statebrowser_order))
+        elif action == 'scroll':
+            step = int(args[0])
+            if args[1] == 'pages':
+                step *= len(self.list_statebrowser_row)
+            self.statebrowser_top += step
+        self.__refresh_statebrowser_rows()
+
+    def __on_statebrowser_resized(self, event):
+        first_combobox = self.list_statebrowser_row[0]['ComboBox']
+        row_height = first_combobox.winfo_height()
+        if row_height <= 1:
+            # Not laid out yet.
+            return
+        # Rows start below Labelframe title & column title.
+        available = event.height - first_combobox.winfo_y()
+        capacity = max(1, available // row_height)
+        if capacity != len(self.list_statebrowser_row):
+            self.__resize_statebrowser_pool(capacity)
+
+    def __schedule_dirtymark_redraw(self):
+        # Many status changes of one event or batch are drawn by one idle callback.
+        if self.__dirtymark_redraw_scheduled:
+            return
+        self.__dirtymark_redraw_scheduled = True
+        self.after_idle(self.__redraw_dirtymarks)
+
+    def __redraw_dirtymarks(self):
+        self.__dirtymark_redraw_scheduled = False
+        for stategroup_id in self.pending_changes.take_changed():
+            # Rows out of view are drawn when bound.
+            rowobject = self.dict_statebrowser_object.get(stategroup_id)
+            if rowobject is not None:
+                self.__draw_dirtymark(rowobject, self.pending_changes.status(stategroup_id))
+
+    def __draw_dirtymark(self, rowobject, status):
+        if rowobject['Dirty'] == status:
+            return
+        rowobject['DirtyMark'].config(text=self.DIRTYMARK_TEXT[status])
+        rowobject['Dirty'] = status
 
     def set_changed_state(self):
-        if self.client is not None:
-            for stategroup_id, state_name in self.dict_changedstate.items():
-                self.client.set_state(stategroup_id, state_name)
-            self.dict_changedstate = {}
+        if self.client is None or not self.pending_changes.pending:
+            return
+        changedstate = self.pending_changes.take_pending()
+        self.__schedule_dirtymark_redraw()
+        self.lbl_setstate_result.config(
+            text="Setting {} States...".format(len(changedstate)))
+        # Apply on worker thread and report back to Tk main loop.
+        client = self.client
+        # Every change failed if set_states raised, so they become pending again.
+        self.run_in_worker(lambda: client.set_states(changedstate), self.__on_set_changed_state_completed,
+                           lambda e: self.__on_set_changed_state_completed(
+                               {stategroup_id: {'state': state_name, 'success': False,
+                                                'latency': 0.0, 'error': str(e)}
+                                for stategroup_id, state_name in changedstate.items()}))
 
-    def __on_toggle_stategrouplabel_text(self):
+    def __on_set_changed_state_completed(self, results: dict):
+        failed = [stategroup_id for stategroup_id, result in results.items()
+                  if not result['success']]
+        # Failed changes become pending again. Succeeded ones wait for stateChanged,
+        # which Wwise before 2022 doesn't publish.
+        self.pending_changes.apply_results(
+            results, self.state_registry,
+            confirmed_by_event=self.client is not None and not self.client.is_restrictedmode)
+        self.__schedule_dirtymark_redraw()
+
+        message = "Set State: {} succeeded, {} failed".format(
+            len(results) - len(failed), len(failed))
+        if results:
+            message += " (max {:.0f} ms)".format(
+                max(result['latency'] for result in results.values()) * 1000)
+        if failed:
+            message += ": " + ", ".join(
+                self.state_registry.get(stategroup_id, StateGroup(stategroup_id, stategroup_id)).name
+                for stategroup_id in failed[:3])
+            if len(failed) > 3:
+                message += ", ..."
+        self.lbl_setstate_result.config(text=message)
+
+    def __stategroup_label_text(self, stategroup_id) -> str:
+        stategroup = self.state_registry.get(stategroup_id)
+        if stategroup is None:
+            return ""
         if self.visible_stategroup_path.get() == True:
-            for stategroup in self.dict_statebrowser_object.keys():
-                self.dict_statebrowser_object[stategroup]['Label'].config(
-                    text=self.dict_state_in_wwise.get(stategroup, {}).get('path', ""))
-        else:
-            for stategroup in self.dict_statebrowser_object.keys():
-                self.dict_statebrowser_object[stategroup]['Label'].config(
-                    text=self.dict_state_in_wwise.get(stategroup, {}).get('path', "").split('\\')[-1])
-
-    def __on_state_combobox_changed(self, event):
-        # Already listed in dict_changedstate?
-        if event.widget._name in self.dict_changedstate.keys():
-            # Same State in Wwise?
-            if self.dict_state_in_wwise[event.widget._name].get('current') == event.widget.get():
-                # Delete existed key because you changed to same state in Wwise.
-                del self.dict_changedstate[event.widget._name]
-                return
-        # Add new State in dict_changedstate.
-        self.dict_changedstate[event.widget._name] = event.widget.get()
+            return stategroup.path
+        return stategroup.name
+
+    def __on_toggle_stategrouplabel_text(self):
+        for stategroup in self.dict_statebrowser_object.keys():
+            self.dict_statebrowser_object[stategroup]['Label'].config(
+                text=self.__stategroup_label_text(stategroup))
+
+    def __on_state_combobox_changed(self, stategroup_id, state_name):
+        # Same State in Wwise?
+        stategroup = self.state_registry.get(stategroup_id)
+        if stategroup is None:
+            return
+        if state_name not in stategroup.state_names():
+            # Placeholder of States being loaded.
+            rowobject = self.dict_statebrowser_object.get(stategroup_id)
+            if rowobject is not None:
+                rowobject['ComboBox'].set(self.pending_changes.state(stategroup_id, stategroup.current))
+            return
+        # Picking the same State as in Wwise cancels the change.
+        self.pending_changes.pick(stategroup, state_name)
+        self.__schedule_dirtymark_redraw()
 
     def on_waapi_connected(self, client: StateUtility):
         self.client = client
-        self.lbl_wproj_info.config(
-            text="Connected: " + client.wproj_info.get('name', "") + "<"+client.wproj_info.get('filePath', "") + ">")
+        self.show_connected_message()
         self.btn_forceupdate['state'] = 'normal'
         self.btn_setstate['state'] = 'normal'
-        self.dict_state_in_wwise = client.state_in_wwise
+        self.btn_applypreset['state'] = 'normal'
+        self.btn_playscenario['state'] = 'normal'
+        self.btn_watchfiltered['state'] = 'normal'
+        self.btn_watchall['state'] = 'normal'
+        self.state_registry = client.state_in_wwise
+        self.search_index.rebuild(self.state_registry)
         self.update_statebrowser()
 
     def on_waapi_disconnected(self, client: StateUtility):
+        if client is not self.client:
+            # Late notification of a replaced client.
+            return
         self.client = None
         self.lbl_wproj_info.config(
             text="NotConnected: Check Wwise is running and WAAPI is enabled.")
+        if self.__force_update_cancel is not None:
+            self.__cancel_force_update()
         self.btn_forceupdate['state'] = 'disabled'
         self.btn_setstate['state'] = 'disabled'
+        self.btn_applypreset['state'] = 'disabled'
+        self.btn_watchfiltered['state'] = 'disabled'
+        self.btn_watchall['state'] = 'disabled'
+        if self.scenario_player is not None:
+            self.scenario_player.stop()
+        self.btn_playscenario['state'] = 'disabled'
+
+    def on_load_progress(self, client: StateUtility):
+        updating = client is self.client and self.__force_update_cancel is not None
+        if self.client is not None and not updating:
+            return
+        loaded, total = client.load_progress
+        self.lbl_wproj_info.config(
+            text=("Updating: " if updating else "Loading: ") + client.wproj_info.get('name', "")
+            + " ({}/{} StateGroups)".format(loaded, total))
+
+    def __update_search_index(self, stategroup_ids):
+        for stategroupid in stategroup_ids:
+            stategroup = self.state_registry.get(stategroupid)
+            if stategroup is None:
+                self.search_index.remove_stategroup(stategroupid)
+            else:
+                self.search_index.update_stategroup(stategroup)
+
+    def on_stategroup_changed(self, client: StateUtility):
+        # Keep search index current even while rows are not synced.
+        self.__update_search_index(client.take_changed_stategroup().keys())
+        if self.enable_autosync.get() == False:
+            return
+        # Order of rows changes, so reconcile all. Only changed rows are redrawn.
+        self.update_statebrowser()
 
     def on_statename_changed(self, client: StateUtility):
+        changed = client.take_changed_statename()
+        self.__update_search_index(changed.keys())
         if self.enable_autosync.get() == False:
             return
-        for stategroupid, statenameinfo in client.changed_statename.items():
-            for statetype, names in statenameinfo.items():
-                if statetype == "StateGroup":
-                    self.dict_statebrowser_object[stategroupid]['Label'].config(
-                        text=names['newName'])
-                elif statetype == "State":
-                    # Can't change combobox values...
-                    pass
-        client.on_statename_sync_completed()
+        if self.filter_text.get().strip():
+            # Renamed StateGroup or State may enter or leave filter result.
+            self.__apply_filter()
+            return
+        for stategroupid in changed.keys():
+            self.__update_statebrowser_row(stategroupid)
+
+    def __confirm_pending_changes(self, changed_currentstate: dict):
+        for stategroupid, current in changed_currentstate.items():
+            self.pending_changes.confirm(stategroupid, current)
+        self.__schedule_dirtymark_redraw()
 
     def on_currentstate_changed(self, client: StateUtility):
-        if self.enable_autosync.get() == False:
+        changed = client.take_changed_currentstate()
+        # Confirm sent changes even while rows are not synced.
+        self.__confirm_pending_changes(changed)
+        if not self.enable_autosync.get():
             return
-        for stategroupid, newstate in client.changed_currentstate.items():
-            self.dict_statebrowser_object[stategroupid]['ComboBox'].set(
-                newstate)
-        client.on_currentstate_sync_completed()
+        for stategroupid in changed.keys():
+            self.__update_statebrowser_row(stategroupid)
+
+
+class InstanceCompareWindow(tkinter.Toplevel, Observer):
+    """Current States of several Wwise instances side by side.\n
+    Rows are StateGroup paths and columns are instances of ConnectionPool.
+    Notifications of every instance are coalesced into one refresh per drain,
+    and the refresh only touches rows whose States changed.
+    """
+    # Shown for a StateGroup the instance does not have.
+    MISSING = "-"
+
+    def __init__(self, master, pool: ConnectionPool, event_drain_interval=MainWindow.DEFAULT_EVENT_DRAIN_INTERVAL,
+                 event_queue_size=EventQueue.DEFAULT_MAXLEN, event_queue_policy='drop_oldest'):
+        super().__init__(master)
+        self.title("Compare Instances")
+        self.minsize(500, 200)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+        # Closing only hides the window. Instances keep running.
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+
+        self.pool = pool
+        self.event_drain_interval = event_drain_interval
+        # Pass to ConnectionSupervisor of each instance. Drained on Tk main loop.
+        self.event_queue = EventQueue(event_queue_size, event_queue_policy)
+        self.queued_observer = QueuedObserver(self, self.event_queue, name='compare_queue')
+        self.only_differences = tkinter.BooleanVar(value=True)
+        # { 'StateGroup Path' : (Current State Name or None, ...) } shown in tree.
+        self.__rows = {}
+        # Sorted paths of __rows for insert position.
+        self.__paths = []
+        self.__dirty = True
+
+        self.chk_onlydifferences = ttk.Checkbutton(self,
+                                                   name="chk_onlydifferences",
+                                                   text="Only Differences",
+                                                   padding=3,
+                                                   variable=self.only_differences,
+                                                   command=self.__rebuild)
+        self.chk_onlydifferences.grid(column=0, row=0, sticky="w", padx=5)
+
+        self.lbl_summary = ttk.Label(self, name="lbl_summary", text="", padding=3)
+        self.lbl_summary.grid(column=1, row=0, sticky="e", padx=5)
+
+        self.tree_compare = ttk.Treeview(self, name="tree_compare", selectmode="browse")
+        self.tree_compare.heading('#0', text="StateGroup")
+        self.tree_compare.column('#0', width=250)
+        self.tree_compare.tag_configure('differ', background="#ffe0e0")
+        self.tree_compare.grid(column=0, row=1, columnspan=2, sticky="nsew", padx=5, pady=3)
+        self.scr_compare = ttk.Scrollbar(self, name="scr_compare", orient="vertical",
+                                         command=self.tree_compare.yview)
+        self.scr_compare.grid(column=2, row=1, sticky="ns")
+        self.tree_compare['yscrollcommand'] = self.scr_compare.set
+
+        self.after(self.event_drain_interval, self.__drain_event_queue)
+        self.after(1000, self.__refresh_headings)
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+        self.__refresh()
+
+    def __drain_event_queue(self):
+        try:
+            self.queued_observer.dispatch(MainWindow.DEFAULT_EVENT_DRAIN_BATCH)
+            if self.__dirty and self.winfo_viewable():
+                self.__refresh()
+        finally:
+            self.after(self.event_drain_interval, self.__drain_event_queue)
+
+    def __refresh_headings(self):
+        # Connection state is not notified by every instance, so poll it.
+        self.__update_columns()
+        self.after(1000, self.__refresh_headings)
+
+    def __update_columns(self):
+        supervisors = list(self.pool)
+        columns = tuple("instance{}".format(i) for i in range(len(supervisors)))
+        if tuple(self.tree_compare['columns']) != columns:
+            self.tree_compare['columns'] = columns
+            self.__rows.clear()
+            self.__paths.clear()
+            self.tree_compare.delete(*self.tree_compare.get_children())
+            self.__dirty = True
+        for column, supervisor in zip(columns, supervisors):
+            wproj_info = supervisor.wproj_info
+            text = wproj_info.get('name', "") if wproj_info is not None else (supervisor.url or "Default")
+            if supervisor.client is None:
+                text += " (offline)"
+            self.tree_compare.heading(column, text=text)
+
+    def __rebuild(self):
+        self.__rows.clear()
+        self.__paths.clear()
+        self.tree_compare.delete(*self.tree_compare.get_children())
+        self.__refresh()
+
+    def __refresh(self):
+        self.__dirty = False
+        with metrics.timer('compare'):
+            self.__update_columns()
+            rows = self.pool.compare(self.only_differences.get())
+            for path in [path for path in self.__rows if path not in rows]:
+                del self.__rows[path]
+                del self.__paths[bisect.bisect_left(self.__paths, path)]
+                self.tree_compare.delete(path)
+            for path, values in rows.items():
+                if self.__rows.get(path) == values:
+                    continue
+                text = tuple(self.MISSING if value is None else value for value in values)
+                tags = ('differ',) if values.count(values[0]) != len(values) else ()
+                if path in self.__rows:
+                    self.tree_compare.item(path, values=text, tags=tags)
+                else:
+                    position = bisect.bisect(self.__paths, path)
+                    self.__paths.insert(position, path)
+                    self.tree_compare.insert('', position, iid=path, text=path, values=text, tags=tags)
+                self.__rows[path] = values
+        self.lbl_summary.config(text="{} StateGroups differ".format(
+            sum(1 for values in rows.values() if values.count(values[0]) != len(values))))
+
+    def __take_changes(self, client: StateUtility):
+        # Changes of an instance pile up unless its only observer takes them.
+        # StateGroups whose path or States changed are compared again anyway.
+        if any(supervisor.client is client and supervisor.observer is self.queued_observer
+               for supervisor in self.pool):
+            client.take_changed_stategroup()
+            client.take_changed_statename()
+            client.take_changed_currentstate()
+        self.__dirty = True
+
+    def on_waapi_connected(self, client: StateUtility):
+        self.__dirty = True
+
+    def on_waapi_disconnected(self, client: StateUtility):
+        self.__dirty = True
+
+    def on_load_progress(self, client: StateUtility):
+        pass
+
+    def on_stategroup_changed(self, client: StateUtility):
+        self.__take_changes(client)
+
+    def on_statename_changed(self, client: StateUtility):
+        self.__take_changes(client)
+
+    def on_currentstate_changed(self, client: StateUtility):
+        self.__take_changes(client)
 
 
 if __name__ == "__main__":
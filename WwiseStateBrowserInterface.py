@@ -1,42 +1,164 @@
 #! python3
-from waapi import WaapiClient, CannotConnectToWaapiException
+import asyncio
+import collections
+import sys
+import threading
+import time
+
+from waapi import WaapiClient, CannotConnectToWaapiException, WaapiRequestFailed
 from waapi.client.executor import SequentialThreadExecutor
+from waapi.client.interface import CallbackExecutor
 
+from StateHistory import StateHistory
+from StateMetrics import metrics
+from StateModel import RegistryDelta, StateGroup, StateGroupChange, StateNameChange, StateRegistry
 from StateObserver import Subject
 
 
-class StateUtility(WaapiClient, Subject):
+class LoadCancelledException(Exception):
+    pass
+
+
+class ConnectionLostException(Exception):
+    """Raised when the connection drops or a call gets no reply within call_timeout while loading."""
+    pass
+
+
+class ScopedCallbackExecutor(CallbackExecutor):
+    """Drop WAAPI events which StateUtility would ignore before they are queued.\n
+    WAAPI has no subscription option to filter objects by type, so nameChanged etc. are
+    published for every object. execute() runs on the WAMP event loop thread, so events
+    dropped here never wake the callback thread.
+    """
+
+    def __init__(self, executor: CallbackExecutor, accepts):
+        """
+        Args:
+            executor (CallbackExecutor): Runs accepted callbacks.
+            accepts: accepts(callback, kwargs) returns False for events to drop.
+        """
+        self.executor = executor
+        self.accepts = accepts
+
+    def start(self):
+        self.executor.start()
+
+    def stop(self):
+        self.executor.stop()
 
-    def __init__(self, url=None, allow_exception=False, callback_executor=SequentialThreadExecutor, observer=None):
-        super().__init__(url, allow_exception, callback_executor)
+    def execute(self, callback, kwargs):
+        if self.accepts(callback, kwargs):
+            self.executor.execute(callback, kwargs)
+        else:
+            metrics.count('event:filtered')
+
+
+class StateUtility(WaapiClient, Subject):
+    # Number of ak.soundengine.getState calls between progress reports & cancel checks.
+    DEFAULT_BATCH_SIZE = 16
+    # Return options of object subscriptions.
+    OBJECT_RETURN = ["type", "id", "name", "path", "parent"]
+    # Object types of which events are handled. Others are dropped by ScopedCallbackExecutor.
+    OBJECT_TYPES = frozenset(("StateGroup", "State"))
+
+    def __init__(self, url=None, allow_exception=False, callback_executor=SequentialThreadExecutor, observer=None,
+                 cancel_event: threading.Event = None, history: StateHistory = None,
+                 registry: StateRegistry = None, lazy=False, watch=None, call_timeout: float = None):
+        """Connect to WAAPI and load State information.\n
+        Can be constructed from a worker thread to keep UI responsive.
+        Args:
+            cancel_event (threading.Event): Set to abort loading. Then the client
+                                            disconnects and LoadCancelledException is raised.
+            history (StateHistory): Records every stateChanged event before coalescing.
+            registry (StateRegistry): Last known State information, e.g. of previous connection
+                                      or cache. If it is of the same project, it is updated in place
+                                      and observers are notified of the differences only.
+            lazy (bool): Load StateGroups and current States only. States of a StateGroup
+                         are fetched by load_states() or prefetch_states() when needed.
+            watch: Optional. GUIDs or paths of StateGroups whose current States are
+                   fetched and kept by stateChanged. See watch().
+            call_timeout (float): Abort loading when a call gets no reply within seconds or
+                                  the connection drops. Then the client disconnects and
+                                  ConnectionLostException is raised. Wait forever if None.
+        """
+        # WaapiClient needs an event loop in the constructing thread. It reuses a running one,
+        # e.g. of a client abandoned by a timed out disconnect, which cannot run twice.
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or loop.is_running():
+            asyncio.set_event_loop(asyncio.new_event_loop())
+
+        self.__cancel_event = cancel_event
+        # Applies to calls of the constructor only, like __cancel_event.
+        self.__call_timeout = call_timeout
+        self.history = history
+        self.lazy = lazy
+        # StateGroup GUIDs waiting for prefetch_states & its worker thread.
+        self.__prefetch_ids = collections.deque()
+        self.__prefetch_lock = threading.Lock()
+        self.__prefetch_thread = None
+        # (Loaded StateGroups, Total StateGroups) of running update_state_info.
+        self.load_progress = (0, 0)
+        # Guards state_in_wwise & changed_* against WAAPI callback thread.
+        self.__state_lock = threading.RLock()
+        # Round-trip counter must exist before the first call().
+        self.__call_count = 0
+        self.__call_count_lock = threading.Lock()
+        # {'mode': 'bulk' or 'pergroup', 'stategroups': int, 'round_trips': int, 'elapsed': float(sec)}
+        self.__update_stats = {}
+        # frozenset of watched StateGroup GUIDs or None for all. Paths of watch are resolved on load.
+        self.__watched = None
+        self.__watch_request = frozenset(watch) if watch is not None else None
+        # EventHandlers of set_subscription. Other subscriptions are never filtered.
+        self.__scoped_handlers = set()
+
+        super().__init__(url, allow_exception,
+                         lambda: ScopedCallbackExecutor(callback_executor(), self.accepts_event))
         if observer is not None:
             self.add_observer(observer)
 
         # If under v2022, set RestrictMode.
         self.is_restrictedmode = False
-        version = self.call('ak.wwise.core.getInfo')['version']
+        try:
+            version = self.call('ak.wwise.core.getInfo')['version']
+            wproj = self.call("ak.wwise.core.object.get",
+                              {"from": {"ofType": ["Project"]},
+                               "options": {"return": ["name", "filePath"]}})['return'][0]
+        except ConnectionLostException:
+            self.disconnect(self.__call_timeout)
+            raise
         if version['year'] < 2022:
             self.is_restrictedmode = True
 
-        wproj = self.call("ak.wwise.core.object.get",
-                          {"from": {"ofType": ["Project"]},
-                           "options": {"return": ["name", "filePath"]}})['return'][0]
         self.__wproj_info = {'name': wproj['name'],
                              'filePath': wproj['filePath']}
 
-        # {'StateGroup GUID': {'path': 'StateGroup Name',
-        #                      'state': ['State Name', 'State Name', ...],
-        #                      'current': 'State name'}
-        self.__state_in_wwise = {}
-        # { 'StateGroup GUID' : {'StateGroup':{'newName':NewStateGroup Path},
-        #                        'State'     :{'id':State GUID,
-        #                                      'oldName':OldState Name,
-        #                                      'newName':NewState Name}}
+        # StateGroups & States sorted by StateGroup path.
+        if registry is None or registry.project_path != self.__wproj_info['filePath']:
+            registry = StateRegistry()
+            registry.project_path = self.__wproj_info['filePath']
+        self.__state_in_wwise = registry
+        # { 'StateGroup GUID' : StateGroupChange }
         self.changed_statename = {}
+        # { 'StateGroup GUID' : 'added' or 'removed' or 'moved' }. Renamed StateGroup is 'moved'.
+        self.changed_stategroup = {}
         # { StateGroup GUID : NewState Name}
         self.changed_currentstate = {}
+        # Number of stateChanged events superseded before observers took them.
+        self.coalesced_currentstate_count = 0
 
-        self.update_state_info()
+        try:
+            self.update_state_info()
+        except LoadCancelledException:
+            self.disconnect()
+            raise
+        except ConnectionLostException:
+            self.disconnect(self.__call_timeout)
+            raise
+        self.__cancel_event = None
+        self.__call_timeout = None
         self.set_subscription()
 
         self.notify_observer_of_waapi_connected()
@@ -46,39 +168,291 @@ class StateUtility(WaapiClient, Subject):
         return self.__wproj_info
 
     @property
-    def state_in_wwise(self):
+    def state_in_wwise(self) -> StateRegistry:
         return self.__state_in_wwise
 
+    @property
+    def watched(self) -> frozenset:
+        """GUIDs of watched StateGroups. None if all are watched."""
+        return self.__watched
+
+    @property
+    def call_count(self) -> int:
+        return self.__call_count
+
+    @property
+    def update_stats(self) -> dict:
+        return self.__update_stats
+
+    def call(self, _uri, *args, **kwargs):
+        with self.__call_count_lock:
+            self.__call_count += 1
+        with metrics.timer('call:' + _uri):
+            if self.__call_timeout is None:
+                return super().call(_uri, *args, **kwargs)
+            return self.__call_within_timeout(_uri, *args, **kwargs)
+
+    def __call_within_timeout(self, _uri, *args, **kwargs):
+        # WaapiClient.call never returns if the socket drops while it waits,
+        # so call on another thread and stop waiting at timeout, like disconnect().
+        outcome = []
+
+        def run():
+            try:
+                outcome.append((WaapiClient.call(self, _uri, *args, **kwargs), None))
+            except Exception as e:
+                outcome.append((None, e))
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(self.__call_timeout)
+        if not outcome:
+            raise ConnectionLostException("No reply to {} within {}s.".format(_uri, self.__call_timeout))
+        result, error = outcome[0]
+        if error is not None:
+            raise error
+        # A dropped client returns None for every call.
+        if result is None and not self.is_connected():
+            raise ConnectionLostException("Connection lost during {}.".format(_uri))
+        return result
+
     def is_connected(self) -> bool:
         if super().is_connected() is None:
             return False
         else:
             return super().is_connected()
 
-    def disconnect(self) -> bool:
-        ret = super().disconnect()
+    def disconnect(self, timeout: float = None) -> bool:
+        """Disconnect and notify observer.\n
+        Args:
+            timeout (float): Stop waiting after seconds. A hung connection never completes
+                its goodbye, so it is left to finish on its own thread. Wait forever if None.
+        Returns:
+            bool: True if disconnected within timeout.
+        """
+        if timeout is None:
+            ret = super().disconnect()
+        else:
+            result = []
+            thread = threading.Thread(target=lambda: result.append(WaapiClient.disconnect(self)), daemon=True)
+            thread.start()
+            thread.join(timeout)
+            ret = bool(result and result[0])
         self.notify_observer_of_waapi_disconnected()
         return ret
 
+    @staticmethod
+    def event_stategroup_id(kwargs: dict) -> str:
+        """Return GUID of the StateGroup which a subscribed WAAPI event is about.\n
+        Events of other objects return their own GUID.
+        """
+        if "stateGroup" in kwargs:
+            # ak.wwise.core.profiler.stateChanged
+            return kwargs["stateGroup"].get("id", "")
+        obj = kwargs.get("child", kwargs.get("object", {}))
+        if obj.get("type") == "State":
+            # childAdded has parent in kwargs, others in object.
+            return kwargs.get("parent", obj.get("parent", {})).get("id", "")
+        return obj.get("id", "")
+
+    def accepts_event(self, callback, kwargs: dict) -> bool:
+        """Return False for event of set_subscription which would be ignored.\n
+        Called on WAMP event loop thread for every event before it is queued.
+        Objects other than StateGroup and State are dropped, and so is stateChanged
+        of StateGroup which is not watched. history still records every transition.
+        """
+        # callback is EventHandler.on_event of the subscription.
+        if getattr(callback, '__self__', None) not in self.__scoped_handlers:
+            return True
+        if "stateGroup" in kwargs:
+            watched = self.__watched
+            if watched is None or kwargs["stateGroup"].get("id", "") in watched:
+                return True
+            # Accepted ones are recorded by on_currentstate_changed.
+            if self.history is not None:
+                self.history.record(kwargs["stateGroup"], kwargs.get("state", {}))
+            return False
+        obj = kwargs.get("child", kwargs.get("object", {}))
+        return obj.get("type") in self.OBJECT_TYPES
+
     # Callback function with a matching signature.
     # Signature (*args, **kwargs) matches anything, with results being in kwargs.
     def set_subscription(self):
-        self.subscribe("ak.wwise.core.object.nameChanged",
-                       self.on_statename_changed, {"return": ["type", "id", "name", "path", "parent"]})
-
+        subscriptions = [("ak.wwise.core.object.nameChanged", self.on_statename_changed, self.OBJECT_RETURN),
+                         ("ak.wwise.core.object.created", self.on_object_created, self.OBJECT_RETURN),
+                         ("ak.wwise.core.object.preDeleted", self.on_object_deleted, self.OBJECT_RETURN),
+                         # There is no moved topic. Moved object is added to its new parent.
+                         ("ak.wwise.core.object.childAdded", self.on_object_child_added, self.OBJECT_RETURN)]
         if not self.is_restrictedmode:
-            self.subscribe("ak.wwise.core.profiler.stateChanged",
-                           self.on_currentstate_changed, {"return": ["id", "name", "path"]})
-
-    def update_state_info(self) -> dict:
+            subscriptions.append(("ak.wwise.core.profiler.stateChanged",
+                                  self.on_currentstate_changed, ["id", "name", "path"]))
+        for topic, callback, returns in subscriptions:
+            handler = self.subscribe(topic, callback, {"return": returns})
+            if handler is not None:
+                self.__scoped_handlers.add(handler)
+
+    def watch(self, stategroups=None) -> frozenset:
+        """Limit stateChanged handling to StateGroups. Watch all if None.\n
+        Current States of StateGroups which are not watched are left as last known.
+        Those of newly watched StateGroups are fetched, and observers are notified
+        of the ones which changed meanwhile.
+        Args:
+            stategroups: Iterable of StateGroup GUIDs or paths. Unknown ones are ignored.
+        Returns:
+            frozenset: GUIDs of watched StateGroups, or None.
+        """
+        with self.__state_lock:
+            all_ids = self.__state_in_wwise.ids()
+            if stategroups is None:
+                watched = None
+            else:
+                watched = frozenset(self.__resolve_stategroup_id(key) for key in stategroups) - {None}
+            old = self.__watched
+            self.__watched = watched
+            self.__watch_request = None
+        # Was not watched before.
+        entering = [k for k in all_ids if (watched is None or k in watched) and old is not None and k not in old]
+
+        currents = self.__get_current_states(entering)
+        changed = False
+        with self.__state_lock:
+            for stategroup_id, current in currents.items():
+                stategroup = self.__state_in_wwise.get(stategroup_id)
+                if stategroup is not None and stategroup.current != current:
+                    stategroup.current = sys.intern(current)
+                    self.changed_currentstate[stategroup_id] = stategroup.current
+                    changed = True
+        if changed:
+            self.notify_observer_of_currentstate_changed()
+        return watched
+
+    def __resolve_stategroup_id(self, key: str) -> str:
+        # Caller must hold __state_lock.
+        if self.__state_in_wwise.get(key) is not None:
+            return key
+        stategroup = self.__state_in_wwise.find_stategroup(key)
+        return stategroup.id if stategroup is not None else None
+
+    def update_state_info(self, bulk=True, batch_size=DEFAULT_BATCH_SIZE, lazy=None,
+                          cancel_event: threading.Event = None) -> StateRegistry:
         """Return State information.\n
+        Args:
+            bulk (bool): Fetch all StateGroups and States with a single query (default).
+                         If False, query children for each StateGroup.
+            batch_size (int): Number of getState calls between progress reports and cancel checks.
+            lazy (bool): Fetch StateGroups without States. Loaded States are dropped
+                         and fetched again when needed. Mode of constructor if None.
+            cancel_event (threading.Event): Set to abort. Then LoadCancelledException is raised
+                                            and State information is left as before.
         Returns:
-            dict: State information.\n
-            {'StateGroup GUID': {'path': 'StateGroup Path',
-                                'state': ['State Name', 'State Name', ...],
-                                'current': 'State name'}
+            StateRegistry: State information. The same object is updated in place.
         """
+        if cancel_event is not None:
+            self.__cancel_event = cancel_event
+            try:
+                return self.update_state_info(bulk, batch_size, lazy)
+            finally:
+                self.__cancel_event = None
+
+        start_count = self.__call_count
+        start_time = time.perf_counter()
+        if lazy is None:
+            lazy = self.lazy
+
+        if lazy:
+            ret = {stategroup_id: (path, None) for stategroup_id, path in self.__get_stategroup_paths().items()}
+        elif bulk:
+            ret = self.__get_stategroups_bulk()
+        else:
+            ret = self.__get_stategroups_pergroup()
+        self.__check_cancelled()
+
+        if self.__watch_request is not None:
+            # Paths of watch are known now.
+            ids_by_path = {path: stategroup_id for stategroup_id, (path, states) in ret.items()}
+            self.__watched = frozenset(key if key in ret else ids_by_path[key]
+                                       for key in self.__watch_request if key in ret or key in ids_by_path)
+            self.__watch_request = None
+        watched = self.__watched
+        currents = self.__get_current_states([stategroup_id for stategroup_id in ret.keys()
+                                              if watched is None or stategroup_id in watched], batch_size)
+
+        # Keep the same registry because observers hold a reference to it.
+        with self.__state_lock:
+            # Loading into known State information is a resync. Report what differs.
+            resync = len(self.__state_in_wwise) > 0
+            delta = self.__state_in_wwise.update(
+                (stategroup_id, path, states,
+                 currents[stategroup_id] if stategroup_id in currents else self.__known_current(stategroup_id))
+                for stategroup_id, (path, states) in ret.items())
+            if resync:
+                self.__record_delta(delta)
+        changed = len(set(delta.stategroups) | delta.states | delta.currents) if resync else None
+
+        self.__update_stats = {'mode': 'lazy' if lazy else 'bulk' if bulk else 'pergroup',
+                               'stategroups': len(self.__state_in_wwise),
+                               'changed': changed,
+                               'round_trips': self.__call_count - start_count,
+                               'elapsed': time.perf_counter() - start_time}
+        metrics.record('update_state_info:' + self.__update_stats['mode'], self.__update_stats['elapsed'])
+
+        if resync:
+            if delta.stategroups:
+                self.notify_observer_of_stategroup_changed()
+            if delta.states:
+                self.notify_observer_of_statename_changed()
+            if delta.currents:
+                self.notify_observer_of_currentstate_changed()
+
+        return self.__state_in_wwise
+
+    def __known_current(self, stategroup_id: str) -> str:
+        # Current State of StateGroup which is not watched. Caller must hold __state_lock.
+        stategroup = self.__state_in_wwise.get(stategroup_id)
+        return stategroup.current if stategroup is not None else 'None'
+
+    def __record_delta(self, delta: RegistryDelta):
+        # Caller must hold __state_lock.
+        for stategroupguid, kind in delta.stategroups.items():
+            if kind == 'removed':
+                self.changed_statename.pop(stategroupguid, None)
+                self.changed_currentstate.pop(stategroupguid, None)
+                if self.changed_stategroup.get(stategroupguid) == 'added':
+                    del self.changed_stategroup[stategroupguid]
+                    continue
+            self.changed_stategroup[stategroupguid] = kind
+        for stategroupguid in delta.states:
+            self.changed_statename.setdefault(stategroupguid, StateGroupChange())
+        for stategroupguid in delta.currents:
+            self.changed_currentstate[stategroupguid] = self.__state_in_wwise.get(stategroupguid).current
+
+    def __get_stategroups_bulk(self) -> dict:
+        # Get All StateGroup and State Info at once.
+        object_list = self.call("ak.wwise.core.object.get", {
+            "from": {
+                "ofType": ["StateGroup", "State"]},
+            "options": {
+                "return": ["id", "type", "name", "path", "parent"]}
+        })['return']
+
+        # { 'StateGroup GUID' : ('StateGroup Path', [('State GUID', 'State Name'), ...]) }
+        ret = {}
+        for obj in object_list:
+            if obj['type'] == "StateGroup":
+                ret[obj['id']] = (obj['path'], [])
+        for obj in object_list:
+            if obj['type'] == "State":
+                stategroup = ret.get(obj.get('parent', {}).get('id', ""))
+                if stategroup is not None:
+                    stategroup[1].append((obj['id'], obj['name']))
+        return ret
+
+    def __get_stategroups_pergroup(self) -> dict:
         ret = {}
+        for stategroup_id, path in self.__get_stategroup_paths().items():
+            ret[stategroup_id] = (path, self.__get_states(stategroup_id))
+        return ret
+
+    def __get_stategroup_paths(self) -> dict:
         # Get All StateGroup Info.
         stategroup_list = self.call("ak.wwise.core.object.get", {
             "from": {
@@ -86,110 +460,330 @@ class StateUtility(WaapiClient, Subject):
             "options": {
                 "return": ["id", "path"]}
         })['return']
+        return {stategroup['id']: stategroup['path'] for stategroup in stategroup_list}
 
-        for stategroup in stategroup_list:
-            ret[stategroup['id']] = {'path': stategroup['path']}
-
-            # Get All State Info from Each StateGroup.
-            state_list = self.call("ak.wwise.core.object.get", {
-                "from": {
-                    "id": [stategroup['id']]},
-                "transform": [
-                    {"select": ["children"]},
-                    {"where": ["type:isIn", ["State"]]}],
-                "options": {
-                    "return": ["id", "name"]}
-            })['return']
-
-            # Add Each State as List.
-            for state in state_list:
-                ret[stategroup['id']].setdefault(
-                    'state', []).append(state['name'])
-
-            # Add current State info.
-            if self.is_restrictedmode:
-                ret[stategroup['id']].setdefault('current', 'None')
-            else:
-                test = self.call("ak.soundengine.getState", {
-                    "stateGroup": stategroup['id'],
-                    "options": {"return": ["id", "name", 'parent.id']}
-                })
-                ret[stategroup['id']].setdefault('current', self.call("ak.soundengine.getState", {
-                    "stateGroup": stategroup['id'],
-                    "options": {"return": ["id", "name", 'parent.id']}
-                })['return'].get('name', 'None'))
-
-        # Sort return dict by path.
-        for k, v in sorted(ret.items(), key=lambda x: x[1]['path']):
-            self.__state_in_wwise[k] = v
+    def __get_states(self, stategroup_id: str) -> list:
+        # Get All State Info from the StateGroup as [(id, name), ...]. None if failed.
+        result = self.call("ak.wwise.core.object.get", {
+            "from": {
+                "id": [stategroup_id]},
+            "transform": [
+                {"select": ["children"]},
+                {"where": ["type:isIn", ["State"]]}],
+            "options": {
+                "return": ["id", "name"]}
+        })
+        if result is None:
+            return None
+        return [(state['id'], state['name']) for state in result.get('return', [])]
+
+    def load_states(self, stategroup_id: str) -> StateGroup:
+        """Return StateGroup with its States loaded.\n
+        States are fetched once, then kept current by WAAPI events.
+        Observers are notified as statename changed when States were fetched.
+        Returns:
+            StateModel.StateGroup: None if unknown.
+        """
+        with self.__state_lock:
+            stategroup = self.__state_in_wwise.get(stategroup_id)
+            if stategroup is None or stategroup.loaded:
+                return stategroup
+        with metrics.timer('load_states'):
+            states = self.__get_states(stategroup_id)
+        if states is None:
+            return stategroup
+        with self.__state_lock:
+            stategroup = self.__state_in_wwise.get(stategroup_id)
+            # Removed or loaded by another thread meanwhile.
+            if stategroup is None or stategroup.loaded:
+                return stategroup
+            self.__state_in_wwise.load_states(stategroup, states)
+            self.changed_statename.setdefault(stategroup.id, StateGroupChange())
+        self.notify_observer_of_statename_changed()
+        return stategroup
+
+    def prefetch_states(self, stategroup_ids: list):
+        """Load States of StateGroups in given order on a worker thread.\n
+        StateGroups waiting from the previous call are replaced, so the latest
+        order, e.g. of visible rows, is loaded first.
+        """
+        with self.__prefetch_lock:
+            self.__prefetch_ids = collections.deque(stategroup_ids)
+            if self.__prefetch_thread is None:
+                self.__prefetch_thread = threading.Thread(target=self.__run_prefetch, daemon=True)
+                self.__prefetch_thread.start()
+
+    def __run_prefetch(self):
+        while True:
+            with self.__prefetch_lock:
+                if not self.__prefetch_ids or not self.is_connected():
+                    self.__prefetch_thread = None
+                    return
+                stategroup_id = self.__prefetch_ids.popleft()
+            self.load_states(stategroup_id)
+
+    def __get_current_states(self, stategroup_ids: list, batch_size=DEFAULT_BATCH_SIZE) -> dict:
+        """Return current State name of each StateGroup.\n
+        WAAPI has no bulk getState, so it is called for each StateGroup in turn.
+        WaapiClient handles one request at a time, so calling from several threads
+        would not overlap the round trips.
+        Returns:
+            dict: {'StateGroup GUID': 'State Name'}
+        """
+        if self.is_restrictedmode:
+            self.__report_progress(len(stategroup_ids), len(stategroup_ids))
+            return {stategroup_id: 'None' for stategroup_id in stategroup_ids}
 
-        return self.__state_in_wwise
+        ret = {}
+        batch_size = max(1, batch_size)
+        self.__report_progress(0, len(stategroup_ids))
+        for i in range(0, len(stategroup_ids), batch_size):
+            self.__check_cancelled()
+            for stategroup_id in stategroup_ids[i:i + batch_size]:
+                ret[stategroup_id] = self.get_current_state(stategroup_id)
+            self.__report_progress(len(ret), len(stategroup_ids))
+        return ret
+
+    def __check_cancelled(self):
+        if self.__cancel_event is not None and self.__cancel_event.is_set():
+            raise LoadCancelledException("Loading State information was cancelled.")
+
+    def __report_progress(self, loaded: int, total: int):
+        self.load_progress = (loaded, total)
+        self.notify_observer_of_load_progress()
+
+    def get_current_state(self, stategroup: str) -> str:
+        """Return current State name of StateGroup.\n
+        Args:
+            stategroup (str): Either the ID(GUID), name, or Short ID of the State Group.
+        Returns:
+            str: State name. 'None' if failed.
+        """
+        result = self.call("ak.soundengine.getState", {
+            "stateGroup": stategroup,
+            "options": {"return": ["id", "name"]}
+        })
+        if not result:
+            return 'None'
+        return result.get('return', {}).get('name', 'None')
 
     def set_state(self, stategroup: str, state: str) -> bool:
-        """Return StateGroup information as dict.\n
+        """Set current State of StateGroup.\n
     Args:
         stategroup (str): Either the ID(GUID), name, or Short ID of the State Group.
         state (str): Either the ID(GUID), name, or Short ID of the State.
     Returns:
         bool: True for success, False otherwise.
         """
+        return self.__set_state_with_result(stategroup, state)['success']
+
+    def set_states(self, states: dict) -> dict:
+        """Set current State of several StateGroups.\n
+        setState is called for each StateGroup in turn, like getState in update_state_info.
+        A failed call does not stop the others.
+    Args:
+        states (dict): {'StateGroup GUID, name or Short ID': 'State GUID, name or Short ID'}
+    Returns:
+        dict: {'StateGroup': {'state': 'State',
+                              'success': bool,
+                              'latency': float(sec),
+                              'error': 'Error message' or None}}
+        """
+        return {stategroup: self.__set_state_with_result(stategroup, state) for stategroup, state in states.items()}
+
+    def __set_state_with_result(self, stategroup: str, state: str) -> dict:
+        start_time = time.perf_counter()
+        error = None
         try:
-            self.call("ak.soundengine.setState", {
-                "stateGroup": stategroup,
-                "state": state})
-            return True
-        except:
-            return False
+            # call() returns None when the request failed without exception.
+            if self.call("ak.soundengine.setState", {
+                    "stateGroup": stategroup,
+                    "state": state}) is None:
+                error = "Request failed."
+        except WaapiRequestFailed as e:
+            error = str(e)
+        return {'state': state,
+                'success': error is None,
+                'latency': time.perf_counter() - start_time,
+                'error': error}
 
     def on_statename_changed(self, **kwargs):
+        metrics.count('event:nameChanged')
         changedobj = kwargs["object"]
-        # Process for StateGroup.
-        if changedobj["type"] == "StateGroup":
-            stategroupguid = changedobj["id"]
-            self.changed_statename[stategroupguid] = {"StateGroup":
-                                                      {'oldName': self.__state_in_wwise[stategroupguid]['path'],
-                                                       'newName': changedobj["path"]}}
-            self.__state_in_wwise[stategroupguid]['path'] = changedobj["path"]
-            self.notify_observer_of_statename_changed()
-
-        # Process for State.
-        elif changedobj["type"] == "State":
-            stategroupguid = changedobj["parent"]["id"]
-            # Make new Changed State List.
-            if not self.changed_statename.get(stategroupguid, {}).get("State", []):
-                self.changed_statename[stategroupguid] = {"State": []}
-
-            # Is Changed State already exist in changed_statename?
-            if changedobj["id"] in [k['id'] for k in self.changed_statename[stategroupguid]['State']]:
-                existed_id = [k['id']
-                              for k in self.changed_statename[stategroupguid]['State']].index(changedobj["id"])
-                self.changed_statename[stategroupguid]["State"][existed_id] = {'id': changedobj["id"],
-                                                                               'oldName': kwargs.get("oldName", ""),
-                                                                               'newName': kwargs.get("newName", "")}
-            else:
-                self.changed_statename[stategroupguid]["State"].append({'id': changedobj["id"],
-                                                                        'oldName': kwargs.get("oldName", ""),
-                                                                        'newName': kwargs.get("newName", "")})
-            self.__state_in_wwise[stategroupguid]['state'][self.__state_in_wwise[stategroupguid]['state'].index(
-                kwargs.get("oldName"))] = kwargs.get("newName")
-            self.notify_observer_of_statename_changed()
-
         # Except for State/StateGroup.
-        else:
+        if changedobj["type"] not in ("StateGroup", "State"):
             return
 
+        with self.__state_lock:
+            # Process for StateGroup.
+            if changedobj["type"] == "StateGroup":
+                stategroup = self.__state_in_wwise.get(changedobj["id"])
+                if stategroup is None:
+                    return
+                change = self.changed_statename.setdefault(stategroup.id, StateGroupChange())
+                if change.old_path is None:
+                    change.old_path = stategroup.path
+                change.new_path = changedobj["path"]
+                # New name changes path order.
+                self.__state_in_wwise.move_stategroup(stategroup, changedobj["path"])
+                self.changed_stategroup.setdefault(stategroup.id, 'moved')
+
+            # Process for State.
+            elif changedobj["type"] == "State":
+                state = self.__state_in_wwise.find_state(changedobj["id"])
+                if state is None:
+                    # Unknown State of loaded StateGroup means its States are stale. Fetch them again.
+                    stategroup = self.__state_in_wwise.get(changedobj.get("parent", {}).get("id", ""))
+                    if stategroup is None or not self.__state_in_wwise.unload_states(stategroup):
+                        return
+                    self.changed_statename.setdefault(stategroup.id, StateGroupChange())
+                else:
+                    oldname = state.name
+                    self.__state_in_wwise.rename_state(state, kwargs.get("newName", ""))
+                    self.__record_state_changed(state.stategroup.id, state.id, oldname, state.name)
+
+        self.notify_observer_of_statename_changed()
+        if changedobj["type"] == "StateGroup":
+            self.notify_observer_of_stategroup_changed()
+
     def on_currentstate_changed(self, *args, **kwargs):
-        self.__state_in_wwise[kwargs.get(
-            "stateGroup", {}).get("id", "")]['current'] = kwargs.get("state", {}).get("name", "")
-        self.changed_currentstate[kwargs.get(
-            "stateGroup", {}).get("id", "")] = kwargs.get("state", {}).get("name", "")
+        metrics.count('event:stateChanged')
+        if self.history is not None:
+            self.history.record(kwargs.get("stateGroup", {}), kwargs.get("state", {}))
+        stategroupguid = kwargs.get("stateGroup", {}).get("id", "")
+        with self.__state_lock:
+            stategroup = self.__state_in_wwise.get(stategroupguid)
+            if stategroup is None:
+                return
+            stategroup.current = sys.intern(kwargs.get("state", {}).get("name", ""))
+            # Keep only latest State per StateGroup.
+            if stategroup.id in self.changed_currentstate:
+                self.coalesced_currentstate_count += 1
+            self.changed_currentstate[stategroup.id] = stategroup.current
         self.notify_observer_of_currentstate_changed()
 
+    def on_object_created(self, **kwargs):
+        metrics.count('event:created')
+        obj = kwargs.get("object", {})
+        if obj.get("type") == "StateGroup":
+            self.__add_stategroup(obj)
+        elif obj.get("type") == "State":
+            self.__add_state(obj.get("parent", {}).get("id", ""), obj)
+
+    def on_object_deleted(self, **kwargs):
+        metrics.count('event:preDeleted')
+        obj = kwargs.get("object", {})
+        if obj.get("type") == "StateGroup":
+            self.__remove_stategroup(obj.get("id", ""))
+        elif obj.get("type") == "State":
+            self.__remove_state(obj.get("id", ""))
+
+    def on_object_child_added(self, **kwargs):
+        metrics.count('event:childAdded')
+        child = kwargs.get("child", {})
+        if child.get("type") == "StateGroup":
+            self.__add_stategroup(child)
+        elif child.get("type") == "State":
+            self.__add_state(kwargs.get("parent", {}).get("id", ""), child)
+
+    def __add_stategroup(self, obj: dict):
+        stategroupguid = obj.get("id", "")
+        with self.__state_lock:
+            stategroup = self.__state_in_wwise.get(stategroupguid)
+            if stategroup is None:
+                self.__state_in_wwise.add_stategroup(stategroupguid, obj.get("path", ""))
+                self.changed_stategroup[stategroupguid] = 'added'
+            elif stategroup.path != obj.get("path", stategroup.path):
+                # Moved to another Work Unit or folder.
+                self.__state_in_wwise.move_stategroup(stategroup, obj["path"])
+                self.changed_stategroup.setdefault(stategroupguid, 'moved')
+            else:
+                return
+        self.notify_observer_of_stategroup_changed()
+
+    def __remove_stategroup(self, stategroupguid: str):
+        with self.__state_lock:
+            if self.__state_in_wwise.remove_stategroup(stategroupguid) is None:
+                return
+            self.changed_statename.pop(stategroupguid, None)
+            self.changed_currentstate.pop(stategroupguid, None)
+            if self.changed_stategroup.get(stategroupguid) == 'added':
+                del self.changed_stategroup[stategroupguid]
+            else:
+                self.changed_stategroup[stategroupguid] = 'removed'
+        self.notify_observer_of_stategroup_changed()
+
+    def __add_state(self, stategroupguid: str, obj: dict):
+        stateguid = obj.get("id", "")
+        with self.__state_lock:
+            stategroup = self.__state_in_wwise.get(stategroupguid)
+            if stategroup is None:
+                return
+            state = self.__state_in_wwise.find_state(stateguid)
+            if state is not None:
+                if state.stategroup is stategroup:
+                    return
+                # Moved from another StateGroup.
+                self.__remove_state_locked(stateguid)
+            elif not stategroup.loaded:
+                return
+            # States of not loaded StateGroup are fetched together when loaded.
+            if stategroup.loaded:
+                state = self.__state_in_wwise.add_state(stategroup, stateguid, obj.get("name", ""))
+                self.__record_state_changed(stategroup.id, state.id, None, state.name)
+        self.notify_observer_of_statename_changed()
+
+    def __remove_state(self, stateguid: str):
+        with self.__state_lock:
+            if self.__state_in_wwise.find_state(stateguid) is None:
+                return
+            self.__remove_state_locked(stateguid)
+        self.notify_observer_of_statename_changed()
+
+    def __remove_state_locked(self, stateguid: str):
+        state = self.__state_in_wwise.remove_state(stateguid)
+        self.__record_state_changed(state.stategroup.id, state.id, state.name, None)
+
+    def __record_state_changed(self, stategroupguid: str, stateguid: str, oldname, newname):
+        # Keep first oldName if State is changed again before sync.
+        changed_state = self.changed_statename.setdefault(stategroupguid, StateGroupChange()).states
+        change = changed_state.get(stateguid)
+        if change is None:
+            changed_state[stateguid] = StateNameChange(stateguid, oldname, newname)
+        else:
+            change.new_name = newname
+
+    def get_stategroup_ids(self) -> list:
+        """Return StateGroup GUIDs in path order. Safe to call while WAAPI events arrive."""
+        with self.__state_lock:
+            return self.__state_in_wwise.ids()
+
+    def take_changed_stategroup(self) -> dict:
+        """Return changed_stategroup and reset it atomically."""
+        with self.__state_lock:
+            changed, self.changed_stategroup = self.changed_stategroup, {}
+        return changed
+
+    def take_changed_statename(self) -> dict:
+        """Return changed_statename and reset it atomically."""
+        with self.__state_lock:
+            changed, self.changed_statename = self.changed_statename, {}
+        return changed
+
+    def take_changed_currentstate(self) -> dict:
+        """Return changed_currentstate and reset it atomically."""
+        with self.__state_lock:
+            changed, self.changed_currentstate = self.changed_currentstate, {}
+        return changed
+
     def on_statename_sync_completed(self):
-        self.changed_statename = {}
+        with self.__state_lock:
+            self.changed_statename = {}
+            self.changed_stategroup = {}
 
     def on_currentstate_sync_completed(self):
-        self.changed_currentstate = {}
+        with self.__state_lock:
+            self.changed_currentstate = {}
 
 
 if __name__ == "__main__":
@@ -206,8 +800,8 @@ if __name__ == "__main__":
         # print(client.call("ak.wwise.ui.getSelectedObjects"))
         #    options={
         #        "return": ["id", "name", "type", "shortId", "classId", "category", "filePath",
-        #                   "workunit", "parent", "owner", "path", "workunitIsDefault", "workunitType", "workunitIsDirty",
-        #                   "childrenCount"]}))
+        #                   "workunit", "parent", "owner", "path", "workunitIsDefault", "workunitType",
+        #                   "workunitIsDirty", "childrenCount"]}))
 
         # Get ProjectName and Path.
         # print("*** ProjectName and Path: get_wproj_info()")
@@ -216,6 +810,8 @@ if __name__ == "__main__":
         # Get State List
         # print("*** Get State Dict: update_state_info()")
         # print(client.update_state_info())
+        print("*** Initial update: update_stats")
+        print(client.update_stats)
 
         # client.set_state("{5ABE43F7-5E44-4F37-AE07-BC265DDCC34E}",
         #                  "{CD350719-7205-45AC-B57A-2FB2E1E492AD}")
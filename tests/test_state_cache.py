@@ -0,0 +1,48 @@
+#! python3
+import json
+
+import pytest
+
+from StateCache import StateCache
+from StateModel import StateRegistry
+
+
+PROJECT_PATH = "C:\\Project\\Project.wproj"
+
+
+def make_registry() -> StateRegistry:
+    registry = StateRegistry()
+    registry.project_path = PROJECT_PATH
+    registry.update([('{G1}', "\\States\\Music", [('{S1}', "None"), ('{S2}', "Combat")], "Combat"),
+                     ('{G2}', "\\States\\Ambience", None, "None")])
+    return registry
+
+
+def test_saved_registry_is_loaded(tmp_path):
+    cache = StateCache(str(tmp_path / "cache"))
+    cache.save({'name': "Project", 'filePath': PROJECT_PATH}, make_registry())
+
+    wproj_info, registry = cache.load()
+    assert wproj_info == {'name': "Project", 'filePath': PROJECT_PATH}
+    assert [stategroup.path for stategroup in registry] == ["\\States\\Ambience", "\\States\\Music"]
+    assert registry.get('{G1}').current == "Combat"
+    assert not registry.get('{G2}').loaded
+
+
+@pytest.mark.parametrize('content', [
+    {'version': StateCache.CACHE_VERSION, 'last': PROJECT_PATH, 'projects': []},
+    {'version': StateCache.CACHE_VERSION, 'last': PROJECT_PATH, 'projects': {PROJECT_PATH: []}},
+    {'version': StateCache.CACHE_VERSION, 'last': PROJECT_PATH, 'projects': {PROJECT_PATH: {'stategroup': [1]}}},
+    {'version': StateCache.CACHE_VERSION, 'last': PROJECT_PATH,
+     'projects': {PROJECT_PATH: {'stategroup': [['{G1}', "\\States\\Music"]]}}},
+    {'version': StateCache.CACHE_VERSION, 'last': [], 'projects': {}},
+])
+def test_unexpected_layout_is_not_cached(tmp_path, content):
+    path = tmp_path / "cache"
+    path.write_text(json.dumps(content), encoding='utf-8')
+    cache = StateCache(str(path))
+    assert cache.load() == (None, None)
+
+    # Saving replaces the broken content.
+    cache.save({'name': "Project", 'filePath': PROJECT_PATH}, make_registry())
+    assert cache.load()[1] is not None
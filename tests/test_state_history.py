@@ -0,0 +1,84 @@
+#! python3
+import csv
+import json
+
+import pytest
+
+from StateHistory import StateHistory
+
+
+def record(history: StateHistory, i: int):
+    # Timestamp tells the order of each transition.
+    history.record({'id': '{G' + str(i % 3) + '}', 'path': "\\States\\G" + str(i % 3)},
+                   {'id': '{S' + str(i) + '}', 'name': "State" + str(i)}, timestamp_ns=i)
+
+
+def timestamps(history: StateHistory) -> list:
+    return [event[0] for event in history.events()]
+
+
+def test_below_capacity_keeps_every_transition():
+    history = StateHistory(capacity=5)
+    for i in range(3):
+        record(history, i)
+    assert len(history) == 3
+    assert history.dropped == 0
+    assert history.events()[1] == (1, '{G1}', '{S1}', "State1")
+    assert timestamps(history) == [0, 1, 2]
+
+
+@pytest.mark.parametrize('count', [5, 6, 9, 10, 23])
+def test_overflow_keeps_latest_in_order(count):
+    history = StateHistory(capacity=5)
+    for i in range(count):
+        record(history, i)
+    assert len(history) == 5
+    assert history.total == count
+    assert history.dropped == count - 5
+    assert timestamps(history) == list(range(count - 5, count))
+    assert history.events()[-1] == (count - 1, '{G' + str((count - 1) % 3) + '}',
+                                    '{S' + str(count - 1) + '}', "State" + str(count - 1))
+
+
+def test_capacity_of_one_keeps_last():
+    history = StateHistory(capacity=0)
+    assert history.capacity == 1
+    for i in range(4):
+        record(history, i)
+    assert timestamps(history) == [3]
+
+
+def test_clear_starts_over():
+    history = StateHistory(capacity=3)
+    for i in range(7):
+        record(history, i)
+    history.clear()
+    assert len(history) == 0
+    assert history.dropped == 0
+    record(history, 10)
+    assert timestamps(history) == [10]
+
+
+def test_export_after_overflow_is_in_order(tmp_path):
+    history = StateHistory(capacity=4)
+    for i in range(10):
+        record(history, i)
+
+    csv_path = tmp_path / "history.csv"
+    history.export(str(csv_path))
+    with open(str(csv_path), encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == StateHistory.CSV_HEADER
+    assert [row[3] for row in rows[1:]] == ['{S6}', '{S7}', '{S8}', '{S9}']
+    assert rows[1] == ['0.000000006', '{G0}', "\\States\\G0", '{S6}', "State6"]
+
+    json_path = tmp_path / "history.json"
+    history.export(str(json_path))
+    with open(str(json_path), encoding='utf-8') as f:
+        exported = json.load(f)
+    assert exported['count'] == 4
+    assert exported['dropped'] == 6
+    columns = exported['columns']
+    assert columns['timestamp_ns'] == [6, 7, 8, 9]
+    assert [exported['strings'][index] for index in columns['state']] == ["State6", "State7", "State8", "State9"]
+    assert exported['stateGroupPath']['{G1}'] == "\\States\\G1"
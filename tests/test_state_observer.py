@@ -0,0 +1,158 @@
+#! python3
+import threading
+import time
+
+import pytest
+
+from StateObserver import EventQueue, Observer, QueuedObserver, ThreadedObserver
+
+
+class Subject:
+    """Stands in for StateUtility, which accumulates changes until observers take them."""
+
+    def __init__(self):
+        self.version = 0
+
+
+class RecordingObserver(Observer):
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+        # [(event, version of subject when handled), ...]
+        self.events = []
+
+    def on_currentstate_changed(self, subject):
+        if self.delay:
+            time.sleep(self.delay)
+        self.events.append(('on_currentstate_changed', subject.version))
+
+    def on_waapi_connected(self, subject):
+        self.events.append(('on_waapi_connected', subject.version))
+
+
+def post_all(queue: EventQueue, count: int) -> list:
+    return [queue.post('event', i) for i in range(count)]
+
+
+def drain_all(queue: EventQueue) -> list:
+    return [subject for event, subject in queue.drain(len(queue))]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        EventQueue(policy='drop_random')
+
+
+def test_drop_oldest_keeps_latest():
+    queue = EventQueue(maxlen=10, policy='drop_oldest')
+    dropped = post_all(queue, 25)
+    assert dropped[:10] == [None] * 10
+    assert dropped[10] == ('event', 0)
+    assert drain_all(queue) == list(range(15, 25))
+    assert queue.stats['dropped'] == 15
+    assert queue.stats['max_depth'] == 10
+
+
+def test_drop_newest_keeps_earliest():
+    queue = EventQueue(maxlen=10, policy='drop_newest')
+    dropped = post_all(queue, 25)
+    assert dropped[10] == ('event', 10)
+    assert drain_all(queue) == list(range(10))
+    assert queue.dropped == 15
+
+
+def test_block_waits_for_consumer_under_load():
+    queue = EventQueue(maxlen=8, policy='block', block_timeout=5.0)
+    count = 500
+    received = []
+
+    def consume():
+        while len(received) < count:
+            queue.wait(0.1)
+            received.extend(subject for event, subject in queue.drain(3))
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    post_all(queue, count)
+    consumer.join(10.0)
+    assert received == list(range(count))
+    assert queue.dropped == 0
+    assert queue.blocked > 0
+    assert queue.max_depth <= 8
+
+
+def test_block_drops_oldest_after_timeout():
+    queue = EventQueue(maxlen=2, policy='block', block_timeout=0.05)
+    post_all(queue, 2)
+    start = time.perf_counter()
+    assert queue.post('event', 2) == ('event', 0)
+    assert time.perf_counter() - start >= 0.04
+    assert queue.blocked == 1
+    assert drain_all(queue) == [1, 2]
+
+
+def test_block_never_waits_on_consumer_thread():
+    queue = EventQueue(maxlen=2, policy='block', block_timeout=5.0)
+    queue.drain(1)
+    start = time.perf_counter()
+    post_all(queue, 3)
+    assert time.perf_counter() - start < 1.0
+    assert queue.blocked == 0
+    assert drain_all(queue) == [1, 2]
+
+
+def test_change_notifications_are_coalesced():
+    target = RecordingObserver()
+    observer = QueuedObserver(target)
+    subject = Subject()
+    for version in range(1, 101):
+        subject.version = version
+        observer.on_currentstate_changed(subject)
+    # Connection notifications keep their order and are never coalesced.
+    observer.on_waapi_connected(subject)
+    observer.on_waapi_connected(subject)
+    assert len(observer.queue) == 3
+    assert observer.coalesced == 99
+
+    assert observer.dispatch(10) == 3
+    # Target takes every accumulated change at once.
+    assert target.events == [('on_currentstate_changed', 100), ('on_waapi_connected', 100),
+                             ('on_waapi_connected', 100)]
+    # Delivered notification is posted again on the next change.
+    observer.on_currentstate_changed(subject)
+    assert len(observer.queue) == 1
+
+
+def test_dropped_notification_is_posted_again():
+    target = RecordingObserver()
+    observer = QueuedObserver(target, EventQueue(maxlen=1, policy='drop_oldest'))
+    first, second = Subject(), Subject()
+    observer.on_currentstate_changed(first)
+    # Drops the one of first, which is no longer waiting.
+    observer.on_currentstate_changed(second)
+    observer.on_currentstate_changed(first)
+    assert observer.coalesced == 0
+    assert observer.dispatch(10) == 1
+    assert target.events == [('on_currentstate_changed', 0)]
+
+
+@pytest.mark.parametrize('policy', EventQueue.POLICIES)
+def test_coalescing_bounds_queue_under_load(policy):
+    target = RecordingObserver(delay=0.001)
+    subjects = [Subject() for i in range(4)]
+    observer = ThreadedObserver(target, EventQueue(maxlen=8, policy=policy)).start()
+    try:
+        for version in range(1, 2001):
+            subject = subjects[version % len(subjects)]
+            subject.version = version
+            observer.on_currentstate_changed(subject)
+    finally:
+        observer.stop()
+    # At most one notification of each subject waits, so a slow target never makes the queue drop.
+    assert observer.coalesced > 0
+    assert observer.queue.dropped == 0
+    assert observer.queue.max_depth <= len(subjects)
+    # Every subject is delivered with its last change.
+    last_seen = {}
+    for event, version in target.events:
+        last_seen[version % len(subjects)] = version
+    assert last_seen == {i: 2000 - (2000 - i) % len(subjects) for i in range(len(subjects))}
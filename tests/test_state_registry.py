@@ -0,0 +1,137 @@
+#! python3
+import pytest
+
+from StateModel import StateRegistry
+
+
+def make_registry() -> StateRegistry:
+    registry = StateRegistry()
+    registry.update([('{G2}', "\\States\\B", [('{S21}', "None"), ('{S22}', "Day")], "None"),
+                     ('{G1}', "\\States\\A", [('{S11}', "None"), ('{S12}', "Combat")], "Combat"),
+                     ('{G3}', "\\States\\C", [('{S31}', "None")], "None")])
+    return registry
+
+
+def records(registry: StateRegistry) -> list:
+    """Return registry as update() records, to be edited by tests."""
+    return [(stategroup.id, stategroup.path, [(state.id, state.name) for state in stategroup.states],
+             stategroup.current) for stategroup in registry]
+
+
+def test_initial_load_is_sorted_by_path():
+    registry = make_registry()
+    assert registry.ids() == ['{G1}', '{G2}', '{G3}']
+    assert registry.find_stategroup("\\States\\B").id == '{G2}'
+    assert registry.find_stategroup("\\States\\Z") is None
+    assert registry.find_state('{S12}').stategroup is registry.get('{G1}')
+
+
+@pytest.mark.parametrize('path, expected', [
+    ("\\States\\0", ['{G4}', '{G1}', '{G2}', '{G3}']),
+    ("\\States\\AB", ['{G1}', '{G4}', '{G2}', '{G3}']),
+    ("\\States\\D", ['{G1}', '{G2}', '{G3}', '{G4}']),
+])
+def test_added_stategroup_is_inserted_in_order(path, expected):
+    registry = make_registry()
+    delta = registry.update(records(registry) + [('{G4}', path, [], "None")])
+    assert delta.stategroups == {'{G4}': 'added'}
+    assert registry.ids() == expected
+    assert registry.find_stategroup(path).id == '{G4}'
+
+
+def test_same_path_is_ordered_by_guid():
+    registry = make_registry()
+    registry.add_stategroup('{G0}', "\\States\\B")
+    assert registry.ids() == ['{G1}', '{G0}', '{G2}', '{G3}']
+
+
+def test_unchanged_update_keeps_objects():
+    registry = make_registry()
+    stategroup = registry.get('{G1}')
+    state = registry.find_state('{S12}')
+    delta = registry.update(records(registry))
+    assert not delta
+    assert registry.get('{G1}') is stategroup
+    assert registry.find_state('{S12}') is state
+
+
+def test_renamed_stategroup_is_moved():
+    registry = make_registry()
+    updated = records(registry)
+    updated[0] = ('{G1}', "\\States\\Z") + updated[0][2:]
+    delta = registry.update(updated)
+    assert delta.stategroups == {'{G1}': 'moved'}
+    assert registry.ids() == ['{G2}', '{G3}', '{G1}']
+    assert registry.find_stategroup("\\States\\Z").id == '{G1}'
+    assert registry.find_stategroup("\\States\\A") is None
+
+
+def test_renamed_state_keeps_object():
+    registry = make_registry()
+    state = registry.find_state('{S12}')
+    updated = records(registry)
+    updated[0] = ('{G1}', "\\States\\A", [('{S11}', "None"), ('{S12}', "Stealth")], "Combat")
+    delta = registry.update(updated)
+    assert delta.states == {'{G1}'}
+    assert not delta.stategroups
+    assert registry.find_state('{S12}') is state
+    assert registry.get('{G1}').state_names() == ["None", "Stealth"]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_moved_state_belongs_to_new_stategroup(reverse):
+    registry = make_registry()
+    updated = records(registry)
+    updated[0] = ('{G1}', "\\States\\A", [('{S11}', "None")], "Combat")
+    updated[1] = ('{G2}', "\\States\\B", [('{S21}', "None"), ('{S22}', "Day"), ('{S12}', "Combat")], "None")
+    # Either StateGroup may be reconciled first.
+    delta = registry.update(reversed(updated) if reverse else updated)
+    assert delta.states == {'{G1}', '{G2}'}
+    assert registry.find_state('{S12}').stategroup is registry.get('{G2}')
+    assert registry.get('{G1}').state_names() == ["None"]
+    assert registry.get('{G2}').state_names() == ["None", "Day", "Combat"]
+
+
+def test_removals_are_reported():
+    registry = make_registry()
+    updated = records(registry)
+    # G2 is removed, and State S12 of G1.
+    updated = [('{G1}', "\\States\\A", [('{S11}', "None")], "None"), updated[2]]
+    delta = registry.update(updated)
+    assert delta.stategroups == {'{G2}': 'removed'}
+    assert delta.states == {'{G1}'}
+    assert delta.currents == {'{G1}'}
+    assert registry.ids() == ['{G1}', '{G3}']
+    assert '{G2}' not in registry
+    assert registry.find_state('{S21}') is None
+    assert registry.find_state('{S12}') is None
+    assert registry.find_stategroup("\\States\\B") is None
+
+
+def test_states_of_none_unload_stategroup():
+    registry = make_registry()
+    updated = records(registry)
+    updated[0] = ('{G1}', "\\States\\A", None, "Combat")
+    delta = registry.update(updated)
+    assert delta.states == {'{G1}'}
+    stategroup = registry.get('{G1}')
+    assert not stategroup.loaded
+    assert stategroup.states == []
+    assert registry.find_state('{S11}') is None
+
+    # Loading the same States again is a change too.
+    assert registry.load_states(stategroup, [('{S11}', "None"), ('{S12}', "Combat")])
+    assert stategroup.loaded
+    assert not registry.load_states(stategroup, [('{S11}', "None"), ('{S12}', "Combat")])
+
+
+def test_state_moved_from_removed_stategroup():
+    registry = make_registry()
+    updated = records(registry)
+    # G1 is removed and its State S12 moves to G3.
+    updated = [updated[1], ('{G3}', "\\States\\C", [('{S31}', "None"), ('{S12}', "Combat")], "None")]
+    delta = registry.update(updated)
+    assert delta.stategroups == {'{G1}': 'removed'}
+    assert delta.states == {'{G3}'}
+    assert registry.find_state('{S12}').stategroup is registry.get('{G3}')
+    assert registry.find_state('{S11}') is None
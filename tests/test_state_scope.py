@@ -0,0 +1,39 @@
+#! python3
+import time
+
+from MockWaapiServer import MockWaapiServer, SyntheticProject
+from StateConnectionPool import use_thread_event_loops
+from StateHistory import StateHistory
+from WwiseStateBrowserInterface import StateUtility
+
+
+# Mock server and client run event loops in one process.
+use_thread_event_loops()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_unwatched_transitions_are_recorded():
+    project = SyntheticProject(4, 3)
+    stategroups = list(project.stategroups.values())
+    watched = stategroups[0]
+    history = StateHistory()
+    with MockWaapiServer(project) as server:
+        client = StateUtility(url=server.url, history=history, watch=[watched['path']])
+        try:
+            assert client.watched == {watched['id']}
+            # Round robin over every StateGroup, twice.
+            published = server.storm_state_changes(rate=200, duration=len(stategroups) * 2 / 200)
+            assert wait_until(lambda: len(history) == published)
+
+            recorded = {event[1] for event in history.events()}
+            assert recorded == {stategroup['id'] for stategroup in stategroups}
+            # Only the watched StateGroup is handled.
+            assert set(client.take_changed_currentstate()) == {watched['id']}
+        finally:
+            client.disconnect(timeout=2.0)
@@ -0,0 +1,88 @@
+#! python3
+from StateModel import StateRegistry, StateSearchIndex
+
+
+def make_registry() -> StateRegistry:
+    registry = StateRegistry()
+    registry.update([('{G1}', "\\States\\Music", [('{S11}', "None"), ('{S12}', "Combat")], "None"),
+                     ('{G2}', "\\States\\Ambience", [('{S21}', "None"), ('{S22}', "Cave")], "None"),
+                     ('{G3}', "\\States\\Player\\Health", [('{S31}', "None"), ('{S32}', "Low")], "None")])
+    return registry
+
+
+def make_index(registry: StateRegistry) -> StateSearchIndex:
+    index = StateSearchIndex()
+    index.rebuild(registry)
+    return index
+
+
+def test_trigram_query_matches_path_and_state_names():
+    index = make_index(make_registry())
+    assert len(index) == 3
+    assert index.search("music") == {'{G1}'}
+    assert index.search("COMBAT") == {'{G1}'}
+    assert index.search("states") == {'{G1}', '{G2}', '{G3}'}
+    assert index.search("ave") == {'{G2}'}
+    assert index.search("xyz") == set()
+
+
+def test_trigrams_out_of_order_do_not_match():
+    registry = make_registry()
+    registry.add_state(registry.get('{G2}'), '{S23}', "Banana")
+    index = make_index(registry)
+    # Every trigram of the query is indexed for G2, but not the substring.
+    assert index.search("bananana") == set()
+    assert index.search("banana") == {'{G2}'}
+
+
+def test_short_query_scans_all_texts():
+    index = make_index(make_registry())
+    assert index.search("") == {'{G1}', '{G2}', '{G3}'}
+    assert index.search("c") == {'{G1}', '{G2}'}
+    assert index.search("lo") == {'{G3}'}
+
+
+def test_narrowing_query_uses_last_result():
+    index = make_index(make_registry())
+    assert index.search("co") == {'{G1}'}
+    assert index.search("com") == {'{G1}'}
+    assert index.search("comb") == {'{G1}'}
+    # Not a narrowing of the last query.
+    assert index.search("cav") == {'{G2}'}
+
+
+def test_renamed_state_is_reindexed():
+    registry = make_registry()
+    index = make_index(registry)
+    assert index.search("com") == {'{G1}'}
+
+    registry.rename_state(registry.find_state('{S12}'), "Stealth")
+    index.update_stategroup(registry.get('{G1}'))
+    # Last result of "com" must not narrow the search after the change.
+    assert index.search("comb") == set()
+    assert index.search("stealth") == {'{G1}'}
+    assert index.search("co") == set()
+
+
+def test_moved_stategroup_is_reindexed():
+    registry = make_registry()
+    index = make_index(registry)
+    stategroup = registry.get('{G3}')
+    registry.move_stategroup(stategroup, "\\States\\Player\\Stamina")
+    index.update_stategroup(stategroup)
+    assert index.search("health") == set()
+    assert index.search("stamina") == {'{G3}'}
+    assert index.search("player") == {'{G3}'}
+
+
+def test_removed_stategroup_is_not_found():
+    registry = make_registry()
+    index = make_index(registry)
+    assert index.search("cave") == {'{G2}'}
+    index.remove_stategroup('{G2}')
+    assert len(index) == 2
+    assert index.search("cave") == set()
+    assert index.search("c") == {'{G1}'}
+    # Removing unknown StateGroup does nothing.
+    index.remove_stategroup('{G9}')
+    assert len(index) == 2
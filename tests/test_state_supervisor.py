@@ -0,0 +1,47 @@
+#! python3
+import time
+
+from MockWaapiServer import MockWaapiServer, SyntheticProject
+from StateConnectionPool import use_thread_event_loops
+from StateSupervisor import ConnectionSupervisor
+from WwiseStateBrowserInterface import ConnectionLostException
+
+
+# Mock server and client run event loops in one process.
+use_thread_event_loops()
+
+
+class RecordingListener:
+    def __init__(self):
+        self.errors = []
+
+    def on_retry(self, supervisor, attempt, delay, error):
+        self.errors.append(error)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_drop_during_load_is_retried():
+    listener = RecordingListener()
+    server = MockWaapiServer(SyntheticProject(100, 3), latency=0.01).start()
+    port = server.port
+    supervisor = ConnectionSupervisor(server.url, listener=listener, heartbeat_interval=0.5, heartbeat_timeout=0.5)
+    supervisor.start()
+    try:
+        # Loading takes about 1s at this latency. Drop the server in the middle of it.
+        time.sleep(0.3)
+        server.stop()
+        assert supervisor.client is None
+        server = MockWaapiServer(SyntheticProject(100, 3), latency=0.01, port=port).start()
+
+        assert wait_until(lambda: supervisor.client is not None, timeout=10.0)
+        assert any(isinstance(error, ConnectionLostException) for error in listener.errors)
+        assert len(supervisor.registry) == 100
+    finally:
+        supervisor.stop(wait=True)
+        server.stop()